@@ -1,41 +1,115 @@
 """API routes for the MPRIS server."""
+import os
 import json
+import base64
 import hashlib
-import dbus
-from flask import jsonify, request
+from flask import jsonify, request, make_response, send_file
 from modules.auth import require_auth
 from modules.dbus_interface import (
     get_media_info, get_player_by_id, get_available_players, 
-    get_priority_sorted_players
+    get_priority_sorted_players, get_player_position, get_playback_state,
+    set_current_player, get_players_with_status
 )
-from config import current_player
+from modules.state_store import (
+    record_state, get_art_hash, get_change_count, get_change_counts, get_snapshot, compute_delta
+)
+from modules import commands, metrics, tracklist, latency, dispatch, adaptive_art
+from modules.beacon import register_device
+from config import BEACON_ENABLED, TRACKLIST_PAGE_LIMIT, COMMAND_STATE_TIMEOUT
+from utils.startup import startup_timer
+from utils import art_store
+from utils.wire_format import CONTENT_TYPE as BINARY_CONTENT_TYPE, wants_binary, encode_state
+from utils.log import get_logger, get_records, LEVELS
+
+log = get_logger(__name__)
+
+def binary_response(payload, etag):
+    """Build a compact binary state response."""
+    response = make_response(payload)
+    response.headers['Content-Type'] = BINARY_CONTENT_TYPE
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, max-age=0'
+    response.headers['Vary'] = 'Accept'
+    return response
+
+def command_reply(body, status):
+    """Build a JSON response, telling clients when to retry a player whose circuit breaker is open."""
+    response = jsonify(body)
+    response.status_code = status
+    if status == 503 and body.get('retry_after'):
+        response.headers['Retry-After'] = str(body['retry_after'])
+    return response
+
+def number_arg(payload, name, cast):
+    """Read a numeric value from a JSON body or query string, or None."""
+    value = payload.get(name, request.args.get(name))
+    if value is None:
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
 
 def register_routes(app):
     """Register API routes with the Flask app."""
     
+    app.before_request(latency.start_request)
+    app.after_request(latency.finish_request)
+    
     @app.route('/artwork', methods=['GET'])
     @require_auth
     def get_artwork():
         """API endpoint to get just the current artwork."""
-        if_none_match = request.headers.get('If-None-Match')
-
-        media_info = get_media_info()
+        media_info = get_media_info(request.args.get('player'))
         
         if media_info and media_info.get('art_data'):
             art_data = media_info['art_data']
 
-            hash_value = hashlib.md5(art_data.encode('utf-8')).hexdigest()
+            hash_value = media_info['art_id']
             
-            if if_none_match and if_none_match == hash_value:
+            # Quoted like /artwork/raw's; unquoted If-None-Match from older devices still matches
+            if request.if_none_match.contains(hash_value):
                 return '', 304  # Not Modified
             
             response = jsonify({'art_data': art_data, 'is_base64': True})
-            response.headers['ETag'] = hash_value
+            response.headers['ETag'] = f'"{hash_value}"'
             response.headers['Cache-Control'] = 'private, max-age=0'
+            startup_timer.mark_first_request('artwork')
             return response
         else:
             return jsonify({"error": "No artwork available"}), 404
 
+    @app.route('/artwork/raw', methods=['GET'])
+    @require_auth
+    def get_artwork_raw():
+        """API endpoint to get the current artwork as a JPEG, streamed from the art store."""
+        media_info = get_media_info(request.args.get('player'))
+        
+        if not media_info or not media_info.get('art_id'):
+            return jsonify({"error": "No artwork available"}), 404
+        
+        art_id = media_info['art_id']
+        # Clients on weak links or with slow decoders get a lighter encoding of the same cover
+        digest, tier = adaptive_art.artwork_for_request(art_id, request.headers)
+        path = art_store.path_for(digest)
+        if not os.path.exists(path):
+            # Store not writable; fall back to sending the bytes from memory
+            if request.if_none_match.contains(art_id):
+                return '', 304
+            response = make_response(base64.b64decode(media_info['art_data']))
+            response.headers['Content-Type'] = 'image/jpeg'
+            response.headers['ETag'] = f'"{art_id}"'
+            return response
+        
+        # send_file hands the open file to the WSGI server's file wrapper,
+        # which can use sendfile, so the image is never copied into Python
+        # The ETag names the cover, not the encoding, so it still matches the art_id in metadata
+        response = send_file(path, mimetype='image/jpeg', etag=art_id, conditional=True, max_age=0)
+        response.headers['Cache-Control'] = 'private, max-age=0'
+        response.headers['X-Art-Tier'] = tier
+        startup_timer.mark_first_request('artwork')
+        return response
+
     @app.route('/current', methods=['GET'])
     @require_auth
     def current_media():
@@ -44,24 +118,60 @@ def register_routes(app):
         
         if_none_match = request.headers.get('If-None-Match')
         if if_none_match:
-            print(f"Client sent If-None-Match: {if_none_match} for current")
+            log.debug("Client sent If-None-Match: %s for current", if_none_match)
         
-        media_info = get_media_info()
+        requested_player = request.args.get('player')
+        media_info = get_media_info(requested_player)
         
-        if not media_info:
+        if not media_info and not requested_player:
             priority_players = get_priority_sorted_players()
             if priority_players:
                 for player in priority_players:
-                    current_player = player['id']
-                    print(f"Trying priority player: {current_player}")
-                    media_info = get_media_info()
+                    log.debug("Trying priority player: %s", player['id'])
+                    media_info = get_media_info(player['id'])
                     if media_info:
-                        print(f"Successfully selected player: {current_player}")
+                        set_current_player(player['id'])
+                        log.info("Successfully selected player: %s", player['id'])
                         break
         
         if media_info:
+            latency.stamp_state(media_info['player'])
+            art_hash = media_info.get('art_id')
+            snapshot = dict(media_info, art_data=None)
+            version = record_state(media_info['player'], media_info, art_hash, snapshot)
+            
+            if wants_binary(request):
+                # The binary format never carries artwork, so its ETag ignores include_art.
+                # It does carry the position, so a 304 must not hand back a stale one
+                media_info['art_data'] = None
+                player_obj = get_player_by_id(media_info['player'])
+                position = get_player_position(player_obj) if player_obj else 0
+                etag = f"b-{hashlib.md5(json.dumps(media_info).encode()).hexdigest()}-{position}"
+                if if_none_match and if_none_match == etag:
+                    return '', 304
+                
+                startup_timer.mark_first_request('current')
+                return binary_response(encode_state(media_info, version, position, art_hash), etag)
+            
+            since = number_arg({}, 'since', int) or number_arg(request.headers, 'X-Since-Version', int)
+            if since and not include_art:
+                base = get_snapshot(media_info['player'], since)
+                if base is not None:
+                    changed, removed = compute_delta(base, snapshot)
+                    if not changed and not removed:
+                        return '', 304
+                    return jsonify({
+                        'delta': True,
+                        'base': since,
+                        'version': version,
+                        'changed': changed,
+                        'removed': removed
+                    })
+                # Base too old or unknown, fall through to a full snapshot
+            
             if not include_art and 'art_data' in media_info:
                 media_info['art_data'] = None
+            media_info['version'] = version
             
             response_data = json.dumps(media_info)
             etag = hashlib.md5(response_data.encode()).hexdigest()
@@ -72,161 +182,324 @@ def register_routes(app):
             response = jsonify(media_info)
             response.headers['ETag'] = etag
             response.headers['Cache-Control'] = 'private, max-age=0'
+            startup_timer.mark_first_request('current')
             return response
         else:
             return jsonify({"error": "No media info available", "no_media": True}), 404
 
+    @app.route('/state', methods=['GET'])
+    @require_auth
+    def playback_state():
+        """API endpoint to get lightweight playback state without resolving artwork."""
+        state = get_playback_state(request.args.get('player'))
+        
+        if not state:
+            return jsonify({"error": "No media info available", "no_media": True}), 404
+        
+        latency.stamp_state(state['player'])
+        version = record_state(state['player'], state)
+        art_hash = get_art_hash(state['player'], state['art_url'])
+        state['last_command'] = dispatch.last_outcome(state['player'])
+        
+        if wants_binary(request):
+            # A late command outcome doesn't bump the version, so it's part of the ETag
+            command = state['last_command']
+            outcome = f"-{command['id']}-{command['status']}" if command else ''
+            return binary_response(
+                encode_state(state, version, state['position'], art_hash),
+                f"b-{version}-{state['position']}{outcome}"
+            )
+        
+        state['version'] = version
+        state['art_hash'] = art_hash
+        return jsonify(state)
+
+    @app.route('/beacon/register', methods=['POST'])
+    @require_auth
+    def register_beacon():
+        """API endpoint for a device to receive UDP change notifications.
+        
+        Expects {"port": <int>}, plus "all_players": true from peer servers
+        that want beacons for every player, not just the current one. The
+        address is taken from the request. Registrations expire and must be renewed.
+        """
+        if not BEACON_ENABLED:
+            return jsonify({"error": "Beacons are disabled"}), 404
+        
+        payload = request.get_json(silent=True) or {}
+        port = number_arg(payload, 'port', int)
+        if not port or not 0 < port < 65536:
+            return jsonify({"error": "Expected integer 'port'"}), 400
+        
+        ttl = register_device(request.remote_addr, port, bool(payload.get('all_players')))
+        return jsonify({"success": True, "ttl": ttl})
+
+    @app.route('/metrics', methods=['GET'])
+    @require_auth
+    def get_metrics():
+        """API endpoint to get cache and performance counters."""
+        return jsonify(metrics.snapshot())
+
+    @app.route('/clients', methods=['GET'])
+    @require_auth
+    def get_clients():
+        """API endpoint to get each device's measured link and decoder and the artwork tier it is served."""
+        return jsonify({"clients": adaptive_art.report()})
+
+    @app.route('/telemetry', methods=['POST'])
+    @require_auth
+    def post_telemetry():
+        """API endpoint for devices to report how long state changes took to reach the screen.
+        
+        Expects {"samples": [{"version": ..., "source": ..., "age_ms": ...,
+        "server_ms": ..., "fetch_ms": ..., "decode_ms": ..., "render_ms": ...}]},
+        with age_ms and source echoed from the state response headers.
+        """
+        payload = request.get_json(silent=True) or {}
+        samples = payload.get('samples')
+        if not isinstance(samples, list):
+            return jsonify({"error": "Expected a 'samples' list"}), 400
+        return jsonify({"success": True, "stored": latency.record_samples(samples)})
+
+    @app.route('/latency', methods=['GET'])
+    @require_auth
+    def get_latency():
+        """API endpoint to get change-to-screen latency percentiles, optionally for ?source=signal|poll."""
+        return jsonify(latency.report(request.args.get('source')))
+
+    @app.route('/logs', methods=['GET'])
+    @require_auth
+    def get_logs():
+        """API endpoint to read recent log records from the in-memory buffer."""
+        level = request.args.get('level')
+        if level and level.upper() not in LEVELS:
+            return jsonify({"error": f"Unknown level '{level}'"}), 400
+        limit = request.args.get('limit', type=int)
+        return jsonify({"records": get_records(level, request.args.get('logger'), limit)})
+
+    @app.route('/startup', methods=['GET'])
+    @require_auth
+    def startup_timings():
+        """API endpoint to get startup phase timings and time to first responses."""
+        return jsonify(startup_timer.report())
+
     @app.route('/players', methods=['GET'])
     @require_auth
     def list_players():
-        """API endpoint to list available players."""
+        """API endpoint to list available players, with ?status=1 including each one's playback status."""
+        if request.args.get('status', '').lower() in ('1', 'true'):
+            return jsonify(get_players_with_status())
         players = get_available_players()
         return jsonify(players)
 
-    @app.route('/select_player/<player_id>', methods=['POST'])
+    @app.route('/select_player/<path:player_id>', methods=['POST'])
     @require_auth
     def select_player(player_id):
         """API endpoint to select a player."""
-        global current_player
+        body, status = commands.select_player(player_id)
+        return command_reply(body, status)
+
+    def wants_state():
+        """Check whether a command request asked for the post-command state."""
+        payload = request.get_json(silent=True) or {}
+        return bool(payload.get('wait')) or request.args.get('wait', '').lower() in ('1', 'true')
+
+    def player_command(command):
+        """Resolve the target player and run a single command on it.
         
-        if player_id in [p['id'] for p in get_available_players()]:
-            current_player = player_id
-            return jsonify({"success": True, "current_player": current_player})
-        else:
-            return jsonify({"error": "Player not found"}), 404
+        With wait=1 the response also carries the player's state once it has
+        reported the change, or after COMMAND_STATE_TIMEOUT. With ?player=<id>
+        that player is targeted without selecting it. A player that doesn't
+        answer within COMMAND_DEADLINE gets a 202 with a command id.
+        """
+        player_id, player_obj, error = commands.resolve_player(request.args.get('player'))
+        if error:
+            body, status = error
+            return command_reply(body, status)
+        
+        since = get_change_count(player_id)
+        body, status = commands.run_command(player_id, player_obj, command)
+        
+        if status == 200 and wants_state():
+            body.update(commands.wait_for_state(player_id, since))
+        return command_reply(body, status)
+
+    @app.route('/commands/<command_id>', methods=['GET'])
+    @require_auth
+    def command_outcome(command_id):
+        """API endpoint to get the outcome of a command that was answered with 202.
+        
+        With ?wait=1 this waits up to COMMAND_STATE_TIMEOUT for a pending command to finish.
+        """
+        command = dispatch.get_command(command_id)
+        if not command:
+            return jsonify({"error": "Unknown command"}), 404
+        if request.args.get('wait', '').lower() in ('1', 'true'):
+            command.done.wait(COMMAND_STATE_TIMEOUT)
+        return jsonify(command.to_dict())
 
     @app.route('/play', methods=['POST'])
     @require_auth
     def play():
         """API endpoint to send play command."""
-        global current_player
-        try:
-            if not current_player:
-                priority_players = get_priority_sorted_players()
-                if priority_players:
-                    current_player = priority_players[0]['id']
-                    print(f"Auto-selected player: {current_player}")
-                else:
-                    return jsonify({"error": "No available players found"}), 404
-
-            player_obj = get_player_by_id(current_player)
-            if player_obj:
-                player_interface = dbus.Interface(player_obj, 'org.mpris.MediaPlayer2.Player')
-                player_interface.Play()
-                return jsonify({"success": True})
-            return jsonify({"error": "No player selected"}), 400
-        except Exception as e:
-            return jsonify({"error": str(e)}), 500
+        return player_command('play')
 
     @app.route('/pause', methods=['POST'])
     @require_auth
     def pause():
         """API endpoint to send pause command."""
-        global current_player
-        try:
-            if not current_player:
-                priority_players = get_priority_sorted_players()
-                if priority_players:
-                    current_player = priority_players[0]['id']
-                    print(f"Auto-selected player: {current_player}")
-                else:
-                    return jsonify({"error": "No available players found"}), 404
-
-            player_obj = get_player_by_id(current_player)
-            if player_obj:
-                player_interface = dbus.Interface(player_obj, 'org.mpris.MediaPlayer2.Player')
-                player_interface.Pause()
-                return jsonify({"success": True})
-            return jsonify({"error": "No player selected"}), 400
-        except Exception as e:
-            return jsonify({"error": str(e)}), 500
+        return player_command('pause')
 
     @app.route('/next', methods=['POST'])
     @require_auth
     def next_track():
         """API endpoint to send next track command."""
-        global current_player
-        try:
-            if not current_player:
-                priority_players = get_priority_sorted_players()
-                if priority_players:
-                    current_player = priority_players[0]['id']
-                    print(f"Auto-selected player: {current_player}")
-                else:
-                    return jsonify({"error": "No available players found"}), 404
-
-            player_obj = get_player_by_id(current_player)
-            if player_obj:
-                player_interface = dbus.Interface(player_obj, 'org.mpris.MediaPlayer2.Player')
-                print(f"Sending Next command to player: {current_player}")
-                try:
-                    player_interface.Next()
-                    return jsonify({"success": True})
-                except dbus.exceptions.DBusException as dbus_error:
-                    if "is not available now" in str(dbus_error):
-                        print(f"Next function not available for {current_player}: {dbus_error}")
-                        return jsonify({"error": "Next function not available", "details": str(dbus_error)}), 400
-                    raise
-            return jsonify({"error": "No player selected"}), 400
-        except Exception as e:
-            print(f"Error on next track: {e}")
-            return jsonify({"error": str(e)}), 500
+        return player_command('next')
 
     @app.route('/previous', methods=['POST'])
     @require_auth
     def previous_track():
         """API endpoint to send previous track command."""
-        global current_player
-        try:
-            if not current_player:
-                priority_players = get_priority_sorted_players()
-                if priority_players:
-                    current_player = priority_players[0]['id']
-                    print(f"Auto-selected player: {current_player}")
-                else:
-                    return jsonify({"error": "No available players found"}), 404
-
-            player_obj = get_player_by_id(current_player)
-            if player_obj:
-                player_interface = dbus.Interface(player_obj, 'org.mpris.MediaPlayer2.Player')
-                player_interface.Previous()
-                return jsonify({"success": True})
-            return jsonify({"error": "No player selected"}), 400
-        except Exception as e:
-            return jsonify({"error": str(e)}), 500
+        return player_command('previous')
 
     @app.route('/playpause', methods=['POST'])
     @require_auth
     def play_pause():
         """API endpoint to toggle play/pause state."""
-        global current_player
-        try:
-            if not current_player:
-                priority_players = get_priority_sorted_players()
-                if priority_players:
-                    current_player = priority_players[0]['id']
-                    print(f"Auto-selected player: {current_player}")
-                else:
-                    return jsonify({"error": "No available players found"}), 404
-
-            player_obj = get_player_by_id(current_player)
-            if player_obj:
-                properties_interface = dbus.Interface(player_obj, 'org.freedesktop.DBus.Properties')
-                playback_status = properties_interface.Get('org.mpris.MediaPlayer2.Player', 'PlaybackStatus')
-                
-                player_interface = dbus.Interface(player_obj, 'org.mpris.MediaPlayer2.Player')
-
-                if playback_status == 'Playing':
-                    player_interface.Pause()
-                    print(f"Pausing player: {current_player}")
-                else:
-                    player_interface.Play()
-                    print(f"Playing player: {current_player}")
-                    
-                return jsonify({"success": True, "action": "pause" if playback_status == 'Playing' else "play"})
-            return jsonify({"error": "No player selected"}), 400
-        except Exception as e:
-            print(f"Error toggling playback: {e}")
-            return jsonify({"error": str(e)}), 500
+        return player_command('playpause')
+
+    @app.route('/seek', methods=['POST'])
+    @require_auth
+    def seek():
+        """API endpoint to seek relative to the current position.
+        
+        Expects {"offset_ms": <int>}; bursts are summed into one Seek call.
+        """
+        offset_ms = number_arg(request.get_json(silent=True) or {}, 'offset_ms', int)
+        if offset_ms is None:
+            return jsonify({"error": "Expected integer 'offset_ms'"}), 400
+        body, status = commands.seek(offset_ms, request.args.get('player'))
+        return command_reply(body, status)
+
+    @app.route('/position', methods=['POST'])
+    @require_auth
+    def set_position():
+        """API endpoint to seek to an absolute position.
+        
+        Expects {"position_ms": <int>}; the last value in a burst wins.
+        """
+        position_ms = number_arg(request.get_json(silent=True) or {}, 'position_ms', int)
+        if position_ms is None:
+            return jsonify({"error": "Expected integer 'position_ms'"}), 400
+        body, status = commands.set_position(position_ms, request.args.get('player'))
+        return command_reply(body, status)
+
+    @app.route('/volume', methods=['POST'])
+    @require_auth
+    def set_volume():
+        """API endpoint to change the volume.
+        
+        Expects {"volume": 0.0-1.0} or {"delta": <float>}; absolute values in a
+        burst replace each other and deltas are summed.
+        """
+        payload = request.get_json(silent=True) or {}
+        volume = number_arg(payload, 'volume', float)
+        delta = number_arg(payload, 'delta', float)
+        if volume is None and delta is None:
+            return jsonify({"error": "Expected 'volume' or 'delta'"}), 400
+        body, status = commands.set_volume(volume, delta, request.args.get('player'))
+        return command_reply(body, status)
+
+    @app.route('/tracklist', methods=['GET'])
+    @require_auth
+    def get_tracklist():
+        """API endpoint to page through the player's tracklist, or its playlists.
+        
+        Takes ?offset=&limit=&player=. Each item carries a tile rect [x, y, w, h]
+        into the page's sprite atlas, fetched from /tracklist/atlas/<atlas>.
+        """
+        player_id, player_obj, error = commands.resolve_player(request.args.get('player'))
+        if error:
+            body, status = error
+            return command_reply(body, status)
+        
+        offset = request.args.get('offset', 0, type=int)
+        limit = request.args.get('limit', TRACKLIST_PAGE_LIMIT, type=int)
+        body, status = tracklist.get_tracklist(player_id, player_obj, offset, limit)
+        if status != 200:
+            return command_reply(body, status)
+        
+        if request.headers.get('If-None-Match') == body['version']:
+            return '', 304
+        response = jsonify(body)
+        response.headers['ETag'] = body['version']
+        response.headers['Cache-Control'] = 'private, max-age=0'
+        return response
+
+    @app.route('/tracklist/atlas/<atlas_id>', methods=['GET'])
+    @require_auth
+    def get_tracklist_atlas(atlas_id):
+        """API endpoint to get a tracklist sprite atlas as a JPEG."""
+        # The id names a file in the art store, so nothing but a digest is accepted
+        if len(atlas_id) != 32 or any(c not in '0123456789abcdef' for c in atlas_id):
+            return jsonify({"error": "Invalid atlas id"}), 400
+        
+        path = art_store.path_for(atlas_id)
+        if not os.path.exists(path):
+            return jsonify({"error": "Atlas not found"}), 404
+        
+        # Content-addressed, so a client may keep it for as long as it likes
+        response = send_file(path, mimetype='image/jpeg', etag=atlas_id, conditional=True, max_age=31536000)
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
+
+    @app.route('/tracklist/goto', methods=['POST'])
+    @require_auth
+    def tracklist_goto():
+        """API endpoint to play a tracklist entry or activate a playlist.
+        
+        Expects {"id": "<item id>", "source": "tracklist" | "playlists"}.
+        """
+        payload = request.get_json(silent=True) or {}
+        if not payload.get('id'):
+            return jsonify({"error": "Expected 'id'"}), 400
+        
+        player_id, player_obj, error = commands.resolve_player(request.args.get('player'))
+        if error:
+            body, status = error
+            return command_reply(body, status)
+        
+        body, status = tracklist.go_to(player_id, player_obj, payload['id'], payload.get('source', 'tracklist'))
+        return command_reply(body, status)
+
+    @app.route('/batch', methods=['POST'])
+    @require_auth
+    def batch():
+        """API endpoint to run several commands in one request.
+        
+        Expects {"commands": [{"command": "select_player", "player_id": "..."},
+        {"command": "play"}, ...], "stop_on_error": true}.
+        """
+        payload = request.get_json(silent=True) or {}
+        command_list = payload.get('commands')
+        if not isinstance(command_list, list) or not command_list:
+            return jsonify({"error": "Expected a non-empty 'commands' list"}), 400
+        
+        # The batch may switch players, so remember where every player stood
+        since = get_change_counts()
+        results, player_id = commands.run_batch(command_list, payload.get('stop_on_error', True))
+        
+        response = {
+            "success": all(r['status'] < 400 for r in results) and len(results) == len(command_list),
+            "results": results,
+            "current_player": player_id,
+        }
+        
+        if payload.get('wait') and player_id:
+            response.update(commands.wait_for_state(player_id, since.get(player_id, 0)))
+        else:
+            response['state'] = commands.get_state_snapshot(player_id)
+        
+        return jsonify(response)
             
     return app
\ No newline at end of file
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Artwork pipeline benchmarks
+---------------------------
+Times the server's artwork hot spots against a fixed, generated image
+corpus and writes JSON that can be compared across runs. Runs offline:
+no players, D-Bus or network needed.
+
+    python server/benchmarks/artwork_bench.py --iterations 10 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+from utils import art_store, art_identity
+from utils.image_utils import resize_image, generate_placeholder_art, encode_image_base64
+
+# name, size, mode, format, save options
+CORPUS = [
+    ("square-300-jpeg", (300, 300), "RGB", "JPEG", {"quality": 90}),
+    ("square-640-jpeg", (640, 640), "RGB", "JPEG", {"quality": 90}),
+    ("square-1200-jpeg", (1200, 1200), "RGB", "JPEG", {"quality": 90}),
+    ("square-3000-jpeg", (3000, 3000), "RGB", "JPEG", {"quality": 90}),
+    ("square-1200-progressive", (1200, 1200), "RGB", "JPEG", {"quality": 90, "progressive": True}),
+    ("landscape-1920x1080-jpeg", (1920, 1080), "RGB", "JPEG", {"quality": 90}),
+    ("portrait-720x1280-jpeg", (720, 1280), "RGB", "JPEG", {"quality": 90}),
+    ("square-1200-cmyk-jpeg", (1200, 1200), "CMYK", "JPEG", {"quality": 90}),
+    ("square-640-png", (640, 640), "RGB", "PNG", {}),
+    ("square-1200-rgba-png", (1200, 1200), "RGBA", "PNG", {}),
+    ("square-640-palette-png", (640, 640), "P", "PNG", {}),
+]
+
+def make_image(size, mode):
+    """Deterministic test image with gradients and shapes, so JPEG sizes are realistic."""
+    width, height = size
+    gradient = Image.linear_gradient("L").resize(size)
+    img = Image.merge("RGB", (gradient, gradient.rotate(90).resize(size), gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+    draw = ImageDraw.Draw(img)
+    for i in range(12):
+        x, y = (i * 97) % width, (i * 53) % height
+        draw.ellipse((x, y, x + width // 5, y + height // 5), fill=((i * 40) % 256, (i * 90) % 256, (i * 20) % 256))
+
+    if mode == "RGBA":
+        img = img.convert("RGBA")
+        img.putalpha(gradient)
+    elif mode == "P":
+        img = img.convert("P", palette=Image.ADAPTIVE, colors=64)
+    elif mode != "RGB":
+        img = img.convert(mode)
+    return img
+
+def build_corpus():
+    """Encode the corpus images once, returning (name, bytes) pairs."""
+    corpus = []
+    for name, size, mode, fmt, options in CORPUS:
+        buffer = BytesIO()
+        make_image(size, mode).save(buffer, format=fmt, **options)
+        corpus.append((name, buffer.getvalue()))
+    return corpus
+
+def reset_art_caches():
+    """Forget processed artwork, so every iteration runs the full pipeline."""
+    art_identity.source_index.clear()
+    art_identity.identity_index.clear()
+    art_store.known_digests.clear()
+
+def measure(fn, iterations, setup=None):
+    """Run fn repeatedly, returning timings in ms, peak traced memory in KB and the last result."""
+    timings = []
+    peak = 0
+    result = None
+    for _ in range(iterations):
+        if setup:
+            setup()
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return timings, peak / 1024, result
+
+def summarize(case, stage, timings, peak_kb, output):
+    """Build one result row."""
+    ordered = sorted(timings)
+    return {
+        "case": case,
+        "stage": stage,
+        "iterations": len(timings),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "min_ms": round(ordered[0], 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "peak_kb": round(peak_kb, 1),
+        "output_bytes": len(output) if output else 0,
+    }
+
+def run(iterations, case_filter=None):
+    """Run all benchmarks and return the JSON-serialisable report."""
+    results = []
+
+    for name, source in build_corpus():
+        if case_filter and case_filter not in name:
+            continue
+
+        timings, peak, resized = measure(lambda: resize_image(source), iterations, setup=reset_art_caches)
+        row = summarize(name, "resize_image", timings, peak, resized)
+        row["source_bytes"] = len(source)
+        results.append(row)
+
+        # Same call again without resetting: the deduplicated path a repeat cover takes
+        timings, peak, cached = measure(lambda: resize_image(source), iterations)
+        results.append(summarize(name, "resize_image_cached", timings, peak, cached))
+
+        timings, peak, encoded = measure(lambda: encode_image_base64(resized), iterations)
+        results.append(summarize(name, "encode_image_base64", timings, peak, encoded))
+
+        timings, peak, etag = measure(lambda: hashlib.md5(encoded.encode("utf-8")).hexdigest(), iterations)
+        results.append(summarize(name, "etag_md5_base64", timings, peak, etag))
+
+        timings, peak, digest = measure(lambda: art_store.art_digest(resized), iterations)
+        results.append(summarize(name, "art_digest", timings, peak, digest))
+
+    if not case_filter or "placeholder" in case_filter:
+        timings, peak, placeholder = measure(lambda: generate_placeholder_art("Benchmark Title"), iterations)
+        results.append(summarize("placeholder", "generate_placeholder_art", timings, peak, placeholder))
+
+    import PIL
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "iterations": iterations,
+            "note": "peak_kb counts Python-level allocations only (tracemalloc)",
+        },
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the artwork pipeline")
+    parser.add_argument("--iterations", type=int, default=5, help="Runs per case and stage")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    # Keep the benchmark's art store away from the real one
+    with tempfile.TemporaryDirectory() as store_dir:
+        art_store.ART_STORE_DIR = store_dir
+        # Silence the pipeline's per-image logging while timing
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        try:
+            report = run(args.iterations, args.filter)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Wrote {len(report['results'])} results to {args.output}")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,598 @@
+#!/usr/bin/env python3
+"""
+MPRIS traffic record and replay
+-------------------------------
+Records what real players do on the session bus (method calls, their
+replies and latencies, signals, players appearing and leaving) to a JSON
+lines trace, and replays a trace on a private bus with fake players, at
+recorded speed or faster. The server can then be benchmarked and tested
+against real player behaviour on a headless machine.
+
+Record until Ctrl+C (or for --duration seconds):
+
+    python server/benchmarks/dbus_trace.py record firefox.jsonl
+
+Replay at 4x speed and run the server against it:
+
+    python server/benchmarks/dbus_trace.py replay firefox.jsonl --speed 4 \\
+        --exec "python server/mpris_server.py"
+
+Without --exec the bus address is printed, so the server or other tools
+can be started by hand with DBUS_SESSION_BUS_ADDRESS set to it.
+
+Fake players keep the properties they reported and answer Get, GetAll
+and player methods the way the recorded player last did: with the same
+latency, the same error, or no reply at all if the player hung.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dbus
+import dbus.bus
+import dbus.lowlevel
+from dbus.mainloop.glib import DBusGMainLoop
+from gi.repository import GLib
+
+from config import MPRIS_SERVICE_PREFIX
+
+MPRIS_PATH = '/org/mpris/MediaPlayer2'
+MPRIS_INTERFACES = ('org.mpris.MediaPlayer2', 'org.mpris.MediaPlayer2.Player')
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+
+MONITOR_RULES = [
+    f"type='method_call',path='{MPRIS_PATH}'",
+    f"type='signal',path='{MPRIS_PATH}'",
+    "type='method_return'",
+    "type='error'",
+    "type='signal',sender='org.freedesktop.DBus',interface='org.freedesktop.DBus',"
+    f"member='NameOwnerChanged',arg0namespace='{MPRIS_SERVICE_PREFIX.rstrip('.')}'",
+]
+
+INTROSPECTION = """<!DOCTYPE node PUBLIC "-//freedesktop//DTD D-BUS Object Introspection 1.0//EN"
+ "http://www.freedesktop.org/standards/dbus/1.0/introspect.dtd">
+<node>
+  <interface name="org.freedesktop.DBus.Properties"/>
+  <interface name="org.mpris.MediaPlayer2"/>
+  <interface name="org.mpris.MediaPlayer2.Player"/>
+</node>
+"""
+
+BASIC_TYPES = {
+    dbus.Boolean: 'b',
+    dbus.Byte: 'y',
+    dbus.Int16: 'n',
+    dbus.UInt16: 'q',
+    dbus.Int32: 'i',
+    dbus.UInt32: 'u',
+    dbus.Int64: 'x',
+    dbus.UInt64: 't',
+    dbus.Double: 'd',
+    dbus.String: 's',
+    dbus.ObjectPath: 'o',
+    dbus.Signature: 'g',
+}
+
+BASIC_CONSTRUCTORS = {code: dbus_type for dbus_type, code in BASIC_TYPES.items()}
+
+# --- Value encoding ---------------------------------------------------------
+# Message signatures give the type of every argument except variant
+# contents, so variants carry their signature: {"v": signature, "d": data}.
+
+def signature_of(value):
+    """D-Bus signature of a dbus-python value."""
+    code = BASIC_TYPES.get(type(value))
+    if code:
+        return code
+    if isinstance(value, dbus.Struct):
+        return '(' + ''.join(signature_of(item) for item in value) + ')'
+    if isinstance(value, dict):
+        signature = getattr(value, 'signature', None)
+        if not signature:
+            key, item = next(iter(value.items()), ('', ''))
+            signature = signature_of(key) + ('v' if getattr(item, 'variant_level', 0) else signature_of(item))
+        return 'a{' + signature + '}'
+    if isinstance(value, (bytes, dbus.ByteArray)):
+        return 'ay'
+    if isinstance(value, (list, tuple)):
+        signature = getattr(value, 'signature', None)
+        if not signature:
+            signature = signature_of(value[0]) if value else 'v'
+        return 'a' + signature
+    if isinstance(value, bool):
+        return 'b'
+    if isinstance(value, int):
+        return 'x'
+    if isinstance(value, float):
+        return 'd'
+    return 's'
+
+def encode(value):
+    """Convert a dbus-python value to JSON-compatible data."""
+    level = getattr(value, 'variant_level', 0)
+    if level:
+        encoded = {'v': signature_of(value), 'd': _encode_plain(value)}
+        if level > 1:
+            encoded['level'] = level
+        return encoded
+    return _encode_plain(value)
+
+def _encode_plain(value):
+    if isinstance(value, dict):
+        return [[encode(key), encode(item)] for key, item in value.items()]
+    if isinstance(value, (bytes, dbus.ByteArray)):
+        return list(value)
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if isinstance(value, dbus.Boolean):
+        return bool(value)
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        return float(value)
+    return str(value)
+
+def decode(signature, data, variant_level=0):
+    """Rebuild a typed dbus-python value from encoded data."""
+    options = {'variant_level': variant_level} if variant_level else {}
+    if signature == 'v':
+        return decode(data['v'], data['d'], data.get('level', 1))
+    if signature.startswith('a{'):
+        inner = signature[2:-1]
+        key_signature, item_signature = list(dbus.Signature(inner))
+        items = ((decode(key_signature, key), decode(item_signature, item)) for key, item in data)
+        return dbus.Dictionary(items, signature=inner, **options)
+    if signature.startswith('a'):
+        inner = signature[1:]
+        return dbus.Array([decode(inner, item) for item in data], signature=inner, **options)
+    if signature.startswith('('):
+        inner = signature[1:-1]
+        items = [decode(item_signature, item) for item_signature, item in zip(dbus.Signature(inner), data)]
+        return dbus.Struct(items, signature=inner, **options)
+    return BASIC_CONSTRUCTORS[signature](data, **options)
+
+def encode_args(message):
+    return [encode(arg) for arg in message.get_args_list()]
+
+def decode_args(signature, args):
+    return [decode(arg_signature, arg) for arg_signature, arg in zip(dbus.Signature(signature or ''), args)]
+
+# --- Recording ---------------------------------------------------------------
+
+class TraceRecorder:
+    """Writes MPRIS traffic seen by a bus monitor to a JSON lines trace."""
+
+    def __init__(self, output):
+        self.output = output
+        self.start = time.monotonic()
+        # (caller, serial) -> (call time, destination)
+        self.pending = {}
+        self.counts = {}
+
+    def write(self, event):
+        event['t'] = round(time.monotonic() - self.start, 6)
+        self.output.write(json.dumps(event) + '\n')
+        self.counts[event['type']] = self.counts.get(event['type'], 0) + 1
+
+    def snapshot(self, bus):
+        """Record the players already running and their properties."""
+        obj = bus.get_object('org.freedesktop.DBus', '/org/freedesktop/DBus')
+        dbus_interface = dbus.Interface(obj, 'org.freedesktop.DBus')
+        for name in dbus_interface.ListNames():
+            if not name.startswith(MPRIS_SERVICE_PREFIX):
+                continue
+            try:
+                owner = dbus_interface.GetNameOwner(name)
+                player_obj = bus.get_object(name, MPRIS_PATH, introspect=False)
+                props_interface = dbus.Interface(player_obj, PROPERTIES_INTERFACE)
+                properties = {
+                    interface: encode(props_interface.GetAll(interface, timeout=2))
+                    for interface in MPRIS_INTERFACES
+                }
+            except dbus.exceptions.DBusException as e:
+                print(f"Skipping unresponsive player {name}: {e}")
+                continue
+            self.write({'type': 'player', 'name': str(name), 'owner': str(owner), 'properties': properties})
+
+    def on_message(self, connection, message):
+        message_type = message.get_type()
+
+        if message_type == dbus.lowlevel.MESSAGE_TYPE_METHOD_CALL:
+            self.pending[(message.get_sender(), message.get_serial())] = (time.monotonic(), message.get_destination())
+            self.write({
+                'type': 'call',
+                'sender': message.get_sender(),
+                'destination': message.get_destination(),
+                'serial': message.get_serial(),
+                'interface': message.get_interface(),
+                'member': message.get_member(),
+                'signature': message.get_signature(),
+                'args': encode_args(message),
+            })
+
+        elif message_type in (dbus.lowlevel.MESSAGE_TYPE_METHOD_RETURN, dbus.lowlevel.MESSAGE_TYPE_ERROR):
+            call = self.pending.pop((message.get_destination(), message.get_reply_serial()), None)
+            if not call:
+                return dbus.lowlevel.HANDLER_RESULT_HANDLED
+            event = {
+                'type': 'reply',
+                'sender': message.get_sender(),
+                'destination': message.get_destination(),
+                'reply_serial': message.get_reply_serial(),
+                'latency': round(time.monotonic() - call[0], 6),
+                'signature': message.get_signature(),
+                'args': encode_args(message),
+            }
+            if message_type == dbus.lowlevel.MESSAGE_TYPE_ERROR:
+                event['type'] = 'error'
+                event['error_name'] = message.get_error_name()
+            self.write(event)
+
+        elif message_type == dbus.lowlevel.MESSAGE_TYPE_SIGNAL:
+            if message.get_member() == 'NameOwnerChanged' and message.get_interface() == 'org.freedesktop.DBus':
+                name, old_owner, new_owner = message.get_args_list()
+                self.write({'type': 'name_owner', 'name': str(name), 'old': str(old_owner), 'new': str(new_owner)})
+            elif message.get_path() == MPRIS_PATH:
+                self.write({
+                    'type': 'signal',
+                    'sender': message.get_sender(),
+                    'path': message.get_path(),
+                    'interface': message.get_interface(),
+                    'member': message.get_member(),
+                    'signature': message.get_signature(),
+                    'args': encode_args(message),
+                })
+
+        return dbus.lowlevel.HANDLER_RESULT_HANDLED
+
+    def finish(self):
+        """Record calls that were never answered, so replay can hang on them too."""
+        now = time.monotonic()
+        for (sender, serial), (called_at, destination) in self.pending.items():
+            self.write({
+                'type': 'no_reply',
+                'sender': sender,
+                'destination': destination,
+                'reply_serial': serial,
+                'waited': round(now - called_at, 6),
+            })
+        self.pending.clear()
+
+def record(args):
+    DBusGMainLoop(set_as_default=True)
+    loop = GLib.MainLoop()
+
+    with open(args.trace, 'w') as output:
+        recorder = TraceRecorder(output)
+        recorder.snapshot(dbus.SessionBus())
+
+        # A monitor connection can't send anything else, so it gets its own
+        monitor = dbus.SessionBus(private=True)
+        monitor.add_message_filter(recorder.on_message)
+        monitor.call_blocking(
+            'org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus.Monitoring',
+            'BecomeMonitor', 'asu', (MONITOR_RULES, 0)
+        )
+
+        if args.duration:
+            GLib.timeout_add_seconds(args.duration, loop.quit)
+
+        print(f"Recording MPRIS traffic to {args.trace}, press Ctrl+C to stop")
+        try:
+            loop.run()
+        except KeyboardInterrupt:
+            pass
+        recorder.finish()
+
+    print(f"Recorded events: {recorder.counts}")
+
+# --- Replay ------------------------------------------------------------------
+
+def call_key(interface, member, args):
+    """What a call's behaviour is remembered by: the method, plus the property for Get."""
+    if interface == PROPERTIES_INTERFACE and member == 'Get' and len(args) >= 2:
+        return f"{interface}.Get:{args[0]}.{args[1]}"
+    if interface == PROPERTIES_INTERFACE and member == 'GetAll' and args:
+        return f"{interface}.GetAll:{args[0]}"
+    return f"{interface}.{member}"
+
+class FakePlayer:
+    """Owns a player's bus name on the replay bus and answers calls as the recorded player did."""
+
+    def __init__(self, replayer, name):
+        self.replayer = replayer
+        self.name = name
+        self.properties = {interface: {} for interface in MPRIS_INTERFACES}
+        # call key -> {'outcome': 'reply' | 'error' | 'hang', 'latency': seconds, ...}
+        self.behaviour = {}
+        self.connection = dbus.bus.BusConnection(replayer.address)
+        self.connection.add_message_filter(self.on_message)
+        self.connection.request_name(name)
+
+    def close(self):
+        self.connection.close()
+
+    def update_properties(self, interface, values):
+        self.properties.setdefault(interface, {}).update(values)
+
+    def emit(self, event):
+        """Send a recorded signal from this player."""
+        signal = dbus.lowlevel.SignalMessage(event['path'], event['interface'], event['member'])
+        args = decode_args(event['signature'], event['args'])
+        if args:
+            signal.append(*args, signature=event['signature'])
+
+        if event['interface'] == PROPERTIES_INTERFACE and event['member'] == 'PropertiesChanged':
+            interface, changed, invalidated = args
+            self.update_properties(str(interface), changed)
+            for name in invalidated:
+                self.properties.get(str(interface), {}).pop(name, None)
+
+        self.connection.send_message(signal)
+
+    def _reply(self, message, args):
+        """Answer a live call from the recorded state."""
+        interface = message.get_interface()
+        member = message.get_member()
+
+        if interface == 'org.freedesktop.DBus.Introspectable':
+            return 's', [INTROSPECTION]
+        if interface == 'org.freedesktop.DBus.Peer':
+            return '', []
+        if interface == PROPERTIES_INTERFACE and member == 'Get':
+            value = self.properties.get(str(args[0]), {}).get(str(args[1]))
+            if value is None:
+                raise dbus.exceptions.DBusException(
+                    f"No such property {args[1]}", name='org.freedesktop.DBus.Error.UnknownProperty'
+                )
+            return 'v', [value]
+        if interface == PROPERTIES_INTERFACE and member == 'GetAll':
+            return 'a{sv}', [dbus.Dictionary(self.properties.get(str(args[0]), {}), signature='sv')]
+        if interface == PROPERTIES_INTERFACE and member == 'Set':
+            self.update_properties(str(args[0]), {str(args[1]): args[2]})
+        return '', []
+
+    def on_message(self, connection, message):
+        if message.get_type() != dbus.lowlevel.MESSAGE_TYPE_METHOD_CALL:
+            return dbus.lowlevel.HANDLER_RESULT_NOT_YET_HANDLED
+
+        args = message.get_args_list()
+        key = call_key(message.get_interface(), message.get_member(), args)
+        behaviour = self.behaviour.get(key, {'outcome': 'reply', 'latency': 0})
+        self.replayer.count(f"served.{behaviour['outcome']}")
+
+        if behaviour['outcome'] == 'hang' or message.get_no_reply():
+            return dbus.lowlevel.HANDLER_RESULT_HANDLED
+
+        if behaviour['outcome'] == 'error':
+            response = dbus.lowlevel.ErrorMessage(message, behaviour['error_name'], behaviour.get('error_message', ''))
+        else:
+            try:
+                signature, reply_args = self._reply(message, args)
+            except dbus.exceptions.DBusException as e:
+                response = dbus.lowlevel.ErrorMessage(message, e.get_dbus_name(), e.get_dbus_message())
+            else:
+                response = dbus.lowlevel.MethodReturnMessage(message)
+                if reply_args:
+                    response.append(*reply_args, signature=signature)
+
+        def send():
+            connection.send_message(response)
+            return False
+
+        delay = self.replayer.scaled(behaviour['latency'])
+        if delay > 0:
+            GLib.timeout_add(int(delay * 1000), send)
+        else:
+            send()
+        return dbus.lowlevel.HANDLER_RESULT_HANDLED
+
+class TraceReplayer:
+    """Acts out a recorded trace on a bus with fake players."""
+
+    def __init__(self, events, address, speed):
+        self.events = events
+        self.address = address
+        self.speed = speed
+        # Well-known name -> FakePlayer, and recorded unique name -> FakePlayer
+        self.players = {}
+        self.owners = {}
+        # (caller, serial) -> (FakePlayer, call key)
+        self.pending = {}
+        self.counts = {}
+        self.position = 0
+        self.start = None
+
+    def count(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def scaled(self, seconds):
+        """Recorded duration at replay speed; speed 0 means no waiting at all."""
+        return seconds / self.speed if self.speed else 0
+
+    def _player_for(self, bus_name):
+        return self.players.get(bus_name) or self.owners.get(bus_name)
+
+    def _add_player(self, name, owner):
+        self._remove_player(name)
+        player = FakePlayer(self, name)
+        self.players[name] = player
+        self.owners[owner] = player
+        self.count('players')
+        return player
+
+    def _remove_player(self, name):
+        player = self.players.pop(name, None)
+        if player:
+            for owner in [owner for owner, value in self.owners.items() if value is player]:
+                del self.owners[owner]
+            player.close()
+
+    def apply(self, event):
+        kind = event['type']
+
+        if kind == 'player':
+            player = self._add_player(event['name'], event['owner'])
+            for interface, values in event['properties'].items():
+                player.update_properties(interface, decode('a{sv}', values))
+
+        elif kind == 'name_owner':
+            if event['new']:
+                self._add_player(event['name'], event['new'])
+            else:
+                self._remove_player(event['name'])
+
+        elif kind == 'signal':
+            player = self.owners.get(event['sender'])
+            if player:
+                player.emit(event)
+                self.count('signals')
+
+        elif kind == 'call':
+            player = self._player_for(event['destination'])
+            if player:
+                args = decode_args(event['signature'], event['args'])
+                key = call_key(event['interface'], event['member'], args)
+                self.pending[(event['sender'], event['serial'])] = (player, key, args)
+
+        elif kind in ('reply', 'error', 'no_reply'):
+            caller = event['sender'] if kind == 'no_reply' else event['destination']
+            call = self.pending.pop((caller, event['reply_serial']), None)
+            if not call:
+                return
+            player, key, args = call
+            if kind == 'no_reply':
+                player.behaviour[key] = {'outcome': 'hang', 'latency': 0}
+                return
+            player.behaviour[key] = {
+                'outcome': 'reply' if kind == 'reply' else 'error',
+                'latency': event['latency'],
+                'error_name': event.get('error_name'),
+                'error_message': str(event['args'][0]) if kind == 'error' and event['args'] else '',
+            }
+            # Replies carry player state too: keep what Get and GetAll returned
+            if kind == 'reply' and key.startswith(PROPERTIES_INTERFACE + '.Get:'):
+                value, = decode_args(event['signature'], event['args'])
+                player.update_properties(str(args[0]), {str(args[1]): value})
+            elif kind == 'reply' and key.startswith(PROPERTIES_INTERFACE + '.GetAll:'):
+                values, = decode_args(event['signature'], event['args'])
+                player.update_properties(str(args[0]), values)
+
+    def _run_due(self):
+        elapsed = time.monotonic() - self.start
+        while self.position < len(self.events) and self.scaled(self.events[self.position]['t']) <= elapsed:
+            self.apply(self.events[self.position])
+            self.position += 1
+        self._schedule()
+        return False
+
+    def _schedule(self):
+        if self.position >= len(self.events):
+            self.on_finished()
+            return
+        delay = self.scaled(self.events[self.position]['t']) - (time.monotonic() - self.start)
+        GLib.timeout_add(max(0, int(delay * 1000)), self._run_due)
+
+    def run(self, on_finished):
+        self.on_finished = on_finished
+        self.start = time.monotonic()
+        self._run_due()
+
+def load_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def start_private_bus():
+    """Start a throwaway dbus-daemon and return (process, address)."""
+    process = subprocess.Popen(
+        ['dbus-daemon', '--session', '--nofork', '--print-address'],
+        stdout=subprocess.PIPE, text=True
+    )
+    address = process.stdout.readline().strip()
+    if not address:
+        process.terminate()
+        raise RuntimeError("dbus-daemon didn't report an address")
+    return process, address
+
+def replay(args):
+    DBusGMainLoop(set_as_default=True)
+    loop = GLib.MainLoop()
+    events = load_trace(args.trace)
+
+    bus_process = None
+    address = args.address
+    if not address:
+        bus_process, address = start_private_bus()
+
+    child = None
+    result = {'code': 0}
+
+    def on_finished():
+        print(f"Trace finished: {replayer.counts}")
+        if args.loop:
+            replayer.position = 0
+            replayer.pending.clear()
+            replayer.run(on_finished)
+        elif not child:
+            loop.quit()
+
+    def check_child():
+        if child.poll() is None:
+            return True
+        result['code'] = child.returncode
+        loop.quit()
+        return False
+
+    try:
+        replayer = TraceReplayer(events, address, args.speed)
+        if args.exec:
+            env = dict(os.environ, DBUS_SESSION_BUS_ADDRESS=address)
+            child = subprocess.Popen(args.exec, shell=True, env=env)
+            GLib.timeout_add(200, check_child)
+        else:
+            print(f"export DBUS_SESSION_BUS_ADDRESS='{address}'")
+
+        replayer.run(on_finished)
+        try:
+            loop.run()
+        except KeyboardInterrupt:
+            pass
+    finally:
+        if child and child.poll() is None:
+            child.terminate()
+            child.wait()
+        if bus_process:
+            bus_process.terminate()
+            bus_process.wait()
+
+    return result['code']
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay MPRIS D-Bus traffic")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help="Record MPRIS traffic on the session bus")
+    record_parser.add_argument('trace', help="Trace file to write")
+    record_parser.add_argument('--duration', type=int, help="Stop after this many seconds")
+
+    replay_parser = subparsers.add_parser('replay', help="Replay a trace with fake players")
+    replay_parser.add_argument('trace', help="Trace file to replay")
+    replay_parser.add_argument('--speed', type=float, default=1.0,
+                               help="Replay speed multiplier, 0 for no delays (default: 1)")
+    replay_parser.add_argument('--address', help="Replay on this bus instead of a private one")
+    replay_parser.add_argument('--exec', help="Command to run against the replay bus; replay stops when it exits")
+    replay_parser.add_argument('--loop', action='store_true', help="Start the trace again when it ends")
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        record(args)
+    else:
+        sys.exit(replay(args))
+
+if __name__ == "__main__":
+    main()
@@ -18,14 +18,153 @@ PRIORITIZE_PLAYING = True
 
 MUSICBRAINZ_CACHE_SIZE_LIMIT = 250
 ART_CACHE_SIZE_LIMIT = 20
+ART_URL_CACHE_SIZE_LIMIT = 50
+# Seconds remote art is reused without revalidation when the origin sends no Cache-Control
+ART_URL_DEFAULT_TTL = 300
+
+# Cover images looked for next to local tracks without artwork, best first,
+# and how many directories are remembered along with their mtime
+LOCAL_ART_SIDECAR_NAMES = ('cover', 'folder', 'front', 'album', 'albumart')
+LOCAL_ART_INDEX_SIZE_LIMIT = 2000
+
+# How identical artwork is recognised across paths, URLs and players:
+# 'pixels' matches identical decoded images, 'perceptual' also matches re-encodes
+ART_IDENTITY_MODE = 'pixels'
+ART_INDEX_SIZE_LIMIT = 5000
+
+# Seconds a resolved media info result is shared between clients, unless the
+# player reports a change sooner
+MEDIA_INFO_FRESHNESS = 1.0
+
+# Keep media info and artwork resolved for every live player, not only the
+# current one, so switching players answers from memory. Each round refreshes
+# players that changed, spending at most WARM_CACHE_BUDGET seconds; with change
+# signals a result is reused for up to WARM_CACHE_MAX_AGE seconds
+WARM_CACHE_ENABLED = True
+WARM_CACHE_INTERVAL = 2
+WARM_CACHE_BUDGET = 0.5
+WARM_CACHE_MAX_AGE = 30
+
+# State versions per player kept as bases for delta responses
+STATE_HISTORY_SIZE = 16
 
 DEFAULT_ARTWORK_SIZE = (480, 480)
 
+# JPEG encoding for the Presto's decoder: baseline, 4:2:0 and optimized
+# Huffman tables, at the highest quality in range that fits the byte budget
+ARTWORK_BYTE_BUDGET = 48 * 1024
+ARTWORK_MAX_QUALITY = 90
+ARTWORK_MIN_QUALITY = 30
+
+# Per-client artwork tiers, best first, as (name, size, byte budget, max quality).
+# The first tier is the artwork as stored; the others are re-encoded from it
+# for clients whose link, decoder or free heap can't keep up. jpegdec can't
+# scale up, so smaller sizes are shown centred.
+ADAPTIVE_ART_ENABLED = True
+ADAPTIVE_ART_TIERS = [
+    ('full', DEFAULT_ARTWORK_SIZE[0], ARTWORK_BYTE_BUDGET, ARTWORK_MAX_QUALITY),
+    ('lean', DEFAULT_ARTWORK_SIZE[0], 24 * 1024, 80),
+    ('small', DEFAULT_ARTWORK_SIZE[0] // 2, 12 * 1024, 85),
+]
+# A tier fits a client if its artwork is expected to download and decode
+# within these times and its buffer fits free heap this many times over
+ADAPTIVE_ART_DOWNLOAD_TARGET_MS = 1000
+ADAPTIVE_ART_DECODE_LIMIT_MS = 800
+ADAPTIVE_ART_HEAP_FACTOR = 3
+# Moving up a tier needs estimates this far inside the limits, so clients
+# near a boundary don't flap between tiers
+ADAPTIVE_ART_UPGRADE_MARGIN = 0.75
+# Weight of the newest report in a client's smoothed measurements. Reports
+# come once per cover, so a worse link is followed faster than a better one
+ADAPTIVE_ART_SMOOTHING = 0.3
+ADAPTIVE_ART_DEGRADE_SMOOTHING = 0.7
+CLIENT_PROFILE_LIMIT = 50
+ART_VARIANT_CACHE_SIZE_LIMIT = 100
+
+# Screen-edge regions sampled for each of the Presto's 7 ambient LEDs, as
+# (left, top, right, bottom) fractions of the artwork, in LED index order
+LED_REGIONS = [
+    (0.85, 0.50, 1.00, 1.00),  # right, lower
+    (0.85, 0.00, 1.00, 0.50),  # right, upper
+    (0.67, 0.00, 1.00, 0.15),  # top, right
+    (0.33, 0.00, 0.67, 0.15),  # top, centre
+    (0.00, 0.00, 0.33, 0.15),  # top, left
+    (0.00, 0.00, 0.15, 0.50),  # left, upper
+    (0.00, 0.50, 0.15, 1.00),  # left, lower
+]
+PALETTE_CACHE_SIZE_LIMIT = 100
+
+# Side of the RGB565 preview grid sent with metadata, painted before the artwork decodes
+PREVIEW_GRID_SIZE = 16
+PREVIEW_CACHE_SIZE_LIMIT = 100
+
+# Seconds to collect seek/position/volume inputs before sending one D-Bus call
+INPUT_COALESCE_WINDOW = 0.15
+
+# How long a command may wait for the player to report its new state before
+# answering, and the fixed delay used when change signals aren't available
+COMMAND_STATE_TIMEOUT = 1.0
+COMMAND_STATE_FALLBACK_DELAY = 0.25
+
+# Seconds a command request waits for the player before answering 202 with a
+# command id, and how long the D-Bus call may keep running after that
+COMMAND_DEADLINE = 1.5
+COMMAND_CALL_TIMEOUT = 10
+# Consecutive missed deadlines after which a player's commands are refused,
+# and for how many seconds before one is let through again
+COMMAND_BREAKER_THRESHOLD = 3
+COMMAND_BREAKER_COOLDOWN = 30
+# Dispatched commands whose outcome can still be looked up
+COMMAND_HISTORY_SIZE = 100
+
+# Tracklist browsing: thumbnail size in the sprite atlas, most entries per
+# page, and how many atlases are remembered per tracklist version
+TRACKLIST_TILE_SIZE = 64
+TRACKLIST_PAGE_LIMIT = 20
+TRACKLIST_CACHE_SIZE_LIMIT = 20
+
+# UDP change notifications to registered devices on the LAN
+BEACON_ENABLED = True
+BEACON_REGISTRATION_TTL = 600
+# Re-check player state at least this often, for players that don't emit signals
+BEACON_CHECK_INTERVAL = 2
+
+# Other PrestoDeck servers whose players are merged into this server's player
+# list, so one device can follow and control players on several machines:
+# [{'name': 'laptop', 'url': 'https://192.168.1.20:5000', 'token': '...',
+#   'fingerprint': '<SHA-256 printed by --init on the peer>'}]
+# A peer with a CA-signed certificate can give 'ca', a CA bundle path, instead
+PEER_SERVERS = []
+# Seconds between player list refreshes from each peer
+PEER_POLL_INTERVAL = 5
+PEER_TIMEOUT = 2
+# Verify peers without a pinned fingerprint against the system CAs. Turning
+# this off sends the API token over unverified TLS
+PEER_VERIFY_TLS = True
+# UDP port for change beacons from peers, or 0 to rely on polling
+PEER_BEACON_PORT = 5006
+
+# Log output level, with per-module overrides such as {'modules.dbus_interface': 'DEBUG'}
+LOG_LEVEL = 'WARNING'
+LOG_MODULE_LEVELS = {}
+# Records at or above this level are also kept in memory and served on /logs
+LOG_BUFFER_LEVEL = 'INFO'
+LOG_BUFFER_SIZE = 500
+# Seconds in which a repeated message is printed only once
+LOG_RATE_LIMIT = 10
+
+# Latency reports from devices kept for the percentiles on /latency
+LATENCY_SAMPLE_SIZE = 500
 
 TOKEN_FILE = os.path.expanduser("~/.config/prestodeck/token")
 CERT_FILE = os.path.expanduser("~/.config/cert.pem")
 KEY_FILE = os.path.expanduser("~/.config/key.pem")
 
+# Resized artwork, stored as immutable files named by content hash
+ART_STORE_DIR = os.path.expanduser("~/.cache/prestodeck/art")
+# Which cover in the art store belongs to which local track, written by prerender_library.py
+LIBRARY_INDEX_FILE = os.path.expanduser("~/.cache/prestodeck/library.sqlite")
+
 DEFAULT_PORT = 5000
 
 # Get or generate API token
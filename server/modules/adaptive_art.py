@@ -0,0 +1,230 @@
+"""Adaptive artwork quality per client, from what each device reports about its link and decoder.
+
+Devices send these headers with their artwork requests, describing the
+artwork they received last:
+
+    X-Client-Id       stable id of the device
+    X-Download-Ms     how long its download took
+    X-Download-Bytes  its size
+    X-Decode-Ms       how long it took to decode
+    X-Free-Heap       free heap on the device, in bytes
+
+Each client's profile keeps smoothed throughput and decode speed, and every
+request picks the best tier in ADAPTIVE_ART_TIERS whose expected download
+and decode times and buffer size fit. Lower tiers are re-encoded from the
+stored artwork the first time any client needs them. Requests without a
+client id get the stored artwork.
+"""
+import time
+import random
+import threading
+from io import BytesIO
+from config import (
+    ADAPTIVE_ART_ENABLED, ADAPTIVE_ART_TIERS, ADAPTIVE_ART_DOWNLOAD_TARGET_MS, ADAPTIVE_ART_DECODE_LIMIT_MS,
+    ADAPTIVE_ART_HEAP_FACTOR, ADAPTIVE_ART_UPGRADE_MARGIN, ADAPTIVE_ART_SMOOTHING, ADAPTIVE_ART_DEGRADE_SMOOTHING,
+    CLIENT_PROFILE_LIMIT, ART_VARIANT_CACHE_SIZE_LIMIT
+)
+from modules import metrics
+from utils import art_store
+from utils.image_utils import encode_jpeg
+from utils.single_flight import SingleFlight
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+FULL_TIER = ADAPTIVE_ART_TIERS[0]
+
+class ClientProfile:
+    """Smoothed measurements of one device and the tier it was last served."""
+
+    def __init__(self, client_id):
+        self.client_id = client_id
+        # Bytes per millisecond
+        self.throughput = None
+        # Decode milliseconds per pixel
+        self.decode_rate = None
+        self.free_heap = None
+        self.tier = FULL_TIER
+        self.reason = 'no reports yet'
+        self.updated = time.time()
+
+    def to_dict(self):
+        name, size, budget, _ = self.tier
+        return {
+            'client': self.client_id,
+            'tier': name,
+            'size': size,
+            'budget': budget,
+            'reason': self.reason,
+            'throughput_kbps': round(self.throughput * 8, 1) if self.throughput else None,
+            'full_decode_ms': round(self.decode_rate * FULL_TIER[1] ** 2) if self.decode_rate else None,
+            'free_heap': self.free_heap,
+            'updated': self.updated,
+        }
+
+_lock = threading.Lock()
+profiles = {}
+# (art_id, tier name) -> digest of the re-encoded artwork in the art store
+variants = {}
+_encodes = SingleFlight()
+
+def _number(headers, name):
+    try:
+        value = float(headers.get(name, ''))
+    except ValueError:
+        return None
+    return value if value >= 0 else None
+
+def _smooth(previous, value, worse):
+    if previous is None:
+        return value
+    weight = ADAPTIVE_ART_DEGRADE_SMOOTHING if worse else ADAPTIVE_ART_SMOOTHING
+    return previous + weight * (value - previous)
+
+def update_profile(client_id, headers):
+    """Fold a request's reported measurements into its client's profile.
+
+    Download and decode times describe the artwork served last, so they are
+    normalised by that tier's size before smoothing.
+
+    Args:
+        client_id: Id the device sent in X-Client-Id
+        headers: Request headers
+
+    Returns:
+        The client's ClientProfile
+    """
+    download_ms = _number(headers, 'X-Download-Ms')
+    download_bytes = _number(headers, 'X-Download-Bytes')
+    decode_ms = _number(headers, 'X-Decode-Ms')
+    free_heap = _number(headers, 'X-Free-Heap')
+
+    with _lock:
+        profile = profiles.get(client_id)
+        if profile is None:
+            if len(profiles) >= CLIENT_PROFILE_LIMIT:
+                random_key = random.choice(list(profiles.keys()))
+                del profiles[random_key]
+            profile = profiles[client_id] = ClientProfile(client_id)
+
+        if download_ms and download_bytes:
+            throughput = download_bytes / download_ms
+            profile.throughput = _smooth(profile.throughput, throughput, profile.throughput and throughput < profile.throughput)
+            metrics.observe('adaptive_art.throughput_kbps', throughput * 8)
+        if decode_ms:
+            decode_rate = decode_ms / profile.tier[1] ** 2
+            profile.decode_rate = _smooth(profile.decode_rate, decode_rate, profile.decode_rate and decode_rate > profile.decode_rate)
+            metrics.observe('adaptive_art.decode_ms', decode_ms)
+        if free_heap is not None:
+            profile.free_heap = int(free_heap)
+        profile.updated = time.time()
+    return profile
+
+def _misfit(profile, tier, margin):
+    """Why a tier doesn't suit a client, or None if it does."""
+    _, size, budget, _ = tier
+    if profile.throughput and budget / profile.throughput > ADAPTIVE_ART_DOWNLOAD_TARGET_MS * margin:
+        return f"download ~{budget / profile.throughput:.0f} ms"
+    if profile.decode_rate and profile.decode_rate * size ** 2 > ADAPTIVE_ART_DECODE_LIMIT_MS * margin:
+        return f"decode ~{profile.decode_rate * size ** 2:.0f} ms"
+    if profile.free_heap is not None and budget * ADAPTIVE_ART_HEAP_FACTOR > profile.free_heap * margin:
+        return f"free heap {profile.free_heap} bytes"
+    return None
+
+def choose_tier(profile):
+    """Pick the best tier that fits a client's measurements, falling back to the lowest.
+
+    Moving to a better tier than the current one needs the estimates to be
+    inside ADAPTIVE_ART_UPGRADE_MARGIN of the limits.
+
+    Returns:
+        Tuple of (tier, reason), the reason saying why the tier above didn't fit
+    """
+    current = ADAPTIVE_ART_TIERS.index(profile.tier) if profile.tier in ADAPTIVE_ART_TIERS else 0
+    reason = 'fits'
+    for index, tier in enumerate(ADAPTIVE_ART_TIERS):
+        margin = ADAPTIVE_ART_UPGRADE_MARGIN if index < current else 1.0
+        misfit = _misfit(profile, tier, margin)
+        if misfit is None:
+            return tier, reason
+        reason = misfit
+    return ADAPTIVE_ART_TIERS[-1], reason
+
+def _encode_variant(art_id, tier):
+    from PIL import Image
+
+    art_data = art_store.read(art_id)
+    if not art_data:
+        return None
+    _, size, budget, max_quality = tier
+    img = Image.open(BytesIO(art_data))
+    if img.size != (size, size):
+        img = img.resize((size, size), Image.LANCZOS)
+    data, _ = encode_jpeg(img, budget=budget, max_quality=max_quality, metric='adaptive_art')
+    return art_store.put(data)
+
+def get_variant(art_id, tier):
+    """Digest of an artwork encoded for a tier, encoding it on first use.
+
+    Args:
+        art_id: Digest of the stored artwork
+        tier: Entry of ADAPTIVE_ART_TIERS
+
+    Returns:
+        Digest in the art store, or art_id itself for the first tier or if
+        encoding fails
+    """
+    if tier == FULL_TIER:
+        return art_id
+
+    key = (art_id, tier[0])
+    with _lock:
+        digest = variants.get(key)
+    if digest and art_store.exists(digest):
+        return digest
+
+    try:
+        digest, _ = _encodes.do(key, lambda: _encode_variant(art_id, tier))
+    except Exception as e:
+        log.warning("Error encoding %s artwork for %s: %s", tier[0], art_id, e)
+        return art_id
+    if not digest:
+        return art_id
+
+    with _lock:
+        if key not in variants and len(variants) >= ART_VARIANT_CACHE_SIZE_LIMIT:
+            random_key = random.choice(list(variants.keys()))
+            del variants[random_key]
+        variants[key] = digest
+    return digest
+
+def artwork_for_request(art_id, headers):
+    """Choose the artwork to send for a request, by the requesting client's profile.
+
+    Args:
+        art_id: Digest of the stored artwork
+        headers: Request headers
+
+    Returns:
+        Tuple of (digest to send, tier name)
+    """
+    client_id = headers.get('X-Client-Id')
+    if not ADAPTIVE_ART_ENABLED or not client_id:
+        return art_id, FULL_TIER[0]
+
+    profile = update_profile(client_id, headers)
+    tier, reason = choose_tier(profile)
+    with _lock:
+        previous = profile.tier
+        profile.tier, profile.reason = tier, reason
+    if tier != previous:
+        metrics.increment('adaptive_art.tier_changes')
+        log.info("Client %s moved from %s to %s artwork: %s", client_id, previous[0], tier[0], reason)
+
+    metrics.increment('adaptive_art.served.' + tier[0])
+    return get_variant(art_id, tier), tier[0]
+
+def report():
+    """Profiles of all known clients and the tier each is served."""
+    with _lock:
+        return [profile.to_dict() for profile in profiles.values()]
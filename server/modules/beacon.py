@@ -0,0 +1,148 @@
+"""UDP change-notification beacons for registered devices.
+
+Datagram layout (big-endian):
+    4s   magic b'PDB1'
+    u32  state version
+    16s  artwork hash (raw MD5 digest, zeroes if unknown)
+    u8   player id length, then the UTF-8 player id
+    16s  first 16 bytes of HMAC-SHA256 over everything above, keyed with the API token
+"""
+import hmac
+import time
+import socket
+import struct
+import hashlib
+import threading
+from config import BEACON_REGISTRATION_TTL, BEACON_CHECK_INTERVAL
+from modules.auth import API_TOKEN
+from modules import federation
+from modules.dbus_interface import get_playback_state, get_available_players
+from modules.state_store import record_state, get_art_hash, get_change_count, get_total_changes, wait_for_any_change
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+MAGIC = b'PDB1'
+MAC_SIZE = 16
+
+# (ip, port) -> (registration expiry time, whether it wants beacons for every player)
+devices = {}
+devices_lock = threading.Lock()
+
+def register_device(address, port, all_players=False):
+    """Register an address to receive beacons until the registration expires.
+
+    Devices follow the current player only; peer servers aggregating this
+    one's players register with all_players to hear about every player.
+    """
+    with devices_lock:
+        devices[(address, int(port))] = (time.time() + BEACON_REGISTRATION_TTL, bool(all_players))
+    log.info("Registered beacon listener at %s:%s", address, port)
+    return BEACON_REGISTRATION_TTL
+
+def _live_devices():
+    """List of ((ip, port), all_players) for unexpired registrations."""
+    now = time.time()
+    with devices_lock:
+        for key in [k for k, (expires, _) in devices.items() if expires < now]:
+            del devices[key]
+        return [(target, all_players) for target, (_, all_players) in devices.items()]
+
+def encode_beacon(player_id, version, art_hash=None, key=None):
+    """Build a signed beacon datagram."""
+    player_bytes = (player_id or '').encode('utf-8')[:255]
+    digest = bytes.fromhex(art_hash) if art_hash else b'\x00' * 16
+    body = MAGIC + struct.pack('>I16sB', version & 0xFFFFFFFF, digest, len(player_bytes)) + player_bytes
+    mac = hmac.new((key or API_TOKEN).encode('utf-8'), body, hashlib.sha256).digest()[:MAC_SIZE]
+    return body + mac
+
+def decode_beacon(datagram, key):
+    """Verify and unpack a beacon datagram signed with the given key.
+
+    Returns:
+        Dict with player, version and art_hash, or None if the datagram
+        isn't a beacon or the signature doesn't match
+    """
+    header_size = len(MAGIC) + 21
+    if len(datagram) < header_size + MAC_SIZE or not datagram.startswith(MAGIC):
+        return None
+    body, mac = datagram[:-MAC_SIZE], datagram[-MAC_SIZE:]
+    expected = hmac.new(key.encode('utf-8'), body, hashlib.sha256).digest()[:MAC_SIZE]
+    if not hmac.compare_digest(mac, expected):
+        return None
+
+    version, digest, length = struct.unpack_from('>I16sB', body, len(MAGIC))
+    player_id = body[header_size:header_size + length].decode('utf-8', 'replace')
+    return {
+        'player': player_id,
+        'version': version,
+        'art_hash': digest.hex() if digest != b'\x00' * 16 else None,
+    }
+
+def _send(sock, datagram, targets):
+    for target in targets:
+        try:
+            sock.sendto(datagram, target)
+        except OSError as e:
+            log.warning("Error sending beacon to %s: %s", target, e)
+
+def beacon_thread():
+    """Send beacons whenever a player's state version changes.
+
+    Every registration hears about the current player, which is also
+    re-checked each BEACON_CHECK_INTERVAL for players without signals.
+    Registrations for all players also hear about other local players
+    whose change signals fired.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    last_sent = None
+    # player_id -> change count when the player was last checked, for all-player registrations
+    last_counts = {}
+    since = get_total_changes()
+
+    while True:
+        try:
+            since = wait_for_any_change(since, BEACON_CHECK_INTERVAL)
+
+            registrations = _live_devices()
+            if not registrations:
+                continue
+            targets = [target for target, _ in registrations]
+            aggregators = [target for target, all_players in registrations if all_players]
+
+            state = get_playback_state()
+            if state:
+                version = record_state(state['player'], state)
+                art_hash = get_art_hash(state['player'], state['art_url'])
+                if (state['player'], version, art_hash) != last_sent:
+                    _send(sock, encode_beacon(state['player'], version, art_hash), targets)
+                    last_sent = (state['player'], version, art_hash)
+
+            if not aggregators:
+                continue
+
+            local_ids = [p['id'] for p in get_available_players() if not federation.is_remote(p['id'])]
+            for player_id in local_ids:
+                count = get_change_count(player_id)
+                if last_counts.get(player_id) == count:
+                    continue
+                first_check = player_id not in last_counts
+                last_counts[player_id] = count
+                if first_check or (state and player_id == state['player']):
+                    continue
+                other = get_playback_state(player_id)
+                if other:
+                    version = record_state(player_id, other)
+                    _send(sock, encode_beacon(player_id, version, get_art_hash(player_id, other['art_url'])), aggregators)
+            for player_id in [p for p in last_counts if p not in local_ids]:
+                del last_counts[player_id]
+
+        except Exception as e:
+            log.error("Error in beacon thread: %s", e)
+            time.sleep(BEACON_CHECK_INTERVAL)
+
+def start_beacon_thread():
+    """Start the beacon sender thread."""
+    thread = threading.Thread(target=beacon_thread, daemon=True)
+    thread.start()
+    return thread
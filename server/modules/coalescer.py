@@ -0,0 +1,75 @@
+"""Debounce and coalescing of rapid inputs such as seek and volume changes."""
+import threading
+import time
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+class InputCoalescer:
+    """Collapses bursts of inputs for the same target into a single apply call.
+
+    The first request for a key waits out the window, then applies the
+    combined input once. Requests that arrive during the window join that
+    batch and receive the same result. Absolute values replace each other
+    (last one wins) and relative offsets are summed on top of the latest
+    absolute value.
+    """
+
+    def __init__(self, apply, window=0.15):
+        """Initialize the coalescer.
+
+        Args:
+            apply: Callable (key, base, offset) -> result dict, where base is
+                the latest absolute value or None and offset the summed deltas
+            window: Seconds to collect inputs before applying them
+        """
+        self.apply = apply
+        self.window = window
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def submit(self, key, value, relative=False):
+        """Submit an input and wait for the batch it joined to be applied.
+
+        Args:
+            key: Target of the input, e.g. (player_id, 'volume')
+            value: Absolute value, or offset if relative is True
+            relative: Whether value is an offset to add
+
+        Returns:
+            Result of the apply call for the batch, with 'coalesced' set to
+            the number of inputs that were merged into it
+        """
+        with self.lock:
+            batch = self.pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = {'base': None, 'offset': 0, 'count': 0, 'done': threading.Event(), 'result': None}
+                self.pending[key] = batch
+
+            if relative:
+                batch['offset'] += value
+            else:
+                batch['base'] = value
+                batch['offset'] = 0
+            batch['count'] += 1
+
+        if not leader:
+            batch['done'].wait()
+            return batch['result']
+
+        time.sleep(self.window)
+
+        with self.lock:
+            del self.pending[key]
+
+        try:
+            result = self.apply(key, batch['base'], batch['offset'])
+        except Exception as e:
+            log.error("Error applying coalesced input for %s: %s", key, e)
+            result = {"error": str(e)}
+
+        result['coalesced'] = batch['count']
+        batch['result'] = result
+        batch['done'].set()
+        return result
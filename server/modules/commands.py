@@ -0,0 +1,321 @@
+"""Player command execution shared by the single and batch command routes."""
+import time
+import dbus
+from config import INPUT_COALESCE_WINDOW, COMMAND_STATE_TIMEOUT, COMMAND_STATE_FALLBACK_DELAY
+from modules import signal_listener, federation, dispatch
+from modules.federation import RemotePlayer
+from modules.coalescer import InputCoalescer
+from modules.dbus_interface import (
+    get_player_by_id, get_available_players, get_priority_sorted_players,
+    get_current_player, set_current_player, get_player_position, get_playback_state
+)
+from modules.state_store import record_state, get_art_hash, wait_for_change
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+PLAYER_INTERFACE = 'org.mpris.MediaPlayer2.Player'
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+
+def resolve_player(player_id=None):
+    """Resolve the target player, auto-selecting by priority if none is selected.
+
+    Args:
+        player_id: Optional player to target without selecting it
+
+    Returns:
+        Tuple of (player_id, player_obj, error) where error is a
+        (response dict, status code) tuple or None
+    """
+    if player_id:
+        retry_after = dispatch.breaker_state(player_id)
+        if retry_after:
+            return player_id, None, ({"error": "Player isn't responding", "retry_after": retry_after}, 503)
+        player_obj = get_player_by_id(player_id)
+        if not player_obj:
+            return player_id, None, ({"error": "Player not found"}, 404)
+        return player_id, player_obj, None
+
+    player_id = get_current_player()
+    if not player_id:
+        priority_players = get_priority_sorted_players()
+        if priority_players:
+            player_id = priority_players[0]['id']
+            set_current_player(player_id)
+            log.info("Auto-selected player: %s", player_id)
+        else:
+            return None, None, ({"error": "No available players found"}, 404)
+
+    retry_after = dispatch.breaker_state(player_id)
+    if retry_after:
+        # Don't even ping a player that keeps timing out
+        return player_id, None, ({"error": "Player isn't responding", "retry_after": retry_after}, 503)
+
+    player_obj = get_player_by_id(player_id)
+    if not player_obj:
+        return player_id, None, ({"error": "No player selected"}, 400)
+
+    return player_id, player_obj, None
+
+def select_player(player_id):
+    """Select a player if it is available.
+
+    Returns:
+        Tuple of (response dict, status code)
+    """
+    if player_id in [p['id'] for p in get_available_players()]:
+        set_current_player(player_id)
+        return {"success": True, "current_player": player_id}, 200
+    return {"error": "Player not found"}, 404
+
+def command_response(command):
+    """Turn a dispatched command into a (response dict, status code) tuple.
+
+    A command that outlived COMMAND_DEADLINE is answered with 202 and its
+    id; its outcome follows on /commands/<id> and in the player's state.
+    """
+    if command.status == dispatch.DONE:
+        body = {"success": True}
+        body.update(command.result or {})
+        return body, 200
+
+    if command.status == dispatch.PENDING:
+        return {"accepted": True, "command_id": command.id, "status": command.status}, 202
+
+    if command.status == dispatch.REJECTED:
+        return {"error": command.error, "retry_after": max(1, dispatch.breaker_state(command.player_id))}, 503
+
+    if "is not available now" in command.error:
+        log.warning("%s function not available for %s: %s", command.name.capitalize(), command.player_id, command.error)
+        return {"error": f"{command.name.capitalize()} function not available", "details": command.error}, 400
+    if "NoReply" in command.error:
+        return {"error": "Player didn't answer in time", "details": command.error}, 504
+
+    log.error("Error running %s on %s: %s", command.name, command.player_id, command.error)
+    return {"error": command.error}, 500
+
+def run_command(player_id, player_obj, command):
+    """Run a playback command against an already resolved player.
+
+    Args:
+        player_id: MPRIS service name of the player
+        player_obj: DBus proxy object for the player, or a RemotePlayer
+        command: One of play, pause, next, previous, playpause
+
+    Returns:
+        Tuple of (response dict, status code)
+    """
+    if isinstance(player_obj, RemotePlayer):
+        return player_obj.command(command)
+
+    player_interface = dbus.Interface(player_obj, PLAYER_INTERFACE)
+    methods = {
+        'play': player_interface.Play,
+        'pause': player_interface.Pause,
+        'next': player_interface.Next,
+        'previous': player_interface.Previous,
+    }
+
+    if command in methods:
+        log.debug("Sending %s command to player: %s", command.capitalize(), player_id)
+        return command_response(dispatch.dispatch(player_id, command, methods[command]))
+
+    if command == 'playpause':
+        properties_interface = dbus.Interface(player_obj, PROPERTIES_INTERFACE)
+
+        def toggle(playback_status):
+            if playback_status == 'Playing':
+                log.debug("Pausing player: %s", player_id)
+                return (player_interface.Pause, (), lambda _: {"action": "pause"})
+            log.debug("Playing player: %s", player_id)
+            return (player_interface.Play, (), lambda _: {"action": "play"})
+
+        return command_response(dispatch.dispatch(
+            player_id, command, properties_interface.Get, (PLAYER_INTERFACE, 'PlaybackStatus'), toggle
+        ))
+
+    return {"error": f"Unknown command: {command}"}, 400
+
+def get_state_snapshot(player_id):
+    """Read a player's playback state and stamp it with its version and art hash."""
+    state = get_playback_state(player_id) if player_id else None
+    if state:
+        state['version'] = record_state(state['player'], state)
+        state['art_hash'] = get_art_hash(state['player'], state['art_url'])
+        state['last_command'] = dispatch.last_outcome(state['player'])
+    return state
+
+def wait_for_state(player_id, since):
+    """Wait briefly for a player to report the result of a command and return its new state.
+
+    Args:
+        player_id: MPRIS service name of the player
+        since: Change count read before the command was sent
+
+    Returns:
+        Dict with the state snapshot, its version and whether a change was seen
+    """
+    if federation.is_remote(player_id):
+        # Forwarded commands already waited for the new state on the owning server
+        changed = False
+    elif signal_listener.running:
+        changed = wait_for_change(player_id, since, COMMAND_STATE_TIMEOUT)
+    else:
+        time.sleep(COMMAND_STATE_FALLBACK_DELAY)
+        changed = False
+
+    state = get_state_snapshot(player_id)
+    return {
+        "state": state,
+        "version": state['version'] if state else 0,
+        "state_changed": changed
+    }
+
+def run_batch(commands, stop_on_error=True):
+    """Run an ordered list of commands, resolving the player proxy only when the target changes.
+
+    Args:
+        commands: List of dicts like {"command": "next"} or
+            {"command": "select_player", "player_id": "..."}
+        stop_on_error: Whether to skip the remaining commands after a failure
+
+    Returns:
+        Tuple of (list of per-command results, player_id)
+    """
+    results = []
+    player_id, player_obj, resolve_error = None, None, None
+    resolved = False
+
+    for entry in commands:
+        command = entry.get('command') if isinstance(entry, dict) else entry
+
+        if command == 'select_player':
+            if isinstance(entry, dict) and entry.get('player_id'):
+                body, status = select_player(entry['player_id'])
+            else:
+                body, status = {"error": "Expected 'player_id' with select_player"}, 400
+            resolved = False
+        else:
+            if not resolved:
+                player_id, player_obj, resolve_error = resolve_player()
+                resolved = True
+
+            if resolve_error:
+                body, status = resolve_error
+            else:
+                body, status = run_command(player_id, player_obj, command)
+
+        result = {"command": command, "status": status}
+        result.update(body)
+        results.append(result)
+
+        if status >= 400 and stop_on_error:
+            break
+
+    return results, player_id or get_current_player()
+
+def _dispatched_body(command):
+    """Response body of a dispatched command, for the coalescers that only pass bodies on."""
+    body, _ = command_response(command)
+    return body
+
+def _apply_position(key, base, offset):
+    """Apply a coalesced seek: relative offsets via Seek, absolute targets via SetPosition."""
+    player_id = key[0]
+    player_obj = get_player_by_id(player_id)
+    if not player_obj:
+        return {"error": "Player not found"}
+
+    if isinstance(player_obj, RemotePlayer):
+        # The owning server coalesces again, which is harmless for one call
+        if base is None:
+            body, _ = player_obj.forward('/seek', {'offset_ms': offset})
+        else:
+            body, _ = player_obj.forward('/position', {'position_ms': max(0, base + offset)})
+        return body
+
+    player_interface = dbus.Interface(player_obj, PLAYER_INTERFACE)
+
+    if base is None:
+        return _dispatched_body(dispatch.dispatch(
+            player_id, 'seek', player_interface.Seek, (dbus.Int64(offset * 1000),),
+            lambda _: {"offset_ms": offset, "position_ms": get_player_position(player_obj)}
+        ))
+
+    target = max(0, base + offset)
+    properties_interface = dbus.Interface(player_obj, PROPERTIES_INTERFACE)
+
+    def set_position(metadata):
+        track_id = metadata.get('mpris:trackid')
+        if track_id:
+            return (player_interface.SetPosition, (dbus.ObjectPath(track_id), dbus.Int64(target * 1000)),
+                    lambda _: {"position_ms": target})
+        # SetPosition needs a track id, fall back to a relative seek
+        return (player_interface.Seek, (dbus.Int64((target - get_player_position(player_obj)) * 1000),),
+                lambda _: {"position_ms": target})
+
+    return _dispatched_body(dispatch.dispatch(
+        player_id, 'position', properties_interface.Get, (PLAYER_INTERFACE, 'Metadata'), set_position
+    ))
+
+def _apply_volume(key, base, offset):
+    """Apply a coalesced volume change, clamped to 0.0-1.0."""
+    player_id = key[0]
+    player_obj = get_player_by_id(player_id)
+    if not player_obj:
+        return {"error": "Player not found"}
+
+    if isinstance(player_obj, RemotePlayer):
+        if base is None:
+            body, _ = player_obj.forward('/volume', {'delta': offset})
+        else:
+            body, _ = player_obj.forward('/volume', {'volume': max(0.0, min(1.0, base + offset))})
+        return body
+
+    properties_interface = dbus.Interface(player_obj, PROPERTIES_INTERFACE)
+
+    def set_volume(current):
+        volume = max(0.0, min(1.0, float(current) + offset))
+        return (properties_interface.Set, (PLAYER_INTERFACE, 'Volume', dbus.Double(volume)),
+                lambda _: {"volume": volume})
+
+    if base is not None:
+        method, args, then = set_volume(base)
+        return _dispatched_body(dispatch.dispatch(player_id, 'volume', method, args, then))
+    return _dispatched_body(dispatch.dispatch(
+        player_id, 'volume', properties_interface.Get, (PLAYER_INTERFACE, 'Volume'), set_volume
+    ))
+
+position_coalescer = InputCoalescer(_apply_position, INPUT_COALESCE_WINDOW)
+volume_coalescer = InputCoalescer(_apply_volume, INPUT_COALESCE_WINDOW)
+
+def _submit(coalescer, kind, value, relative, player_id=None):
+    # The liveness check happens once per batch in the apply call, not per input
+    player_id = player_id or get_current_player()
+    if not player_id:
+        player_id, _, error = resolve_player()
+        if error:
+            return error
+
+    result = coalescer.submit((player_id, kind), value, relative)
+    if 'error' in result:
+        if result.get('retry_after'):
+            return result, 503
+        if result['error'] == "Player not found":
+            return result, 404
+        return result, 500
+    return result, 202 if result.get('accepted') else 200
+
+def seek(offset_ms, player_id=None):
+    """Seek relative to the current position; offsets within the window are summed."""
+    return _submit(position_coalescer, 'position', int(offset_ms), True, player_id)
+
+def set_position(position_ms, player_id=None):
+    """Seek to an absolute position; the last position within the window wins."""
+    return _submit(position_coalescer, 'position', max(0, int(position_ms)), False, player_id)
+
+def set_volume(volume=None, delta=None, player_id=None):
+    """Set the volume absolutely (0.0-1.0) or by a relative delta."""
+    if volume is not None:
+        return _submit(volume_coalescer, 'volume', float(volume), False, player_id)
+    return _submit(volume_coalescer, 'volume', float(delta or 0), True, player_id)
@@ -4,34 +4,66 @@ import time
 import random
 import urllib.parse
 import dbus
-from config import MPRIS_SERVICE_PREFIX, PLAYER_PRIORITY, PRIORITIZE_PLAYING, current_player, ART_CACHE_SIZE_LIMIT
+from config import (
+    MPRIS_SERVICE_PREFIX, PLAYER_PRIORITY, PRIORITIZE_PLAYING, current_player, ART_CACHE_SIZE_LIMIT,
+    MEDIA_INFO_FRESHNESS, WARM_CACHE_ENABLED, WARM_CACHE_MAX_AGE, COMMAND_DEADLINE
+)
+from modules import metrics, federation, signal_listener
+from modules.state_store import get_change_count
 from utils.image_utils import resize_image, generate_placeholder_art, encode_image_base64
 from utils.musicbrainz import fetch_from_musicbrainz
+from utils.palette import get_palette
+from utils.preview import get_preview
+from utils.art_fetcher import fetch_art
+from utils.local_art import track_path, find_cover
+from utils.library_index import lookup_art
+from utils.single_flight import SingleFlight
+from utils import art_store
+from utils.log import get_logger
+
+log = get_logger(__name__)
 
 art_file_cache = {}
 
+# player_id -> (resolved_at, change count at resolution, media info)
+media_info_cache = {}
+media_info_flight = SingleFlight()
+
+def get_current_player():
+    """Get the ID of the currently selected player."""
+    return current_player
+
+def set_current_player(player_id):
+    """Select the player that commands and media info target."""
+    global current_player
+    current_player = player_id
+
 def get_player_by_id(player_id):
-    """Get DBus player object by ID."""
+    """Get DBus player object by ID, or a RemotePlayer for a peer's player."""
+    if federation.is_remote(player_id):
+        return federation.get_player(player_id)
+
     try:
         bus = dbus.SessionBus()
         player_obj = bus.get_object(player_id, '/org/mpris/MediaPlayer2')
         
         try:
             props_interface = dbus.Interface(player_obj, 'org.freedesktop.DBus.Properties')
-            props_interface.Get('org.mpris.MediaPlayer2', 'Identity')
+            # A short timeout, so a hung player counts as unavailable instead of stalling the request
+            props_interface.Get('org.mpris.MediaPlayer2', 'Identity', timeout=COMMAND_DEADLINE)
             return player_obj
         except dbus.exceptions.DBusException as e:
-            print(f"Player {player_id} is not responding: {e}")
+            log.warning("Player %s is not responding: %s", player_id, e)
             return None
             
     except dbus.exceptions.DBusException as e:
         if "org.freedesktop.DBus.Error.ServiceUnknown" in str(e):
-            print(f"Player {player_id} is no longer available")
+            log.info("Player %s is no longer available", player_id)
         else:
-            print(f"Error getting player {player_id}: {e}")
+            log.warning("Error getting player %s: %s", player_id, e)
         return None
     except Exception as e:
-        print(f"Unexpected error getting player {player_id}: {e}")
+        log.error("Unexpected error getting player %s: %s", player_id, e)
         return None
 
 def get_available_players():
@@ -50,20 +82,34 @@ def get_available_players():
                     player_obj = bus.get_object(service, '/org/mpris/MediaPlayer2')
                     props_interface = dbus.Interface(player_obj, 'org.freedesktop.DBus.Properties')
                     
-                    identity = str(props_interface.Get('org.mpris.MediaPlayer2', 'Identity'))
+                    identity = str(props_interface.Get('org.mpris.MediaPlayer2', 'Identity', timeout=COMMAND_DEADLINE))
                     
                     players.append({
                         'id': service,
                         'name': identity
                     })
                 except Exception as e:
-                    print(f"Error getting player info for {service}: {e}")
+                    log.warning("Error getting player info for %s: %s", service, e)
         
         players_cache = players
-        return players
+        return players + federation.get_players()
     except Exception as e:
-        print(f"Error listing players: {e}")
-        return players_cache
+        log.error("Error listing players: %s", e)
+        return players_cache + federation.get_players()
+
+def get_players_with_status():
+    """Get all available players with each one's playback status."""
+    players = get_available_players()
+    for player in players:
+        if 'playback_status' in player:
+            continue
+        player_obj = get_player_by_id(player['id'])
+        try:
+            props_interface = dbus.Interface(player_obj, 'org.freedesktop.DBus.Properties')
+            player['playback_status'] = str(props_interface.Get('org.mpris.MediaPlayer2.Player', 'PlaybackStatus'))
+        except Exception:
+            player['playback_status'] = None
+    return players
 
 def get_priority_sorted_players():
     """Get available players sorted by priority."""
@@ -71,19 +117,23 @@ def get_priority_sorted_players():
 
     if PRIORITIZE_PLAYING:
         for player in players:
+            if federation.is_remote(player['id']):
+                if player.get('playback_status') == 'Playing':
+                    return [player]
+                continue
             try:
                 player_obj = get_player_by_id(player['id'])
                 if player_obj:
                     props_interface = dbus.Interface(player_obj, 'org.freedesktop.DBus.Properties')
                     status = str(props_interface.Get('org.mpris.MediaPlayer2.Player', 'PlaybackStatus'))
                     if status == 'Playing':
-                        print(f"Found actively playing player: {player['id']}")
+                        log.debug("Found actively playing player: %s", player['id'])
                         return [player]
             except Exception as e:
-                print(f"Error checking play status for {player['id']}: {e}")
+                log.warning("Error checking play status for %s: %s", player['id'], e)
     
     def get_priority(player):
-        player_id = player['id']
+        player_id = federation.service_name(player['id'])
         for i, prefix in enumerate(PLAYER_PRIORITY):
             if player_id.startswith(MPRIS_SERVICE_PREFIX + prefix):
                 return i
@@ -91,36 +141,174 @@ def get_priority_sorted_players():
     
     return sorted(players, key=get_priority)
 
+def parse_track_metadata(metadata):
+    """Extract the track fields we use from an MPRIS Metadata dict."""
+    track_id = str(metadata.get('mpris:trackid', '')) or str(time.time())
+    
+    artists = metadata.get('xesam:artist', ['Unknown'])
+    if isinstance(artists, dbus.Array):
+        artist = ', '.join([str(a) for a in artists])
+    else:
+        artist = str(artists)
+    
+    return {
+        'id': track_id,
+        'artist': artist,
+        'title': str(metadata.get('xesam:title', 'Unknown')),
+        'album': str(metadata.get('xesam:album', 'Unknown')),
+        'art_url': str(metadata.get('mpris:artUrl', '')),
+    }
+
+def get_player_position(player_obj):
+    """Get the playback position of a player in milliseconds, or 0 if unsupported."""
+    if isinstance(player_obj, federation.RemotePlayer):
+        return player_obj.position()
+    try:
+        props_interface = dbus.Interface(player_obj, 'org.freedesktop.DBus.Properties')
+        position = props_interface.Get('org.mpris.MediaPlayer2.Player', 'Position')
+        return max(0, int(position) // 1000)
+    except Exception:
+        return 0
+
+def get_playback_state(player_id=None):
+    """Get the playback state of a player without resolving artwork.
+    
+    Returns:
+        Dict with track fields, playback status, position and player id, or None
+    """
+    player_id = player_id or current_player
+    if not player_id:
+        priority_players = get_priority_sorted_players()
+        if not priority_players:
+            return None
+        player_id = priority_players[0]['id']
+    
+    player_obj = get_player_by_id(player_id)
+    if not player_obj:
+        return None
+    if isinstance(player_obj, federation.RemotePlayer):
+        return player_obj.get_state()
+    
+    try:
+        props_interface = dbus.Interface(player_obj, 'org.freedesktop.DBus.Properties')
+        playback_status = str(props_interface.Get('org.mpris.MediaPlayer2.Player', 'PlaybackStatus'))
+        metadata = props_interface.Get('org.mpris.MediaPlayer2.Player', 'Metadata')
+    except Exception as e:
+        log.warning("Error getting playback state for %s: %s", player_id, e)
+        return None
+    
+    state = parse_track_metadata(metadata)
+    state['player'] = player_id
+    state['playing'] = playback_status == 'Playing'
+    state['playback_status'] = playback_status
+    state['position'] = get_player_position(player_obj)
+    return state
+
+def media_info_max_age(player_id):
+    """Seconds a resolved media info result stays usable while its player reports no change.
+    
+    With change signals a local player's result only goes stale when the
+    player says so, so it is kept much longer than without them. Peers'
+    players only report status changes here, so theirs aren't.
+    """
+    if WARM_CACHE_ENABLED and signal_listener.running and not federation.is_remote(player_id):
+        return WARM_CACHE_MAX_AGE
+    return MEDIA_INFO_FRESHNESS
+
+def get_cached_media_info(player_id):
+    """Get a still valid cached media info result for a player, or None."""
+    cached = media_info_cache.get(player_id)
+    if cached:
+        resolved_at, changes, result = cached
+        if time.time() - resolved_at < media_info_max_age(player_id) and changes == get_change_count(player_id):
+            return result
+    return None
+
+def refresh_media_info(player_id, key=None, available_player_ids=None):
+    """Resolve media info and cache it, sharing the work with concurrent callers.
+    
+    Args:
+        player_id: Player to resolve, or None for the current player
+        key: Cache key, defaults to player_id
+        available_player_ids: Live player ids if the caller already listed them
+    
+    Returns:
+        Tuple of (media info or None, whether another caller's result was shared)
+    """
+    key = key or player_id
+    
+    def resolve():
+        changes = get_change_count(key)
+        # Pass the caller's argument through so a vanished current player still auto-switches
+        result = _resolve_media_info(player_id, available_player_ids)
+        metrics.increment('media_info.resolutions')
+        media_info_cache.pop(key, None)
+        if result and result['player'] == key:
+            media_info_cache[key] = (time.time(), changes, result)
+        return result
+    
+    return media_info_flight.do(key, resolve)
+
+def forget_media_info(player_id):
+    """Drop the cached media info of a player that went away."""
+    media_info_cache.pop(player_id, None)
+
 def get_media_info(player_id=None):
-    """Get media info from the specified or current player."""
+    """Get media info from the specified or current player.
+    
+    Concurrent callers for the same player share one resolution, and a
+    result is reused until the player reports a change, or for
+    media_info_max_age() seconds. Results for local players other than the
+    current one are kept warm in the background, see modules/warm_cache.py.
+    Each caller gets its own copy.
+    """
+    key = player_id or current_player
+    if not key:
+        return _resolve_media_info(player_id)
+    
+    result = get_cached_media_info(key)
+    if result:
+        metrics.increment('media_info.hits')
+        return dict(result)
+    
+    result, shared = refresh_media_info(player_id, key)
+    if shared:
+        metrics.increment('media_info.coalesced')
+    return dict(result) if result else None
+
+def _resolve_media_info(player_id=None, available_player_ids=None):
+    """Resolve metadata and artwork for the specified or current player."""
     global current_player
     
-    available_players = get_available_players()
-    available_player_ids = [p['id'] for p in available_players]
+    if available_player_ids is None:
+        available_player_ids = [p['id'] for p in get_available_players()]
     
     if current_player and current_player not in available_player_ids:
-        print(f"Player {current_player} is no longer available")
+        log.info("Player %s is no longer available", current_player)
         current_player = None
     
     if not player_id and not current_player:
         priority_players = get_priority_sorted_players()
         if priority_players:
             current_player = priority_players[0]['id']
-            print(f"Auto-switching to priority player: {current_player}")
+            log.info("Auto-switching to priority player: %s", current_player)
         else:
-            print("No available players found")
+            log.debug("No available players found")
             return None
     
     player_id = player_id or current_player
     
     if player_id not in available_player_ids:
-        print(f"Player {player_id} is not available")
+        log.info("Player %s is not available", player_id)
         return None
     
+    if federation.is_remote(player_id):
+        return federation.get_media_info(player_id)
+    
     player_obj = get_player_by_id(player_id)
     
     if not player_obj:
-        print(f"Failed to get player object for {player_id}")
+        log.warning("Failed to get player object for %s", player_id)
         if player_id == current_player:
             current_player = None
         return None
@@ -130,21 +318,15 @@ def get_media_info(player_id=None):
         playback_status = str(props_interface.Get('org.mpris.MediaPlayer2.Player', 'PlaybackStatus'))
         metadata = props_interface.Get('org.mpris.MediaPlayer2.Player', 'Metadata')
         
-        track_id = str(metadata.get('mpris:trackid', '')) or str(time.time())
-        
-        artists = metadata.get('xesam:artist', ['Unknown'])
-        if isinstance(artists, dbus.Array):
-            artist = ', '.join([str(a) for a in artists])
-        else:
-            artist = str(artists)
-        
-        title = str(metadata.get('xesam:title', 'Unknown'))
-        album = str(metadata.get('xesam:album', 'Unknown'))
+        track = parse_track_metadata(metadata)
+        track_id = track['id']
+        artist = track['artist']
+        title = track['title']
+        album = track['album']
         
         art_data = None
-        art_url = metadata.get('mpris:artUrl', '')
+        art_url = track['art_url']
         if art_url:
-            art_url = str(art_url)
             if art_url.startswith('file://'):
                 # Local file - decode URL-encoded characters
                 try:
@@ -155,11 +337,11 @@ def get_media_info(player_id=None):
                             get_media_info.logged_cache_files = set()
                         
                         if file_path not in get_media_info.logged_cache_files:
-                            print(f"Using cached art for file: {file_path}")
+                            log.debug("Using cached art for file: %s", file_path)
                             get_media_info.logged_cache_files.add(file_path)
                         art_data = art_file_cache[file_path]
                     else:
-                        print(f"Trying to load art from file: {file_path}")
+                        log.debug("Trying to load art from file: %s", file_path)
                         
                         # Special handling for Firefox - maybe we can remove this now?
                         if 'firefox' in file_path.lower():
@@ -171,72 +353,94 @@ def get_media_info(player_id=None):
                                             image_data = f.read()
                                             art_data = resize_image(image_data)
                                             if art_data:
-                                                print(f"Successfully loaded Firefox art on attempt {attempt+1}")
+                                                log.debug("Successfully loaded Firefox art on attempt %s", attempt+1)
                                                 break
                                     except Exception as e:
-                                        print(f"Attempt {attempt+1} failed: {e}")
+                                        log.debug("Attempt %s failed: %s", attempt+1, e)
                                 
                                 if attempt < max_attempts - 1:
-                                    print(f"Retrying Firefox art in 0.5 seconds...")
+                                    log.debug("Retrying Firefox art in 0.5 seconds...")
                                     time.sleep(0.5)
                             
                             if not art_data:
-                                print("All attempts to load Firefox art failed, trying alternatives")
+                                log.warning("All attempts to load Firefox art failed, trying alternatives")
                         else:
                             if not os.path.exists(file_path):
-                                print(f"File does not exist: {file_path}")
+                                log.debug("File does not exist: %s", file_path)
                                 raise FileNotFoundError(f"File not found: {file_path}")
                                 
                             if not os.access(file_path, os.R_OK):
-                                print(f"File is not readable: {file_path}")
+                                log.warning("File is not readable: %s", file_path)
                                 raise PermissionError(f"Cannot read file: {file_path}")
                                 
                             file_size = os.path.getsize(file_path)
                             if file_size == 0:
-                                print(f"File is empty: {file_path}")
+                                log.debug("File is empty: %s", file_path)
                                 raise ValueError(f"Empty file: {file_path}")
                                 
-                            print(f"File exists and is readable, size: {file_size} bytes")
+                            log.debug("File exists and is readable, size: %s bytes", file_size)
                             
                             with open(file_path, 'rb') as f:
                                 image_data = f.read()
-                                print(f"Successfully read {len(image_data)} bytes from file")
+                                log.debug("Successfully read %s bytes from file", len(image_data))
                                 art_data = resize_image(image_data)
                                 if art_data is None:
-                                    print(f"Failed to resize image from {file_path}")
+                                    log.warning("Failed to resize image from %s", file_path)
                     
                         if art_data:
                             if len(art_file_cache) >= ART_CACHE_SIZE_LIMIT:
                                 random_key = random.choice(list(art_file_cache.keys()))
                                 del art_file_cache[random_key]
                             art_file_cache[file_path] = art_data
-                            print(f"Cached art for file: {file_path}")
+                            log.debug("Cached art for file: %s", file_path)
                 except Exception as e:
-                    print(f"Error loading art from file {art_url}: {e}")
+                    log.warning("Error loading art from file %s: %s", art_url, e)
             elif art_url.startswith(('http://', 'https://')):
-                from utils.image_utils import fetch_art_from_url
-                art_data = fetch_art_from_url(art_url)
+                art_data = fetch_art(art_url)
+
+        if not art_data:
+            # Local tracks usually carry their cover, or sit next to one
+            file_path = track_path(str(metadata.get('xesam:url', '')))
+            if file_path:
+                art_data = art_file_cache.get(file_path) or lookup_art(file_path)
+                if not art_data:
+                    try:
+                        image_data, source = find_cover(file_path)
+                        if image_data:
+                            log.debug("Using local art from %s", source)
+                            art_data = resize_image(image_data)
+                    except Exception as e:
+                        log.warning("Error loading local art for %s: %s", file_path, e)
+                    if art_data:
+                        if len(art_file_cache) >= ART_CACHE_SIZE_LIMIT:
+                            random_key = random.choice(list(art_file_cache.keys()))
+                            del art_file_cache[random_key]
+                        art_file_cache[file_path] = art_data
 
         if not art_data:
-            print(f"No local art found, trying MusicBrainz for {artist} - {album} - {title}")
+            log.debug("No local art found, trying MusicBrainz for %s - %s - %s", artist, album, title)
             art_data = fetch_from_musicbrainz(artist, album, title)
             if art_data:
-                print("Found artwork from MusicBrainz!")
+                log.info("Found artwork from MusicBrainz!")
 
         if not art_data:
-            print("No artwork found, using placeholder")
+            log.debug("No artwork found, using placeholder")
             try:
                 placeholder_data = generate_placeholder_art(f"{title[:20]}")
                 if placeholder_data:
                     art_data = placeholder_data
             except Exception as e:
-                print(f"Failed to create placeholder: {e}")
+                log.error("Failed to create placeholder: %s", e)
                 art_data = None
 
         art_data_base64 = encode_image_base64(art_data)
+        palette = get_palette(art_data)
+        preview = get_preview(art_data)
+        art_id = art_store.put(art_data)
         
         return {
             'id': track_id,
+            'player': player_id,
             'artist': artist,
             'title': title,
             'album': album,
@@ -244,11 +448,14 @@ def get_media_info(player_id=None):
             'playback_status': playback_status,
             'art_url': art_url,
             'art_data': art_data_base64,
-            'is_base64': True
+            'art_id': art_id,
+            'is_base64': True,
+            'palette': palette,
+            'preview': encode_image_base64(preview)
         }
     
     except Exception as e:
-        print(f"Error getting media info: {e}")
+        log.error("Error getting media info: %s", e)
         if player_id == current_player:
             current_player = None
         return None
@@ -274,7 +481,7 @@ def get_media_state_for_etag():
         state = f"{current_player}|{track_id}|{art_url}|{playback_status}"
         return state
     except Exception as e:
-        print(f"Error getting lightweight state: {e}")
+        log.error("Error getting lightweight state: %s", e)
         return "error_state"
 
 players_cache = []
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""Player command dispatch with short deadlines and a per-player circuit breaker.
+
+D-Bus calls to players are made asynchronously, with reply and error
+handlers run by the GLib main loop of the signal listener. The request
+waits for the reply only until COMMAND_DEADLINE; after that it is answered
+with 202 and a command id, while the call keeps running for up to
+COMMAND_CALL_TIMEOUT. Its outcome can be read from /commands/<id>, and
+the player's state reports it as last_command once it completes.
+
+Players whose calls keep missing the deadline trip a circuit breaker: for
+COMMAND_BREAKER_COOLDOWN seconds their commands are refused straight away,
+then one call is let through to probe whether the player recovered.
+
+Without a main loop, replies can't be delivered asynchronously, so calls
+are made synchronously with COMMAND_DEADLINE as their D-Bus timeout.
+"""
+import time
+import uuid
+import threading
+import dbus
+from config import (
+    COMMAND_DEADLINE, COMMAND_CALL_TIMEOUT, COMMAND_BREAKER_THRESHOLD, COMMAND_BREAKER_COOLDOWN,
+    COMMAND_HISTORY_SIZE
+)
+from modules import metrics, signal_listener
+from modules.state_store import mark_changed
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+REJECTED = 'rejected'
+
+class Command:
+    """One dispatched command: a chain of D-Bus calls and its outcome.
+
+    Each step is (method, args, then) where method is a bound D-Bus method
+    and then, if given, maps the step's reply to the next step or to the
+    command's final result.
+    """
+
+    def __init__(self, player_id, name):
+        self.id = uuid.uuid4().hex[:12]
+        self.player_id = player_id
+        self.name = name
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self.deadline_missed = False
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'player': self.player_id,
+            'command': self.name,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+class CircuitBreaker:
+    """Counts consecutive deadline misses of a player and refuses calls while open."""
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def allow(self):
+        """Check whether a call may go through, letting one probe through after the cooldown."""
+        if self.opened_at is None:
+            return True
+        if time.time() - self.opened_at < COMMAND_BREAKER_COOLDOWN or self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0
+        return max(0, int(COMMAND_BREAKER_COOLDOWN - (time.time() - self.opened_at)) + 1)
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= COMMAND_BREAKER_THRESHOLD:
+            if self.opened_at is None:
+                metrics.increment('dispatch.breaker_opened')
+            self.opened_at = time.time()
+
+_lock = threading.Lock()
+# command id -> Command, for outcome lookups after a 202, oldest first
+commands = {}
+# player_id -> latest Command that outlived its deadline
+last_pending = {}
+breakers = {}
+
+def _breaker(player_id):
+    with _lock:
+        breaker = breakers.get(player_id)
+        if breaker is None:
+            breaker = breakers[player_id] = CircuitBreaker()
+        return breaker
+
+def _remember(command):
+    with _lock:
+        if len(commands) >= COMMAND_HISTORY_SIZE:
+            # Forget the oldest finished command; pending ones may still be looked up
+            oldest = next((key for key, old in commands.items() if old.status != PENDING), None)
+            if oldest is not None:
+                del commands[oldest]
+        commands[command.id] = command
+
+def _finish(command, status, result=None, error=None, responded=True):
+    with _lock:
+        if command.status != PENDING:
+            return
+        command.status = status
+        command.result = result
+        command.error = error
+        command.finished = time.time()
+        late = command.deadline_missed
+    command.done.set()
+
+    # Any answer, even an error, shows the player is alive; missed deadlines are counted by dispatch()
+    breaker = _breaker(command.player_id)
+    if responded:
+        breaker.success()
+    else:
+        # Let the next probe through after a probe that got no answer
+        breaker.probing = False
+
+    if late:
+        # The caller already got a 202; tell state waiters and beacons about the outcome
+        metrics.increment('dispatch.late_' + status)
+        log.info("Command %s %s on %s finished late: %s", command.id, command.name, command.player_id, status)
+        mark_changed(command.player_id)
+
+def _run_step(command, step):
+    method, args, then = step
+
+    def on_reply(*reply):
+        value = reply[0] if len(reply) == 1 else (reply or None)
+        try:
+            next_step = then(value) if then else None
+        except Exception as e:
+            _finish(command, FAILED, error=str(e))
+            return
+        if isinstance(next_step, tuple):
+            _run_step(command, next_step)
+        else:
+            _finish(command, DONE, result=next_step)
+
+    def on_error(error):
+        _finish(command, FAILED, error=str(error), responded='NoReply' not in str(error))
+
+    try:
+        method(*args, reply_handler=on_reply, error_handler=on_error, timeout=COMMAND_CALL_TIMEOUT)
+    except Exception as e:
+        _finish(command, FAILED, error=str(e))
+
+def _run_sync(command, step):
+    while True:
+        method, args, then = step
+        try:
+            value = method(*args, timeout=COMMAND_DEADLINE)
+        except dbus.exceptions.DBusException as e:
+            timed_out = 'NoReply' in str(e)
+            if timed_out:
+                metrics.increment('dispatch.deadline_missed')
+                _breaker(command.player_id).failure()
+            _finish(command, FAILED, error=str(e), responded=not timed_out)
+            return
+        except Exception as e:
+            _finish(command, FAILED, error=str(e), responded=False)
+            return
+        try:
+            step = then(value) if then else None
+        except Exception as e:
+            _finish(command, FAILED, error=str(e))
+            return
+        if not isinstance(step, tuple):
+            _finish(command, DONE, result=step)
+            return
+
+def dispatch(player_id, name, method, args=(), then=None):
+    """Run a command against a player, waiting for it at most COMMAND_DEADLINE.
+
+    Args:
+        player_id: MPRIS service name of the player
+        name: Command name, for outcome reports
+        method: Bound D-Bus method for the first call
+        args: Arguments of the first call
+        then: Optional callable turning the first reply into the next
+            (method, args, then) step or into the final result
+
+    Returns:
+        The Command; its status is DONE or FAILED if it finished in time,
+        PENDING if it is still running, or REJECTED if the player's circuit
+        breaker is open
+    """
+    command = Command(player_id, name)
+    breaker = _breaker(player_id)
+    if not breaker.allow():
+        command.status = REJECTED
+        command.error = f"Player isn't responding, retry in {breaker.retry_after()}s"
+        metrics.increment('dispatch.rejected')
+        return command
+
+    metrics.increment('dispatch.calls')
+    step = (method, args, then)
+    if not signal_listener.running:
+        _run_sync(command, step)
+        return command
+
+    _remember(command)
+    _run_step(command, step)
+    if not command.done.wait(COMMAND_DEADLINE):
+        with _lock:
+            if command.status == PENDING:
+                command.deadline_missed = True
+                last_pending[player_id] = command
+        if command.deadline_missed:
+            metrics.increment('dispatch.deadline_missed')
+            breaker.failure()
+    return command
+
+def get_command(command_id):
+    """Look up a dispatched command by id, or None if it is unknown or forgotten."""
+    with _lock:
+        return commands.get(command_id)
+
+def last_outcome(player_id):
+    """Outcome of the latest command on a player that missed its deadline, or None."""
+    with _lock:
+        command = last_pending.get(player_id)
+    return command.to_dict() if command else None
+
+def breaker_state(player_id):
+    """Check whether a player's commands are currently refused.
+
+    Returns:
+        Seconds until the next probe is let through, or 0 when calls go through
+    """
+    with _lock:
+        breaker = breakers.get(player_id)
+    return breaker.retry_after() if breaker else 0
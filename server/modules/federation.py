@@ -0,0 +1,318 @@
+"""Aggregation of players from peer PrestoDeck servers.
+
+Players on a peer appear in this server's player list with ids like
+'peer:laptop/org.mpris.MediaPlayer2.spotify' and go through the same
+priority rules as local players. Media info is fetched from the owning
+peer, with its artwork kept in the local art store, and commands are
+forwarded to it.
+
+Peers are polled for their player list, and each peer is also asked to
+send change beacons to this server, so changes there are noticed without
+waiting for the next poll.
+"""
+import time
+import socket
+import threading
+from config import PEER_SERVERS, PEER_POLL_INTERVAL, PEER_TIMEOUT, PEER_VERIFY_TLS, PEER_BEACON_PORT, COMMAND_DEADLINE
+from modules import metrics
+from modules.state_store import mark_changed
+from utils import art_store
+from utils.image_utils import encode_image_base64
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+REMOTE_PREFIX = 'peer:'
+
+# Forwarded commands may take the peer's whole command deadline to answer
+PEER_COMMAND_TIMEOUT = PEER_TIMEOUT + COMMAND_DEADLINE
+
+def _pinned_adapter(fingerprint):
+    """HTTP adapter that accepts only a certificate with the given SHA-256 fingerprint."""
+    from requests.adapters import HTTPAdapter
+
+    class PinnedAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            kwargs['assert_fingerprint'] = fingerprint
+            super().init_poolmanager(*args, **kwargs)
+
+        def send(self, request, **kwargs):
+            # Set here, as REQUESTS_CA_BUNDLE would override the session's verify
+            kwargs['verify'] = False
+            return super().send(request, **kwargs)
+
+    return PinnedAdapter()
+
+class Peer:
+    """A peer server and the players it last reported.
+
+    The peer's certificate is checked against the system CAs, or the CA
+    bundle given as 'ca'. A peer with the self-signed certificate created
+    by --init is pinned by its 'fingerprint' instead, since that
+    certificate names no address to verify.
+    """
+
+    def __init__(self, name, url, token, ca=None, fingerprint=None):
+        self.name = name
+        self.url = url.rstrip('/')
+        self.token = token
+        self.ca = ca
+        self.fingerprint = fingerprint
+        self.players = []
+        self.online = False
+        self.beacon_expires = 0
+        self._session = None
+
+    @property
+    def session(self):
+        """Pooled HTTP session, created on first use."""
+        if self._session is None:
+            import requests
+            session = requests.Session()
+            session.headers['Authorization'] = f"Bearer {self.token}"
+            if self.fingerprint:
+                # The pinned fingerprint replaces chain and hostname checks
+                session.mount('https://', _pinned_adapter(self.fingerprint))
+            elif self.ca:
+                session.verify = self.ca
+            else:
+                session.verify = PEER_VERIFY_TLS
+                if not PEER_VERIFY_TLS:
+                    log.warning("TLS verification of peer %s is disabled", self.name)
+            self._session = session
+        return self._session
+
+    def request(self, method, path, timeout=PEER_TIMEOUT, **kwargs):
+        """Send a request to the peer.
+
+        Returns:
+            The response, or None if the peer couldn't be reached
+        """
+        try:
+            response = self.session.request(method, self.url + path, timeout=timeout, **kwargs)
+        except Exception as e:
+            if self.online:
+                log.warning("Peer %s is unreachable: %s", self.name, e)
+            self.online = False
+            metrics.increment('federation.errors')
+            return None
+        self.online = True
+        metrics.increment('federation.requests')
+        return response
+
+    def player_id(self, remote_id):
+        """Aggregated id for a player on this peer."""
+        return f"{REMOTE_PREFIX}{self.name}/{remote_id}"
+
+peers = {
+    peer['name']: Peer(peer['name'], peer['url'], peer['token'], peer.get('ca'), peer.get('fingerprint'))
+    for peer in PEER_SERVERS
+}
+peers_lock = threading.Lock()
+
+def is_remote(player_id):
+    """Check whether a player id belongs to a peer's player."""
+    return bool(player_id) and player_id.startswith(REMOTE_PREFIX)
+
+def split_id(player_id):
+    """Split an aggregated id into (peer, player id on the peer)."""
+    name, _, remote_id = player_id[len(REMOTE_PREFIX):].partition('/')
+    return peers.get(name), remote_id
+
+def service_name(player_id):
+    """MPRIS service name of a local or remote player, for priority matching."""
+    return split_id(player_id)[1] if is_remote(player_id) else player_id
+
+class RemotePlayer:
+    """Stands in for the D-Bus proxy of a player that lives on a peer."""
+
+    def __init__(self, peer, remote_id):
+        self.peer = peer
+        self.remote_id = remote_id
+
+    def forward(self, path, payload=None):
+        """Forward a command to the peer, targeting this player.
+
+        The peer's state isn't waited for: it belongs to the peer's
+        versioning, and callers read the player's state again here.
+
+        Args:
+            path: Command endpoint on the peer, e.g. '/next'
+            payload: Optional JSON body
+
+        Returns:
+            Tuple of (response dict, status code)
+        """
+        params = {'player': self.remote_id}
+        response = self.peer.request('POST', path, timeout=PEER_COMMAND_TIMEOUT, params=params, json=payload or {})
+        if response is None:
+            return {"error": f"Peer {self.peer.name} is unreachable"}, 502
+        metrics.increment('federation.commands')
+        try:
+            body = response.json()
+        except ValueError:
+            body = {"error": f"Unexpected response from peer {self.peer.name}"}
+        mark_changed(self.peer.player_id(self.remote_id))
+        return body, response.status_code
+
+    def command(self, command):
+        """Run play, pause, next, previous or playpause on the peer."""
+        body, status = self.forward(f"/{command}")
+        # The peer may still attach its own state; callers read it again here
+        for key in ('state', 'version', 'state_changed'):
+            body.pop(key, None)
+        return body, status
+
+    def get_state(self):
+        """Lightweight playback state from the peer, or None."""
+        response = self.peer.request('GET', '/state', params={'player': self.remote_id})
+        if response is None or response.status_code != 200:
+            return None
+        state = response.json()
+        state.pop('version', None)
+        state.pop('art_hash', None)
+        state['player'] = self.peer.player_id(self.remote_id)
+        state['host'] = self.peer.name
+        return state
+
+    def position(self):
+        """Playback position in milliseconds, or 0 if unknown."""
+        state = self.get_state()
+        return state.get('position', 0) if state else 0
+
+def get_player(player_id):
+    """Get a RemotePlayer for an aggregated id if its peer currently lists it."""
+    peer, remote_id = split_id(player_id)
+    if not peer:
+        return None
+    with peers_lock:
+        listed = any(p['id'] == player_id for p in peer.players)
+    return RemotePlayer(peer, remote_id) if listed else None
+
+def get_players():
+    """Players of all reachable peers, with their playback status."""
+    with peers_lock:
+        return [dict(player) for peer in peers.values() for player in peer.players]
+
+def get_media_info(player_id):
+    """Resolve media info for a remote player, caching its artwork in the local art store.
+
+    Returns:
+        Media info dict in the same shape as a local player's, or None
+    """
+    player = get_player(player_id)
+    if not player:
+        return None
+    peer, remote_id = player.peer, player.remote_id
+
+    response = peer.request('GET', '/current', params={'player': remote_id, 'include_art': 'false'})
+    if response is None or response.status_code != 200:
+        return None
+    info = response.json()
+
+    art_id = info.get('art_id')
+    art_data = art_store.read(art_id) if art_id else None
+    if art_data:
+        metrics.increment('federation.art_hits')
+    else:
+        art_response = peer.request('GET', '/artwork/raw', params={'player': remote_id})
+        if art_response is not None and art_response.status_code == 200:
+            art_data = art_response.content
+            art_id = art_store.put(art_data)
+            metrics.increment('federation.art_downloads')
+
+    info.pop('version', None)
+    info.update({
+        'player': player_id,
+        'host': peer.name,
+        'art_data': encode_image_base64(art_data) if art_data else None,
+        'art_id': art_id if art_data else None,
+        'is_base64': True,
+    })
+    return info
+
+def refresh_peer(peer):
+    """Fetch a peer's player list and note which players appeared, left or changed status."""
+    response = peer.request('GET', '/players', params={'status': '1'})
+    players = []
+    if response is not None and response.status_code == 200:
+        for player in response.json():
+            # A peer that aggregates too would otherwise hand our own players back
+            if is_remote(player['id']):
+                continue
+            players.append({
+                'id': peer.player_id(player['id']),
+                'name': f"{player['name']} ({peer.name})",
+                'host': peer.name,
+                'playback_status': player.get('playback_status'),
+            })
+
+    with peers_lock:
+        before = {p['id']: p.get('playback_status') for p in peer.players}
+        peer.players = players
+    after = {p['id']: p.get('playback_status') for p in players}
+
+    for player_id in set(before) | set(after):
+        if before.get(player_id) != after.get(player_id):
+            mark_changed(player_id)
+
+def _register_beacon(peer):
+    response = peer.request('POST', '/beacon/register', json={'port': PEER_BEACON_PORT, 'all_players': True})
+    if response is not None and response.status_code == 200:
+        ttl = response.json().get('ttl', 0)
+        # Renew well before the registration runs out
+        peer.beacon_expires = time.time() + ttl / 2
+
+def federation_thread():
+    """Refresh every peer's player list and keep beacon registrations alive."""
+    while True:
+        for peer in list(peers.values()):
+            try:
+                if PEER_BEACON_PORT and time.time() > peer.beacon_expires:
+                    _register_beacon(peer)
+                refresh_peer(peer)
+            except Exception as e:
+                log.error("Error refreshing peer %s: %s", peer.name, e)
+        time.sleep(PEER_POLL_INTERVAL)
+
+def beacon_listener_thread(sock):
+    """Refresh a peer as soon as one of its change beacons arrives."""
+    # Imported here: the beacon module depends on dbus_interface, which imports this one
+    from modules.beacon import decode_beacon
+
+    while True:
+        try:
+            datagram, _ = sock.recvfrom(512)
+            for peer in list(peers.values()):
+                beacon = decode_beacon(datagram, peer.token)
+                if beacon:
+                    metrics.increment('federation.beacons')
+                    mark_changed(peer.player_id(beacon['player']))
+                    refresh_peer(peer)
+                    break
+        except Exception as e:
+            log.error("Error handling peer beacon: %s", e)
+
+def start_federation():
+    """Start polling peers and listening for their beacons, if any peers are configured.
+
+    Returns:
+        The polling thread, or None without peers
+    """
+    if not peers:
+        return None
+
+    thread = threading.Thread(target=federation_thread, daemon=True)
+    thread.start()
+
+    if PEER_BEACON_PORT:
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(('0.0.0.0', PEER_BEACON_PORT))
+            threading.Thread(target=beacon_listener_thread, args=(sock,), daemon=True).start()
+        except OSError as e:
+            log.warning("Could not listen for peer beacons on port %s: %s", PEER_BEACON_PORT, e)
+
+    log.info("Aggregating players from peers: %s", ', '.join(peers))
+    return thread
@@ -0,0 +1,125 @@
+"""End-to-end latency of state changes, from the server noticing a change to the device showing it.
+
+Responses that carry a player's state are stamped with headers saying
+which version they hold and how old it was when the request arrived, plus
+a Server-Timing header with the time spent answering. Devices echo these
+back with their own fetch, decode and render times once a version is on
+screen, and the report splits each sample into:
+
+    detection  change observed on the server until a device asked for it
+    server     time spent answering the device's requests
+    transfer   device fetch time not spent on the server
+    decode     artwork decoding on the device
+    render     pushing the frame to the screen
+"""
+import math
+import time
+import threading
+from collections import deque
+from flask import g
+from config import LATENCY_SAMPLE_SIZE
+from modules import metrics
+from modules.state_store import get_observed
+
+STAGES = ('detection', 'server', 'transfer', 'decode', 'render')
+PERCENTILES = (50, 90, 95, 99)
+
+_lock = threading.Lock()
+_samples = deque(maxlen=LATENCY_SAMPLE_SIZE)
+
+def start_request():
+    """Note when a request arrived, for Server-Timing and state ages."""
+    g.request_started = time.monotonic()
+
+def stamp_state(player_id):
+    """Mark the current request as answering with a player's current state."""
+    g.state_player = player_id
+
+def finish_request(response):
+    """Add the server time, and the state stamp if the request carried state."""
+    started = g.get('request_started')
+    if started is None:
+        return response
+
+    response.headers['Server-Timing'] = f"app;dur={(time.monotonic() - started) * 1000:.1f}"
+
+    player_id = g.get('state_player')
+    observed = get_observed(player_id) if player_id else None
+    if observed:
+        version, observed_at, source = observed
+        response.headers['X-State-Version'] = str(version)
+        response.headers['X-State-Age'] = str(max(0, int((started - observed_at) * 1000)))
+        response.headers['X-State-Source'] = source
+    return response
+
+def record_samples(samples):
+    """Store device reports, ignoring malformed ones.
+
+    Args:
+        samples: List of dicts with version, source, age_ms, server_ms,
+            fetch_ms, decode_ms and render_ms
+
+    Returns:
+        Number of samples stored
+    """
+    stored = 0
+    for sample in samples:
+        try:
+            server = float(sample.get('server_ms', 0))
+            fetch = float(sample.get('fetch_ms', 0))
+            stages = {
+                'detection': float(sample['age_ms']),
+                'server': server,
+                # The device's fetch time includes the server's share
+                'transfer': max(0.0, fetch - server),
+                'decode': float(sample.get('decode_ms', 0)),
+                'render': float(sample.get('render_ms', 0)),
+            }
+        except (AttributeError, KeyError, TypeError, ValueError):
+            continue
+        # float() also takes "nan" and "inf"
+        if not all(math.isfinite(value) and value >= 0 for value in (fetch, *stages.values())):
+            continue
+
+        total = sum(stages.values())
+        with _lock:
+            _samples.append({
+                'time': time.time(),
+                'version': sample.get('version'),
+                'source': sample.get('source') if sample.get('source') in ('signal', 'poll') else 'unknown',
+                'stages': stages,
+                'total': total,
+            })
+        metrics.observe('latency.total_ms', total)
+        stored += 1
+    return stored
+
+def percentiles(values):
+    """Nearest-rank percentiles of a list of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    result = {f"p{p}": ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))] for p in PERCENTILES}
+    result['max'] = ordered[-1]
+    result['count'] = len(ordered)
+    return result
+
+def report(source=None):
+    """Latency percentiles over the stored samples, in total and per stage.
+
+    Args:
+        source: Only include changes observed by 'signal' or by 'poll'
+    """
+    with _lock:
+        samples = [s for s in _samples if not source or s['source'] == source]
+
+    by_source = {}
+    for sample in samples:
+        by_source[sample['source']] = by_source.get(sample['source'], 0) + 1
+
+    return {
+        'samples': len(samples),
+        'by_source': by_source,
+        'total': percentiles([s['total'] for s in samples]),
+        'stages': {stage: percentiles([s['stages'][stage] for s in samples]) for stage in STAGES},
+    }
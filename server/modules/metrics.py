@@ -0,0 +1,32 @@
+"""In-process counters and value summaries exposed on /metrics."""
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_values = {}
+
+def increment(name, amount=1):
+    """Increase a named counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def observe(name, value):
+    """Record a measured value, keeping count, sum, min, max and the last value."""
+    with _lock:
+        summary = _values.get(name)
+        if summary is None:
+            _values[name] = {'count': 1, 'sum': value, 'min': value, 'max': value, 'last': value}
+            return
+        summary['count'] += 1
+        summary['sum'] += value
+        summary['min'] = min(summary['min'], value)
+        summary['max'] = max(summary['max'], value)
+        summary['last'] = value
+
+def snapshot():
+    """Get a copy of all counters and value summaries."""
+    with _lock:
+        values = {}
+        for name, summary in _values.items():
+            values[name] = dict(summary, avg=summary['sum'] / summary['count'])
+        return {'counters': dict(_counters), 'values': values}
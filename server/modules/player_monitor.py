@@ -1,32 +1,40 @@
 """Background monitor thread for MPRIS players."""
 import time
 import threading
-from config import current_player
-from modules.dbus_interface import get_available_players, get_priority_sorted_players
+from modules.dbus_interface import (
+    get_available_players, get_priority_sorted_players, get_current_player, set_current_player
+)
+from utils.log import get_logger
+
+log = get_logger(__name__)
 
 def player_monitor_thread():
-    """Background thread that periodically checks if players are available."""
-    global current_player
+    """Background thread that periodically checks if players are available.
     
+    Goes through get_current_player/set_current_player, so an auto-switch
+    here is seen by the routes, and the new player's media info is usually
+    already warm.
+    """
     while True:
         try:
+            current_player = get_current_player()
             if current_player:
                 available_players = get_available_players()
                 available_player_ids = [p['id'] for p in available_players]
                 
                 if current_player not in available_player_ids:
-                    print(f"Player {current_player} is no longer available")
-                    current_player = None
+                    log.info("Player %s is no longer available", current_player)
+                    set_current_player(None)
                     
                     priority_players = get_priority_sorted_players()
                     if priority_players:
-                        current_player = priority_players[0]['id']
-                        print(f"Auto-switched to priority player: {current_player}")
+                        set_current_player(priority_players[0]['id'])
+                        log.info("Auto-switched to priority player: %s", priority_players[0]['id'])
             
             time.sleep(5)
             
         except Exception as e:
-            print(f"Error in player monitor: {e}")
+            log.error("Error in player monitor: %s", e)
             time.sleep(10)
 
 def start_monitor_thread():
@@ -0,0 +1,88 @@
+"""PropertiesChanged listener for MPRIS players."""
+import threading
+import dbus
+from config import MPRIS_SERVICE_PREFIX
+from modules.state_store import mark_changed
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Unique bus name (":1.42") -> MPRIS service name
+owners = {}
+owners_lock = threading.Lock()
+
+running = False
+
+def _player_for_sender(bus, sender):
+    """Map the unique name a signal came from to the player's well-known name."""
+    with owners_lock:
+        player_id = owners.get(sender)
+    if player_id:
+        return player_id
+
+    try:
+        obj = bus.get_object('org.freedesktop.DBus', '/org/freedesktop/DBus')
+        dbus_interface = dbus.Interface(obj, 'org.freedesktop.DBus')
+        for service in dbus_interface.ListNames():
+            if service.startswith(MPRIS_SERVICE_PREFIX) and dbus_interface.GetNameOwner(service) == sender:
+                with owners_lock:
+                    owners[sender] = str(service)
+                return str(service)
+    except dbus.exceptions.DBusException as e:
+        log.warning("Error resolving signal sender %s: %s", sender, e)
+    return None
+
+def start_signal_listener():
+    """Subscribe to player PropertiesChanged signals and run the GLib main loop in a thread.
+
+    Signal delivery needs a running main loop, which Flask doesn't provide.
+    Without PyGObject the server still works, it just can't react to changes.
+
+    Returns:
+        The listener thread, or None if the GLib main loop isn't available
+    """
+    global running
+
+    try:
+        from gi.repository import GLib
+    except ImportError:
+        log.warning("PyGObject not installed. Player change signals are disabled.")
+        return None
+
+    bus = dbus.SessionBus()
+
+    def on_properties_changed(interface, changed, invalidated, sender=None):
+        if interface != 'org.mpris.MediaPlayer2.Player':
+            return
+        player_id = _player_for_sender(bus, sender)
+        if player_id:
+            mark_changed(player_id)
+
+    def on_name_owner_changed(name, old_owner, new_owner):
+        if not name.startswith(MPRIS_SERVICE_PREFIX):
+            return
+        with owners_lock:
+            owners.pop(str(old_owner), None)
+            if new_owner:
+                owners[str(new_owner)] = str(name)
+        mark_changed(str(name))
+
+    bus.add_signal_receiver(
+        on_properties_changed,
+        signal_name='PropertiesChanged',
+        dbus_interface='org.freedesktop.DBus.Properties',
+        path='/org/mpris/MediaPlayer2',
+        sender_keyword='sender'
+    )
+    bus.add_signal_receiver(
+        on_name_owner_changed,
+        signal_name='NameOwnerChanged',
+        dbus_interface='org.freedesktop.DBus',
+        bus_name='org.freedesktop.DBus'
+    )
+
+    loop = GLib.MainLoop()
+    listener_thread = threading.Thread(target=loop.run, daemon=True)
+    listener_thread.start()
+    running = True
+    return listener_thread
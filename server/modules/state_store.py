@@ -0,0 +1,181 @@
+"""Per-player state versioning for the MPRIS server."""
+import threading
+import time
+from collections import deque
+from config import STATE_HISTORY_SIZE
+
+# Fields that define a distinct player state. Position and the track id are
+# left out so a playing track doesn't produce a new version on every poll.
+STATE_FIELDS = ('artist', 'title', 'album', 'playback_status', 'art_url')
+
+_lock = threading.Lock()
+_changed = threading.Condition(_lock)
+_players = {}
+_change_counts = {}
+_total_changes = 0
+# Monotonic time of each player's latest change notification
+_last_signal = {}
+
+# Seeded from the clock so versions keep increasing across server restarts
+_next_version = int(time.time())
+
+def _fingerprint(state):
+    return tuple(state.get(field) for field in STATE_FIELDS)
+
+def record_state(player_id, state, art_hash=None, snapshot=None):
+    """Record the latest state for a player and return its version.
+
+    Args:
+        player_id: MPRIS service name of the player
+        state: Dict with at least the STATE_FIELDS keys
+        art_hash: Optional hash of the resolved artwork for state['art_url']
+        snapshot: Optional full response document to keep in the version
+            history, used as a base for delta responses
+
+    Returns:
+        The state version, bumped whenever the state fields or the snapshot change
+    """
+    global _next_version
+
+    fingerprint = _fingerprint(state)
+    now = time.monotonic()
+    with _lock:
+        entry = _players.get(player_id)
+        if entry is None:
+            entry = {
+                'version': 0, 'fingerprint': None, 'art_url': None, 'art_hash': None,
+                'observed': 0.0, 'source': 'poll',
+                'history': deque(maxlen=STATE_HISTORY_SIZE)
+            }
+            _players[player_id] = entry
+
+        if entry['fingerprint'] != fingerprint:
+            _next_version += 1
+            entry['version'] = _next_version
+            entry['fingerprint'] = fingerprint
+
+            # A change notification since the previous version is when the
+            # change was seen; without one it was only noticed by reading now
+            signalled = _last_signal.get(player_id)
+            if signalled is not None and signalled > entry['observed']:
+                entry['observed'], entry['source'] = signalled, 'signal'
+            else:
+                entry['observed'], entry['source'] = now, 'poll'
+
+        if art_hash:
+            entry['art_url'] = state.get('art_url')
+            entry['art_hash'] = art_hash
+
+        history = entry['history']
+        if snapshot is not None:
+            if history and history[-1][0] == entry['version'] and history[-1][1] != snapshot:
+                # Fields outside STATE_FIELDS (track id, artwork id, palette,
+                # preview) changed; a new version keeps each delta base exact
+                _next_version += 1
+                entry['version'] = _next_version
+            if not history or history[-1][0] != entry['version']:
+                history.append((entry['version'], dict(snapshot)))
+
+        return entry['version']
+
+def get_snapshot(player_id, version):
+    """Get the snapshot recorded for a version, or None if it's no longer in the history."""
+    with _lock:
+        entry = _players.get(player_id)
+        if entry:
+            for recorded_version, snapshot in entry['history']:
+                if recorded_version == version:
+                    return snapshot
+        return None
+
+def compute_delta(base, current):
+    """Compute the changes that turn one snapshot into another.
+
+    Returns:
+        Tuple of (dict of changed or added fields, list of removed field names)
+    """
+    changed = {key: value for key, value in current.items() if key not in base or base[key] != value}
+    removed = [key for key in base if key not in current]
+    return changed, removed
+
+def get_version(player_id):
+    """Get the current state version of a player, or 0 if unknown."""
+    with _lock:
+        entry = _players.get(player_id)
+        return entry['version'] if entry else 0
+
+def get_observed(player_id):
+    """Get when the current version of a player was first observed.
+
+    Returns:
+        Tuple of (version, monotonic time, 'signal' or 'poll'), or None if unknown
+    """
+    with _lock:
+        entry = _players.get(player_id)
+        if entry:
+            return entry['version'], entry['observed'], entry['source']
+        return None
+
+def get_art_hash(player_id, art_url):
+    """Get the last known artwork hash for a player if its art URL still matches."""
+    with _lock:
+        entry = _players.get(player_id)
+        if entry and entry['art_hash'] and entry['art_url'] == art_url:
+            return entry['art_hash']
+        return None
+
+def mark_changed(player_id):
+    """Note that a player reported a property change and wake any waiters."""
+    global _total_changes
+
+    with _changed:
+        _change_counts[player_id] = _change_counts.get(player_id, 0) + 1
+        _total_changes += 1
+        _last_signal[player_id] = time.monotonic()
+        _changed.notify_all()
+
+def get_change_count(player_id):
+    """Get the number of change notifications seen for a player."""
+    with _lock:
+        return _change_counts.get(player_id, 0)
+
+def get_change_counts():
+    """Get a copy of the change counts of all players."""
+    with _lock:
+        return dict(_change_counts)
+
+def wait_for_change(player_id, since, timeout):
+    """Block until a player reports a change after the given change count.
+
+    Args:
+        player_id: MPRIS service name of the player
+        since: Change count read before the action that should cause a change
+        timeout: Maximum seconds to wait
+
+    Returns:
+        True if a change arrived, False on timeout
+    """
+    with _changed:
+        return _changed.wait_for(lambda: _change_counts.get(player_id, 0) > since, timeout)
+
+def get_total_changes():
+    """Get the number of change notifications seen across all players."""
+    with _lock:
+        return _total_changes
+
+def wait_for_any_change(since, timeout):
+    """Block until any player reports a change after the given total count.
+
+    Returns:
+        The new total change count (unchanged on timeout)
+    """
+    with _changed:
+        _changed.wait_for(lambda: _total_changes > since, timeout)
+        return _total_changes
+
+def forget_player(player_id):
+    """Drop the stored state for a player that went away."""
+    with _lock:
+        _players.pop(player_id, None)
+        _change_counts.pop(player_id, None)
+        _last_signal.pop(player_id, None)
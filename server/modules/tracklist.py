@@ -0,0 +1,225 @@
+"""Paged tracklist and playlist browsing with a thumbnail sprite atlas.
+
+A page lists the player's TrackList entries, or its playlists when it has
+no tracklist. All thumbnails of a page are packed into one JPEG, stacked
+vertically at TRACKLIST_TILE_SIZE, so a client fetches and decodes a single
+image and can draw it once beside its list rows. Atlases are stored in the
+art store and remembered per tracklist version, so an unchanged page is
+never composed twice.
+"""
+import os
+import re
+import json
+import random
+import hashlib
+import urllib.parse
+from io import BytesIO
+import dbus
+from config import TRACKLIST_TILE_SIZE, TRACKLIST_PAGE_LIMIT, TRACKLIST_CACHE_SIZE_LIMIT
+from modules import metrics
+from modules.commands import command_response
+from modules.dbus_interface import parse_track_metadata
+from modules.dispatch import dispatch
+from modules.federation import RemotePlayer
+from utils import art_store
+from utils.art_fetcher import fetch_art
+from utils.image_utils import resize_image, encode_jpeg
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+ROOT_INTERFACE = 'org.mpris.MediaPlayer2'
+PLAYER_INTERFACE = 'org.mpris.MediaPlayer2.Player'
+TRACKLIST_INTERFACE = 'org.mpris.MediaPlayer2.TrackList'
+PLAYLISTS_INTERFACE = 'org.mpris.MediaPlayer2.Playlists'
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+
+OBJECT_PATH_PATTERN = re.compile(r'/|(/[A-Za-z0-9_]+)+')
+
+# content version -> atlas digest in the art store
+atlas_cache = {}
+
+def _get_property(player_obj, interface, name, default=None):
+    try:
+        props_interface = dbus.Interface(player_obj, PROPERTIES_INTERFACE)
+        return props_interface.Get(interface, name)
+    except dbus.exceptions.DBusException:
+        return default
+
+def _list_tracks(player_obj, offset, limit):
+    tracks = _get_property(player_obj, TRACKLIST_INTERFACE, 'Tracks', [])
+    page = list(tracks[offset:offset + limit])
+    metadata = []
+    if page:
+        tracklist_interface = dbus.Interface(player_obj, TRACKLIST_INTERFACE)
+        metadata = tracklist_interface.GetTracksMetadata(page)
+
+    items = []
+    for entry in metadata:
+        track = parse_track_metadata(entry)
+        items.append({
+            'id': track['id'],
+            'title': track['title'],
+            'artist': track['artist'],
+            'album': track['album'],
+            'art_url': track['art_url'],
+        })
+    return items, len(tracks)
+
+def _list_playlists(player_obj, offset, limit):
+    playlists_interface = dbus.Interface(player_obj, PLAYLISTS_INTERFACE)
+    playlists = playlists_interface.GetPlaylists(dbus.UInt32(offset), dbus.UInt32(limit), 'UserDefined', False)
+    total = int(_get_property(player_obj, PLAYLISTS_INTERFACE, 'PlaylistCount', offset + len(playlists)))
+
+    items = []
+    for path, name, icon in playlists:
+        items.append({
+            'id': str(path),
+            'title': str(name),
+            'artist': '',
+            'album': '',
+            'art_url': str(icon),
+        })
+    return items, total
+
+def _load_thumbnail(art_url):
+    """Thumbnail JPEG for an entry's art URL, or None if it has no usable art."""
+    tile_size = (TRACKLIST_TILE_SIZE, TRACKLIST_TILE_SIZE)
+    if art_url.startswith(('http://', 'https://')):
+        # Resized straight from the downloaded original
+        return fetch_art(art_url, tile_size, 'tracklist.thumbnail')
+
+    if not art_url.startswith('file://'):
+        return None
+    path = urllib.parse.unquote(art_url[7:])
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        image_data = f.read()
+    # Goes through artwork deduplication, so a cover shared by many tracks is resized once
+    return resize_image(image_data, tile_size, 'tracklist.thumbnail')
+
+def _build_atlas(items):
+    """Compose the page's thumbnails into one vertical strip and store it.
+
+    Returns:
+        Tuple of (atlas digest, list of tile rects or None per item)
+    """
+    from PIL import Image
+
+    tile = TRACKLIST_TILE_SIZE
+    atlas = Image.new('RGB', (tile, tile * len(items)), (24, 24, 24))
+    tiles = []
+    for i, item in enumerate(items):
+        rect = None
+        try:
+            thumbnail = _load_thumbnail(item['art_url']) if item['art_url'] else None
+            if thumbnail:
+                atlas.paste(Image.open(BytesIO(thumbnail)).convert('RGB'), (0, i * tile))
+                rect = [0, i * tile, tile, tile]
+        except Exception as e:
+            log.warning("Error loading thumbnail for %s: %s", item['id'], e)
+        tiles.append(rect)
+
+    # Thumbnails are small enough that the atlas needs no byte budget
+    atlas_data, _ = encode_jpeg(atlas, budget=None, max_quality=80, metric='tracklist.atlas')
+    metrics.increment('tracklist.atlases_built')
+    return art_store.put(atlas_data), tiles
+
+def _get_atlas(player_id, items):
+    """Atlas for a page, composed only when its entries or artwork changed."""
+    if not items:
+        return None, []
+
+    content = json.dumps([player_id, TRACKLIST_TILE_SIZE, [(i['id'], i['art_url']) for i in items]])
+    key = hashlib.sha256(content.encode()).hexdigest()[:16]
+
+    cached = atlas_cache.get(key)
+    if cached and art_store.exists(cached[0]):
+        metrics.increment('tracklist.atlas_hits')
+        return cached
+
+    result = _build_atlas(items)
+    if key not in atlas_cache and len(atlas_cache) >= TRACKLIST_CACHE_SIZE_LIMIT:
+        random_key = random.choice(list(atlas_cache.keys()))
+        del atlas_cache[random_key]
+    atlas_cache[key] = result
+    return result
+
+def get_tracklist(player_id, player_obj, offset=0, limit=10):
+    """Get one page of a player's tracklist, or its playlists, with a thumbnail atlas.
+
+    Args:
+        player_id: MPRIS service name of the player
+        player_obj: DBus proxy object for the player, or a RemotePlayer
+        offset: Index of the first entry
+        limit: Number of entries, at most TRACKLIST_PAGE_LIMIT
+
+    Returns:
+        Tuple of (response dict, status code)
+    """
+    if isinstance(player_obj, RemotePlayer):
+        return {"error": "Tracklists of peer players aren't available here"}, 404
+
+    offset = max(0, offset)
+    limit = max(1, min(limit, TRACKLIST_PAGE_LIMIT))
+
+    try:
+        if _get_property(player_obj, ROOT_INTERFACE, 'HasTrackList', False):
+            source = 'tracklist'
+            items, total = _list_tracks(player_obj, offset, limit)
+        elif _get_property(player_obj, PLAYLISTS_INTERFACE, 'PlaylistCount') is not None:
+            source = 'playlists'
+            items, total = _list_playlists(player_obj, offset, limit)
+        else:
+            return {"error": "Player has no tracklist or playlists"}, 404
+    except dbus.exceptions.DBusException as e:
+        log.warning("Error listing tracks for %s: %s", player_id, e)
+        return {"error": str(e)}, 500
+
+    metadata = _get_property(player_obj, PLAYER_INTERFACE, 'Metadata', {})
+    current_id = str(metadata.get('mpris:trackid', '')) if metadata else ''
+
+    atlas_id, tiles = _get_atlas(player_id, items)
+    for item, rect in zip(items, tiles):
+        item['tile'] = rect
+        item['current'] = item['id'] == current_id
+        del item['art_url']
+
+    page = {
+        'player': player_id,
+        'source': source,
+        'offset': offset,
+        'limit': limit,
+        'total': total,
+        'tile_size': TRACKLIST_TILE_SIZE,
+        'atlas': atlas_id,
+        'items': items,
+    }
+    page['version'] = hashlib.sha256(json.dumps(page, sort_keys=True).encode()).hexdigest()[:16]
+    return page, 200
+
+def go_to(player_id, player_obj, entry_id, source):
+    """Start playing a tracklist entry or activate a playlist.
+
+    Args:
+        player_id: MPRIS service name of the player
+        player_obj: DBus proxy object for the player, or a RemotePlayer
+        entry_id: Track or playlist object path from a tracklist page
+        source: 'tracklist' or 'playlists', as reported by the page
+
+    Returns:
+        Tuple of (response dict, status code)
+    """
+    if isinstance(player_obj, RemotePlayer):
+        return {"error": "Tracklists of peer players aren't available here"}, 404
+
+    if not isinstance(entry_id, str) or not OBJECT_PATH_PATTERN.fullmatch(entry_id):
+        return {"error": "Invalid entry id, expected a D-Bus object path"}, 400
+    entry_path = dbus.ObjectPath(entry_id)
+
+    if source == 'playlists':
+        method = dbus.Interface(player_obj, PLAYLISTS_INTERFACE).ActivatePlaylist
+    else:
+        method = dbus.Interface(player_obj, TRACKLIST_INTERFACE).GoTo
+    return command_response(dispatch(player_id, 'goto', method, (entry_path,)))
@@ -0,0 +1,86 @@
+"""Background refresh of media info for every live local player.
+
+The current player is kept fresh by the device polling it, but any other
+player would be resolved from scratch on the first request after a switch,
+including its artwork. This thread resolves each local player's media info
+whenever the player reports a change, so a switch is answered from the
+media info cache. Each round spends at most WARM_CACHE_BUDGET seconds;
+players left over go first in the next round.
+
+Rounds only run while the signal listener is running. Without change
+signals cached media info expires every MEDIA_INFO_FRESHNESS seconds, and
+warming would re-resolve every player, artwork included, on every round.
+"""
+import time
+import threading
+from config import WARM_CACHE_ENABLED, WARM_CACHE_INTERVAL, WARM_CACHE_BUDGET
+from modules import metrics, federation, signal_listener
+from modules.dbus_interface import (
+    get_available_players, get_cached_media_info, refresh_media_info, forget_media_info, media_info_cache
+)
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+# player_id -> time of the last refresh by this thread, to rotate through players fairly
+last_warmed = {}
+
+def warm_round(budget=WARM_CACHE_BUDGET):
+    """Refresh stale media info of live local players, within a time budget.
+
+    Returns:
+        Number of players refreshed
+    """
+    if not signal_listener.running:
+        return 0
+
+    player_ids = [p['id'] for p in get_available_players()]
+    local_ids = [player_id for player_id in player_ids if not federation.is_remote(player_id)]
+
+    for player_id in list(media_info_cache):
+        if player_id not in player_ids:
+            forget_media_info(player_id)
+            last_warmed.pop(player_id, None)
+
+    due = [player_id for player_id in local_ids if not get_cached_media_info(player_id)]
+    # Players that waited longest go first, so a tight budget still reaches all of them
+    due.sort(key=lambda player_id: last_warmed.get(player_id, 0))
+
+    started = time.monotonic()
+    refreshed = 0
+    for i, player_id in enumerate(due):
+        if time.monotonic() - started > budget:
+            metrics.increment('warm_cache.deferred', len(due) - i)
+            break
+        try:
+            refresh_media_info(player_id, available_player_ids=player_ids)
+            refreshed += 1
+        except Exception as e:
+            log.warning("Error warming media info for %s: %s", player_id, e)
+        last_warmed[player_id] = time.monotonic()
+
+    if refreshed:
+        metrics.increment('warm_cache.refreshes', refreshed)
+        metrics.observe('warm_cache.round_ms', (time.monotonic() - started) * 1000)
+    return refreshed
+
+def warm_cache_thread():
+    """Keep every live local player's media info resolved."""
+    while True:
+        try:
+            warm_round()
+        except Exception as e:
+            log.error("Error in warm cache round: %s", e)
+        time.sleep(WARM_CACHE_INTERVAL)
+
+def start_warm_cache():
+    """Start the warm cache thread, if enabled.
+
+    Returns:
+        The thread, or None when disabled
+    """
+    if not WARM_CACHE_ENABLED:
+        return None
+    thread = threading.Thread(target=warm_cache_thread, daemon=True)
+    thread.start()
+    return thread
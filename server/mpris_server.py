@@ -3,32 +3,71 @@
 MPRIS Server for PrestoDeck
 --------------------------
 A web server to expose MPRIS media player interfaces over HTTP/HTTPS
+
+Run with --init once at install time to create the API token and the
+self-signed certificate, so regular starts never pay for key generation.
 """
-from flask import Flask
-import dbus
-from dbus.mainloop.glib import DBusGMainLoop
-from config import DEFAULT_PORT
-from modules.player_monitor import start_monitor_thread
-from utils.ssl_utils import create_ssl_context, get_server_ip
-from modules.auth import API_TOKEN
-from api.routes import register_routes
+import sys
+from utils.startup import startup_timer, warm_up_in_background
+
+with startup_timer.phase("import flask"):
+    from flask import Flask
+
+with startup_timer.phase("import dbus"):
+    from dbus.mainloop.glib import DBusGMainLoop
+
+with startup_timer.phase("import modules"):
+    from config import DEFAULT_PORT, BEACON_ENABLED
+    from modules.player_monitor import start_monitor_thread
+    from modules.signal_listener import start_signal_listener
+    from modules.beacon import start_beacon_thread
+    from modules.federation import start_federation
+    from modules.warm_cache import start_warm_cache
+    from utils.ssl_utils import create_ssl_context, get_server_ip, cert_fingerprint
+    from modules.auth import API_TOKEN
+    from api.routes import register_routes
 
 DBusGMainLoop(set_as_default=True)
 
 app = Flask(__name__)
 
-register_routes(app)
+with startup_timer.phase("register routes"):
+    register_routes(app)
 
 if __name__ == '__main__':
-    ssl_context = create_ssl_context()
+    if '--init' in sys.argv:
+        create_ssl_context()
+        print(f"MPRIS_API_TOKEN = \"{API_TOKEN}\"")
+        fingerprint = cert_fingerprint()
+        if fingerprint:
+            print(f"Certificate fingerprint, for PEER_SERVERS on other servers: {fingerprint}")
+        sys.exit(0)
+
+    with startup_timer.phase("ssl context"):
+        ssl_context = create_ssl_context()
+
+    # Imaging and HTTP client stacks load on first use; start loading them now
+    # without holding up the listening socket
+    warm_up_in_background(['PIL.Image', 'requests'])
+
     ip_address = get_server_ip()
-    
+
     port = DEFAULT_PORT
-    
+
     print(f"\nServer running at: https://{ip_address}:{port}")
-    print(f"\nAdd to your env file:")
+    print("\nAdd to your env file:")
     print(f"MPRIS_API_TOKEN = \"{API_TOKEN}\"")
     print(f"MPRIS_SERVER_URL = \"https://{ip_address}:{port}\"")
-    
-    monitor_thread = start_monitor_thread()
+
+    with startup_timer.phase("background threads"):
+        monitor_thread = start_monitor_thread()
+        signal_thread = start_signal_listener()
+        if BEACON_ENABLED:
+            beacon_thread = start_beacon_thread()
+        federation_thread = start_federation()
+        warm_cache_thread = start_warm_cache()
+
+    print("\nStartup timings:")
+    startup_timer.print_report()
+
     app.run(host='0.0.0.0', port=port, ssl_context=ssl_context)
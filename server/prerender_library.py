@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Library artwork pre-renderer
+----------------------------
+Walks a music library, finds each track's cover the way the server does
+(embedded picture, then a cover image in the folder), resizes it in a pool
+of worker processes and writes it to the server's art store. The library
+index records which cover belongs to which file, so the server serves
+these covers without decoding anything on first play.
+
+Re-runs only process files whose mtime or size changed, or whose cover
+image did, and an interrupted run continues where it stopped.
+
+    python server/prerender_library.py ~/Music --workers 8
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+
+from config import DEFAULT_ARTWORK_SIZE, LIBRARY_INDEX_FILE
+from utils import art_store, library_index
+from utils.local_art import find_cover
+from utils.image_utils import resize_image
+
+AUDIO_EXTENSIONS = (
+    '.mp3', '.flac', '.m4a', '.mp4', '.aac', '.alac', '.ogg', '.oga', '.opus',
+    '.wav', '.aif', '.aiff', '.wma', '.ape', '.wv', '.mpc',
+)
+
+# Rows written per transaction; an interrupted run loses at most this many
+COMMIT_EVERY = 200
+
+def walk_library(roots):
+    """Yield the paths of all audio files below the given directories."""
+    for root in roots:
+        for directory, _, files in os.walk(os.path.abspath(os.path.expanduser(root))):
+            for name in files:
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    yield os.path.join(directory, name)
+
+def is_current(row, stamp, dir_mtime_ns):
+    """Check whether an indexed row still describes a file, so it can be skipped."""
+    if not row:
+        return False
+    mtime_ns, size, indexed_dir_mtime_ns, digest, source, source_mtime_ns = row
+    if (mtime_ns, size) != stamp:
+        return False
+    if digest:
+        return art_store.exists(digest) and library_index.source_stamp(source) == source_mtime_ns
+    # No cover last time; a new image in the folder changes its mtime
+    return indexed_dir_mtime_ns == dir_mtime_ns
+
+def render(path):
+    """Resolve, resize and store one track's cover. Runs in a worker process.
+
+    Returns:
+        An index row, or None if the file vanished
+    """
+    stamp = library_index.file_stamp(path)
+    dir_stamp = library_index.file_stamp(os.path.dirname(path))
+    if not stamp or not dir_stamp:
+        return None
+
+    digest = source = None
+    try:
+        image_data, source = find_cover(path)
+        if image_data:
+            art_data = resize_image(image_data, DEFAULT_ARTWORK_SIZE)
+            digest = art_store.put(art_data) if art_data else None
+    except Exception as e:
+        print(f"Error rendering {path}: {e}", file=sys.stderr)
+
+    source_mtime_ns = library_index.source_stamp(source) if digest else None
+    return (path, stamp[0], stamp[1], dir_stamp[0], digest, source if digest else None, source_mtime_ns)
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render artwork for a music library into the server's art store")
+    parser.add_argument("roots", nargs="+", help="Music library directories")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--index", default=LIBRARY_INDEX_FILE, help="Library index file")
+    parser.add_argument("--force", action="store_true", help="Process every file, even unchanged ones")
+    parser.add_argument("--prune", action="store_true", help="Drop index rows for files that no longer exist")
+    args = parser.parse_args()
+
+    connection = library_index.connect(args.index)
+    rows = library_index.load_rows(connection)
+
+    seen = set()
+    pending = []
+    skipped = 0
+    dir_stamps = {}
+    for path in walk_library(args.roots):
+        seen.add(path)
+        stamp = library_index.file_stamp(path)
+        directory = os.path.dirname(path)
+        if directory not in dir_stamps:
+            dir_stamps[directory] = library_index.file_stamp(directory)
+        dir_stamp = dir_stamps[directory]
+        if not args.force and stamp and dir_stamp and is_current(rows.get(path), stamp, dir_stamp[0]):
+            skipped += 1
+        else:
+            pending.append(path)
+
+    print(f"{len(seen)} tracks, {skipped} unchanged, {len(pending)} to render")
+
+    started = time.time()
+    rendered = with_cover = 0
+    batch = []
+    try:
+        with multiprocessing.Pool(args.workers) as pool:
+            # Tracks of one album are neighbours, so chunks mostly share a cover
+            for row in pool.imap_unordered(render, pending, chunksize=16):
+                if row is None:
+                    continue
+                batch.append(row)
+                rendered += 1
+                with_cover += bool(row[4])
+                if len(batch) >= COMMIT_EVERY:
+                    library_index.store_rows(connection, batch)
+                    batch = []
+                    elapsed = time.time() - started
+                    print(f"{rendered}/{len(pending)} rendered ({rendered / elapsed:.1f}/s)")
+    finally:
+        if batch:
+            library_index.store_rows(connection, batch)
+
+    if args.prune:
+        # Only rows below the scanned roots can be judged missing
+        roots = tuple(os.path.join(os.path.abspath(os.path.expanduser(root)), '') for root in args.roots)
+        missing = [path for path in rows if path.startswith(roots) and path not in seen]
+        library_index.delete_rows(connection, missing)
+        print(f"Pruned {len(missing)} missing tracks")
+
+    connection.close()
+    print(f"Rendered {rendered} tracks, {with_cover} with a cover, in {time.time() - started:.1f}s")
+
+if __name__ == '__main__':
+    main()
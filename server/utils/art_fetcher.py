@@ -0,0 +1,130 @@
+"""Cached, single-flight fetching of artwork from http(s) URLs."""
+import re
+import time
+import random
+import threading
+from config import ART_URL_CACHE_SIZE_LIMIT, ART_URL_DEFAULT_TTL, DEFAULT_ARTWORK_SIZE
+from modules import metrics
+from utils.image_utils import resize_image
+from utils.single_flight import SingleFlight
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+
+class ArtFetcher:
+    """Fetches and resizes remote artwork once per URL and revalidates it with the origin.
+
+    Resized art is cached per URL and size together with the response's ETag and
+    Last-Modified validators. Within the Cache-Control lifetime it is served
+    from memory; after that a conditional request decides whether to keep
+    it. Concurrent fetches of the same URL share one request.
+    """
+
+    def __init__(self, cache_size=ART_URL_CACHE_SIZE_LIMIT, default_ttl=ART_URL_DEFAULT_TTL):
+        self.cache_size = cache_size
+        self.default_ttl = default_ttl
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.flight = SingleFlight()
+        self._session = None
+
+    @property
+    def session(self):
+        """Pooled HTTP session, created on first use."""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = 'PrestoDeck-MPRIS (https://github.com/twij/PrestoDeck)'
+            self._session = session
+        return self._session
+
+    def _lifetime(self, headers):
+        """Seconds a response may be used without revalidation."""
+        cache_control = headers.get('Cache-Control', '').lower()
+        if 'no-cache' in cache_control or 'no-store' in cache_control:
+            return 0
+        match = MAX_AGE_PATTERN.search(cache_control)
+        if match:
+            return int(match.group(1))
+        return self.default_ttl
+
+    def _store(self, key, entry):
+        with self.lock:
+            if key not in self.cache and len(self.cache) >= self.cache_size:
+                random_key = random.choice(list(self.cache.keys()))
+                del self.cache[random_key]
+            self.cache[key] = entry
+
+    def _fetch(self, url, entry, target_size, metric):
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = self.session.get(url, headers=headers, timeout=5)
+        except Exception as e:
+            log.warning("Error fetching image from URL %s: %s", url, e)
+            metrics.increment('art_url.errors')
+            # Serve stale art rather than nothing when the origin is unreachable
+            return entry['art'] if entry else None
+
+        if response.status_code == 304 and entry:
+            metrics.increment('art_url.revalidated')
+            entry['expires'] = time.time() + self._lifetime(response.headers)
+            return entry['art']
+
+        if response.status_code != 200:
+            metrics.increment('art_url.errors')
+            return entry['art'] if entry else None
+
+        metrics.increment('art_url.downloads')
+        art = resize_image(response.content, target_size, metric)
+        if not art:
+            metrics.increment('art_url.errors')
+            return entry['art'] if entry else None
+        self._store((url, target_size), {
+            'art': art,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'expires': time.time() + self._lifetime(response.headers),
+        })
+        return art
+
+    def fetch(self, url, target_size=DEFAULT_ARTWORK_SIZE, metric='artwork'):
+        """Get resized artwork for a URL.
+
+        Args:
+            url: http(s) URL of the image
+            target_size: Size to resize the original image to
+            metric: Metric prefix recording the encoding
+
+        Returns:
+            JPEG bytes, or None if the art couldn't be fetched
+        """
+        key = (url, target_size)
+        with self.lock:
+            entry = self.cache.get(key)
+
+        if entry and time.time() < entry['expires']:
+            metrics.increment('art_url.hits')
+            return entry['art']
+
+        art, shared = self.flight.do(key, lambda: self._fetch(url, entry, target_size, metric))
+        if shared:
+            metrics.increment('art_url.coalesced')
+        return art
+
+art_fetcher = ArtFetcher()
+
+def fetch_art(url, target_size=DEFAULT_ARTWORK_SIZE, metric='artwork'):
+    """Fetch resized artwork for an http(s) URL through the shared cache."""
+    return art_fetcher.fetch(url, target_size, metric)
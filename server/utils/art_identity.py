@@ -0,0 +1,94 @@
+"""Artwork identity, so the same cover is processed once whatever path, URL or player it came from.
+
+Two indexes map to the digest of the processed file in the art store:
+source bytes (cheap, skips decoding entirely) and decoded image content
+(catches the same cover re-encoded or re-written under a new name).
+"""
+import random
+import hashlib
+import threading
+from config import ART_IDENTITY_MODE, ART_INDEX_SIZE_LIMIT
+from modules import metrics
+from utils import art_store
+
+source_index = {}
+identity_index = {}
+index_lock = threading.Lock()
+
+def source_key(image_data, target_size):
+    """Key for the exact source bytes at a target size."""
+    digest = hashlib.sha256(image_data).hexdigest()
+    return f"{digest}:{target_size[0]}x{target_size[1]}"
+
+def _perceptual_hash(img):
+    """64-bit difference hash: robust to re-encoding and small resizes."""
+    from PIL import Image
+    small = img.convert('L').resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+def image_identity(img, target_size):
+    """Identity of a decoded image at a target size.
+
+    With ART_IDENTITY_MODE 'pixels' this hashes the decoded pixels, so the
+    same image in a different file or container matches. With 'perceptual'
+    a difference hash plus aspect ratio is used, which also matches
+    re-encodes at other qualities or sizes.
+    """
+    width, height = img.size
+    size = f"{target_size[0]}x{target_size[1]}"
+    if ART_IDENTITY_MODE == 'perceptual':
+        return f"p:{_perceptual_hash(img)}:{round(width / height, 2)}:{size}"
+
+    digest = hashlib.sha256()
+    digest.update(f"{img.mode}:{width}x{height}".encode())
+    digest.update(img.tobytes())
+    return f"x:{digest.hexdigest()}:{size}"
+
+def _bounded_set(index, key, value):
+    if key not in index and len(index) >= ART_INDEX_SIZE_LIMIT:
+        random_key = random.choice(list(index.keys()))
+        del index[random_key]
+    index[key] = value
+
+def _read(digest):
+    return art_store.read(digest) if digest else None
+
+def lookup_source(key):
+    """Get processed artwork for source bytes seen before, or None."""
+    with index_lock:
+        digest = source_index.get(key)
+    art = _read(digest)
+    if art:
+        metrics.increment('art_identity.source_hits')
+    return art
+
+def lookup_identity(identity, key):
+    """Get processed artwork for an image identity seen before, or None.
+
+    On a hit the source key is linked to it, so the next time the same
+    bytes arrive decoding is skipped too.
+    """
+    with index_lock:
+        digest = identity_index.get(identity)
+    art = _read(digest)
+    if art:
+        metrics.increment('art_identity.content_hits')
+        with index_lock:
+            _bounded_set(source_index, key, digest)
+    return art
+
+def remember(identity, key, digest):
+    """Record the stored digest for a newly processed image."""
+    if not digest:
+        return
+    metrics.increment('art_identity.processed')
+    with index_lock:
+        _bounded_set(identity_index, identity, digest)
+        _bounded_set(source_index, key, digest)
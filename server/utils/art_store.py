@@ -0,0 +1,72 @@
+"""Content-addressed on-disk store for resized artwork.
+
+Files are named by a hash of their bytes and never modified after they are
+written, so several server processes can share one directory and serve the
+files straight from disk.
+"""
+import os
+import hashlib
+import tempfile
+from config import ART_STORE_DIR
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Hex digest length; 32 hex chars fit the 16-byte art hash in the binary state format
+DIGEST_LENGTH = 32
+
+known_digests = set()
+
+def art_digest(image_data):
+    """Content hash used as the artwork's identity and ETag."""
+    return hashlib.sha256(image_data).hexdigest()[:DIGEST_LENGTH]
+
+def path_for(digest):
+    """Path of the stored file for a digest."""
+    return os.path.join(ART_STORE_DIR, f"{digest}.jpg")
+
+def exists(digest):
+    """Check whether artwork with this digest is in the store."""
+    return digest in known_digests or os.path.exists(path_for(digest))
+
+def put(image_data):
+    """Store artwork bytes if they aren't stored yet.
+
+    Args:
+        image_data: Encoded JPEG bytes
+
+    Returns:
+        The artwork digest, or None if image_data is empty
+    """
+    if not image_data:
+        return None
+
+    digest = art_digest(image_data)
+    if digest in known_digests:
+        return digest
+
+    path = path_for(digest)
+    if not os.path.exists(path):
+        try:
+            os.makedirs(ART_STORE_DIR, exist_ok=True)
+            # Write under a temporary name and rename, so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=ART_STORE_DIR, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(image_data)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.error("Error writing artwork to store: %s", e)
+            return digest
+
+    known_digests.add(digest)
+    return digest
+
+def read(digest):
+    """Read stored artwork bytes, or None if the file is missing."""
+    try:
+        with open(path_for(digest), 'rb') as f:
+            return f.read()
+    except OSError:
+        known_digests.discard(digest)
+        return None
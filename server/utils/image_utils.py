@@ -1,17 +1,93 @@
 """Image processing utilities for the MPRIS server."""
 import base64
 from io import BytesIO
-import requests
-from PIL import Image, ImageDraw, ImageFont
 
-from config import DEFAULT_ARTWORK_SIZE
+from config import DEFAULT_ARTWORK_SIZE, ARTWORK_BYTE_BUDGET, ARTWORK_MAX_QUALITY, ARTWORK_MIN_QUALITY
+from modules import metrics
+from utils import art_identity, art_store
+from utils.log import get_logger
 
-def resize_image(image_data, target_size=DEFAULT_ARTWORK_SIZE):
-    """Resize image to target size and maintain aspect ratio with black borders."""
+log = get_logger(__name__)
+
+# Pillow is imported on first use to keep server startup fast
+
+def _save_jpeg(img, quality):
+    buffer = BytesIO()
+    # 4:2:0 baseline is what jpegdec decodes fastest; optimize only shrinks the Huffman tables
+    img.save(buffer, format='JPEG', quality=quality, subsampling=2, progressive=False, optimize=True)
+    return buffer.getvalue()
+
+def encode_jpeg(img, budget=ARTWORK_BYTE_BUDGET, max_quality=ARTWORK_MAX_QUALITY, min_quality=ARTWORK_MIN_QUALITY,
+                metric='artwork'):
+    """Encode an image with the Presto profile, at the highest quality that fits a byte budget.
+    
+    Args:
+        img: PIL image
+        budget: Maximum size in bytes, or None for no limit
+        max_quality: Quality tried first
+        min_quality: Lowest quality searched; its output is used even if over budget
+        metric: Prefix of the metrics recording quality and size
+        
+    Returns:
+        Tuple of (JPEG bytes, quality used)
+    """
+    img = img.convert('RGB')
+    data = _save_jpeg(img, max_quality)
+    quality = max_quality
+    attempts = 1
+    
+    if budget and len(data) > budget:
+        # Binary search for the highest quality under budget
+        low, high = min_quality, max_quality - 1
+        best = None
+        while low <= high:
+            middle = (low + high) // 2
+            candidate = _save_jpeg(img, middle)
+            attempts += 1
+            if len(candidate) <= budget:
+                best = (candidate, middle)
+                low = middle + 1
+            else:
+                high = middle - 1
+        if best:
+            data, quality = best
+        else:
+            data, quality = _save_jpeg(img, min_quality), min_quality
+            attempts += 1
+            metrics.increment(metric + '.over_budget')
+            log.warning("Artwork is %s bytes even at quality %s, over the %s byte budget", len(data), quality, budget)
+    
+    metrics.increment(metric + '.encodes')
+    metrics.observe(metric + '.encode_attempts', attempts)
+    metrics.observe(metric + '.quality', quality)
+    metrics.observe(metric + '.bytes', len(data))
+    log.debug("Encoded %s at quality %s: %s bytes after %s attempts", metric, quality, len(data), attempts)
+    return data, quality
+
+def resize_image(image_data, target_size=DEFAULT_ARTWORK_SIZE, metric='artwork'):
+    """Resize image to target size and maintain aspect ratio with black borders.
+    
+    Each distinct source image is resized and encoded only once: sources are
+    identified by their bytes and by their decoded content, and repeats get
+    back the bytes already in the art store, so they also share an ETag.
+    The encoding is recorded under the given metric prefix.
+    """
+    from PIL import Image
     try:
-        print(f"Attempting to resize image, data length: {len(image_data)} bytes")
+        source_key = art_identity.source_key(image_data, target_size)
+        stored = art_identity.lookup_source(source_key)
+        if stored:
+            return stored
+        
+        log.debug("Attempting to resize image, data length: %s bytes", len(image_data))
         img = Image.open(BytesIO(image_data))
-        print(f"Successfully opened image: {img.format}, size: {img.size}, mode: {img.mode}")
+        log.debug("Successfully opened image: %s, size: %s, mode: %s", img.format, img.size, img.mode)
+        
+        identity = art_identity.image_identity(img, target_size)
+        stored = art_identity.lookup_identity(identity, source_key)
+        if stored:
+            log.debug("Artwork matches an already processed image, reusing it")
+            return stored
         
         original_width, original_height = img.size
         aspect_ratio = original_width / original_height
@@ -40,26 +116,17 @@ def resize_image(image_data, target_size=DEFAULT_ARTWORK_SIZE):
         else:
             img = img.resize(target_size, Image.LANCZOS)
         
-        buffer = BytesIO()
-        img.convert('RGB').save(buffer, format='JPEG', quality=85)
-        print(f"Successfully resized image to {target_size}")
-        return buffer.getvalue()
+        art_data, _ = encode_jpeg(img, metric=metric)
+        log.debug("Successfully resized image to %s", target_size)
+        art_identity.remember(identity, source_key, art_store.put(art_data))
+        return art_data
     except Exception as e:
-        print(f"Error resizing image: {e}")
+        log.warning("Error resizing image: %s", e)
         return None
 
-def fetch_art_from_url(url):
-    """Fetch album art from URL and resize it."""
-    try:
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            return resize_image(response.content)
-    except Exception as e:
-        print(f"Error fetching image from URL {url}: {e}")
-    return None
-
 def generate_placeholder_art(text="No Cover", size=DEFAULT_ARTWORK_SIZE):
     """Generate a placeholder image with text."""
+    from PIL import Image, ImageDraw, ImageFont
     try:
         img = Image.new('RGB', size, color=(0, 0, 128))
         draw = ImageDraw.Draw(img)
@@ -82,20 +149,16 @@ def generate_placeholder_art(text="No Cover", size=DEFAULT_ARTWORK_SIZE):
         position = ((size[0]-text_width)//2, (size[1]-text_height)//2)
         draw.text(position, text, fill=(255, 255, 255), font=font)
         
-        buffer = BytesIO()
-        img.save(buffer, format='JPEG', quality=85)
-        buffer.seek(0)
-        return buffer.getvalue()
+        placeholder_data, _ = encode_jpeg(img)
+        return placeholder_data
     except Exception as e:
-        print(f"Error generating placeholder: {e}")
+        log.error("Error generating placeholder: %s", e)
         try:
             img = Image.new('RGB', size, color=(0, 0, 100))
-            buffer = BytesIO()
-            img.save(buffer, format='JPEG', quality=85)
-            buffer.seek(0)
-            return buffer.getvalue()
+            placeholder_data, _ = encode_jpeg(img)
+            return placeholder_data
         except:
-            print("Unable to generate a basic placeholder")
+            log.error("Unable to generate a basic placeholder")
             return None
 
 def encode_image_base64(image_data):
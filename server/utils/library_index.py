@@ -0,0 +1,111 @@
+"""SQLite index of pre-rendered artwork for local tracks, written by prerender_library.py.
+
+Each row maps an audio file to the digest of its resized cover in the art
+store, together with the file's mtime and size and those of the image the
+cover came from. The server trusts a row only while all of them still
+match, so an edited file or a replaced cover.jpg falls back to resolving
+the artwork again.
+"""
+import os
+import sqlite3
+import threading
+from config import LIBRARY_INDEX_FILE
+from modules import metrics
+from utils import art_store
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    dir_mtime_ns INTEGER NOT NULL,
+    digest TEXT,
+    source TEXT,
+    source_mtime_ns INTEGER
+)
+"""
+
+_connection = None
+_lock = threading.Lock()
+
+def connect(path=LIBRARY_INDEX_FILE):
+    """Open the index, creating it if needed."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute(SCHEMA)
+    return connection
+
+def file_stamp(path):
+    """(mtime_ns, size) of a file, or None if it can't be read."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def source_stamp(source):
+    """mtime_ns of the image a cover came from, or None for embedded pictures."""
+    if not source or source.startswith('embedded:'):
+        return None
+    stamp = file_stamp(source)
+    return stamp[0] if stamp else -1
+
+def load_rows(connection):
+    """All rows keyed by path, for deciding which files a run can skip."""
+    rows = {}
+    for row in connection.execute(
+            "SELECT path, mtime_ns, size, dir_mtime_ns, digest, source, source_mtime_ns FROM tracks"):
+        rows[row[0]] = row[1:]
+    return rows
+
+def store_rows(connection, rows):
+    """Insert or replace rows of (path, mtime_ns, size, dir_mtime_ns, digest, source, source_mtime_ns)."""
+    connection.executemany("INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    connection.commit()
+
+def delete_rows(connection, paths):
+    """Remove rows for files that no longer exist."""
+    connection.executemany("DELETE FROM tracks WHERE path = ?", [(path,) for path in paths])
+    connection.commit()
+
+def lookup_art(path):
+    """Pre-rendered artwork for a local track, or None if it isn't indexed or is out of date.
+
+    Args:
+        path: Path of the audio file
+
+    Returns:
+        Resized JPEG bytes from the art store, or None
+    """
+    global _connection
+
+    if not os.path.exists(LIBRARY_INDEX_FILE):
+        return None
+
+    try:
+        with _lock:
+            if _connection is None:
+                _connection = sqlite3.connect(LIBRARY_INDEX_FILE, check_same_thread=False)
+            row = _connection.execute(
+                "SELECT mtime_ns, size, digest, source, source_mtime_ns FROM tracks WHERE path = ?", (path,)
+            ).fetchone()
+    except sqlite3.Error as e:
+        log.warning("Error reading library index: %s", e)
+        return None
+
+    if not row or not row[2]:
+        return None
+    mtime_ns, size, digest, source, source_mtime_ns = row
+    if file_stamp(path) != (mtime_ns, size) or source_stamp(source) != source_mtime_ns:
+        metrics.increment('library_index.stale')
+        return None
+
+    art = art_store.read(digest)
+    if art:
+        metrics.increment('library_index.hits')
+    return art
@@ -0,0 +1,168 @@
+"""Artwork for local tracks, from the file's embedded pictures or a cover image next to it.
+
+Players that don't set mpris:artUrl usually still set xesam:url. For
+file:// tracks this looks for a picture embedded in the file (ID3 APIC,
+FLAC PICTURE, Vorbis METADATA_BLOCK_PICTURE, MP4 covr), which needs
+mutagen, and then for a sidecar image such as cover.jpg or folder.png in
+the track's directory. Directory listings are indexed once and reused
+until the directory's mtime changes.
+"""
+import os
+import base64
+import random
+import threading
+import urllib.parse
+from config import LOCAL_ART_SIDECAR_NAMES, LOCAL_ART_INDEX_SIZE_LIMIT
+from modules import metrics
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+# mutagen is optional and imported on first use; False once it turned out to be missing
+_mutagen = None
+
+SIDECAR_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp')
+
+# ID3/FLAC picture type for the front cover
+FRONT_COVER = 3
+
+# directory -> (mtime_ns, sidecar path or None)
+directory_index = {}
+directory_lock = threading.Lock()
+
+def track_path(track_url):
+    """Local path of a file:// track URL, or None for anything else."""
+    if not track_url or not track_url.startswith('file://'):
+        return None
+    return urllib.parse.unquote(urllib.parse.urlparse(track_url).path)
+
+def _pick_picture(pictures):
+    """Prefer the front cover, else the first picture. Pictures are (type, data) pairs."""
+    for picture_type, data in pictures:
+        if picture_type == FRONT_COVER and data:
+            return data
+    for _, data in pictures:
+        if data:
+            return data
+    return None
+
+def embedded_picture(path):
+    """Image bytes embedded in an audio file's tags, or None.
+
+    Needs mutagen; without it embedded pictures are skipped.
+    """
+    global _mutagen
+
+    if _mutagen is None:
+        try:
+            import mutagen
+            _mutagen = mutagen
+        except ImportError:
+            log.info("mutagen isn't installed, embedded cover art is skipped")
+            _mutagen = False
+    if not _mutagen:
+        return None
+
+    try:
+        audio = _mutagen.File(path)
+    except Exception as e:
+        log.debug("Could not read tags of %s: %s", path, e)
+        return None
+    if audio is None:
+        return None
+
+    pictures = []
+    # FLAC metadata blocks
+    for picture in getattr(audio, 'pictures', None) or []:
+        pictures.append((picture.type, picture.data))
+
+    tags = audio.tags
+    if tags is not None:
+        # ID3 APIC frames, in MP3, AIFF and WAV files
+        if hasattr(tags, 'getall'):
+            for frame in tags.getall('APIC'):
+                pictures.append((frame.type, frame.data))
+        # MP4 covr atoms carry no picture type
+        for cover in tags.get('covr', []) if hasattr(tags, 'get') else []:
+            pictures.append((FRONT_COVER, bytes(cover)))
+        # Ogg Vorbis and Opus keep FLAC picture blocks base64 encoded in a comment
+        if hasattr(tags, 'get'):
+            for encoded in tags.get('metadata_block_picture', []):
+                try:
+                    from mutagen.flac import Picture
+                    picture = Picture(base64.b64decode(encoded))
+                    pictures.append((picture.type, picture.data))
+                except Exception as e:
+                    log.debug("Bad embedded picture in %s: %s", path, e)
+
+    return _pick_picture(pictures)
+
+def _scan_directory(directory):
+    """Find the best sidecar image in a directory, by LOCAL_ART_SIDECAR_NAMES order."""
+    best, best_rank = None, len(LOCAL_ART_SIDECAR_NAMES)
+    for name in os.listdir(directory):
+        stem, extension = os.path.splitext(name.lower())
+        if extension not in SIDECAR_EXTENSIONS or stem not in LOCAL_ART_SIDECAR_NAMES:
+            continue
+        rank = LOCAL_ART_SIDECAR_NAMES.index(stem)
+        if rank < best_rank:
+            best, best_rank = os.path.join(directory, name), rank
+    return best
+
+def sidecar_path(directory):
+    """Path of the cover image in a directory, or None, from the directory index."""
+    try:
+        mtime = os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+
+    with directory_lock:
+        entry = directory_index.get(directory)
+    if entry and entry[0] == mtime:
+        metrics.increment('local_art.index_hits')
+        return entry[1]
+
+    try:
+        found = _scan_directory(directory)
+    except OSError as e:
+        log.debug("Could not list %s: %s", directory, e)
+        return None
+    metrics.increment('local_art.index_scans')
+
+    with directory_lock:
+        if directory not in directory_index and len(directory_index) >= LOCAL_ART_INDEX_SIZE_LIMIT:
+            random_key = random.choice(list(directory_index.keys()))
+            del directory_index[random_key]
+        directory_index[directory] = (mtime, found)
+    return found
+
+def find_cover(path):
+    """Find a local track's artwork.
+
+    Args:
+        path: Path of the audio file
+
+    Returns:
+        Tuple of (image bytes, description of where they came from), or (None, None)
+    """
+    if not os.path.isfile(path):
+        return None, None
+
+    data = embedded_picture(path)
+    if data:
+        metrics.increment('local_art.embedded')
+        return data, f"embedded:{path}"
+
+    sidecar = sidecar_path(os.path.dirname(path))
+    if sidecar:
+        try:
+            with open(sidecar, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            log.debug("Could not read %s: %s", sidecar, e)
+            return None, None
+        if data:
+            metrics.increment('local_art.sidecar')
+            return data, sidecar
+
+    return None, None
@@ -0,0 +1,128 @@
+"""Small leveled logger with per-module levels, rate-limited repeats and an in-memory ring buffer.
+
+Messages use %-style arguments that are only formatted when a record is
+printed or read back, so disabled log calls cost a level comparison:
+
+    log = get_logger(__name__)
+    log.debug("Resized image to %s", target_size)
+"""
+import sys
+import time
+import threading
+from collections import deque
+from config import LOG_LEVEL, LOG_MODULE_LEVELS, LOG_BUFFER_LEVEL, LOG_BUFFER_SIZE, LOG_RATE_LIMIT
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+
+# (time, level, logger name, message, args), formatted on read
+records = deque(maxlen=LOG_BUFFER_SIZE)
+buffer_level = LEVELS[LOG_BUFFER_LEVEL]
+
+_loggers = {}
+_lock = threading.Lock()
+
+def level_value(level):
+    """Numeric level for a level name or number."""
+    if isinstance(level, int):
+        return level
+    return LEVELS[level.upper()]
+
+def format_message(message, args):
+    """Apply %-style arguments, without failing on a bad format string."""
+    if not args:
+        return message
+    try:
+        return message % args
+    except (TypeError, ValueError):
+        return f"{message} {args}"
+
+class Logger:
+    """Named logger. Output level comes from LOG_MODULE_LEVELS or LOG_LEVEL."""
+
+    def __init__(self, name):
+        self.name = name
+        self.level = level_value(LOG_MODULE_LEVELS.get(name, LOG_LEVEL))
+        # Lowest level that does anything, checked before any other work
+        self.threshold = min(self.level, buffer_level)
+        # message template -> (last printed time, suppressed count)
+        self.repeats = {}
+
+    def set_level(self, level):
+        self.level = level_value(level)
+        self.threshold = min(self.level, buffer_level)
+
+    def enabled(self, level):
+        """Check whether a level would be printed, for guarding costly arguments."""
+        return level >= self.level
+
+    def log(self, level, message, *args):
+        if level < self.threshold:
+            return
+        now = time.time()
+        if level >= buffer_level:
+            records.append((now, level, self.name, message, args))
+        if level >= self.level:
+            self._write(now, level, message, args)
+
+    def _write(self, now, level, message, args):
+        with _lock:
+            last, suppressed = self.repeats.get(message, (0, 0))
+            if now - last < LOG_RATE_LIMIT:
+                self.repeats[message] = (last, suppressed + 1)
+                return
+            self.repeats[message] = (now, 0)
+
+        text = format_message(message, args)
+        if suppressed:
+            text = f"{text} ({suppressed} similar suppressed)"
+        stream = sys.stderr if level >= WARNING else sys.stdout
+        print(f"{LEVEL_NAMES[level]:<7} {self.name}: {text}", file=stream)
+
+    def debug(self, message, *args):
+        self.log(DEBUG, message, *args)
+
+    def info(self, message, *args):
+        self.log(INFO, message, *args)
+
+    def warning(self, message, *args):
+        self.log(WARNING, message, *args)
+
+    def error(self, message, *args):
+        self.log(ERROR, message, *args)
+
+def get_logger(name):
+    """Get the shared logger for a module name."""
+    logger = _loggers.get(name)
+    if logger is None:
+        with _lock:
+            logger = _loggers.setdefault(name, Logger(name))
+    return logger
+
+def get_records(level=None, name=None, limit=None):
+    """Read buffered records, oldest first, formatted as dicts.
+
+    Args:
+        level: Minimum level name or number
+        name: Only records from loggers whose name starts with this
+        limit: Return at most this many of the newest records
+    """
+    minimum = level_value(level) if level else 0
+    result = [
+        {
+            'time': timestamp,
+            'level': LEVEL_NAMES[record_level],
+            'logger': logger_name,
+            'message': format_message(message, args),
+        }
+        for timestamp, record_level, logger_name, message, args in list(records)
+        if record_level >= minimum and (not name or logger_name.startswith(name))
+    ]
+    if limit:
+        result = result[-limit:]
+    return result
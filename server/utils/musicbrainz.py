@@ -2,9 +2,11 @@
 import re
 import time
 import random
-import requests
 from config import MUSICBRAINZ_CACHE_SIZE_LIMIT
 from utils.image_utils import resize_image
+from utils.log import get_logger
+
+log = get_logger(__name__)
 
 musicbrainz_cache = {}
 latest_artwork_time = 0
@@ -19,13 +21,14 @@ def sanitize_for_musicbrainz(text):
 def fetch_from_musicbrainz(artist, album, title):
     """Search MusicBrainz and CoverArtArchive for album artwork."""
     global musicbrainz_cache, latest_artwork_time
+    import requests
     cache_key = f"{artist}|{album}"
     
     if cache_key in musicbrainz_cache:
-        print(f"Using cached artwork for {artist} - {album}")
+        log.debug("Using cached artwork for %s - %s", artist, album)
         return musicbrainz_cache[cache_key]
     
-    print(f"Searching MusicBrainz for {artist} - {album}")
+    log.debug("Searching MusicBrainz for %s - %s", artist, album)
     
     headers = {
         'User-Agent': 'PrestoDeck-MPRIS (https://github.com/twij/PrestoDeck)'
@@ -60,11 +63,11 @@ def fetch_from_musicbrainz(artist, album, title):
                                 musicbrainz_cache[cache_key] = art_data
 
                                 latest_artwork_time = time.time()
-                                print("Setting latest_artwork_time after finding fresh art")
+                                log.debug("Setting latest_artwork_time after finding fresh art")
                                 
                             return art_data
         except Exception as e:
-            print(f"Error fetching from MusicBrainz: {e}")
+            log.warning("Error fetching from MusicBrainz: %s", e)
     
     # Try artist only search as a fallback - maybe remove this as it's usually wrong
     if artist and not album:
@@ -101,11 +104,11 @@ def fetch_from_musicbrainz(artist, album, title):
                                                 musicbrainz_cache[cache_key] = art_data
 
                                                 latest_artwork_time = time.time()
-                                                print("Setting latest_artwork_time after finding fresh art")
+                                                log.debug("Setting latest_artwork_time after finding fresh art")
                                                 
                                             return art_data
         except Exception as e:
-            print(f"Error fetching artist art from MusicBrainz: {e}")
+            log.warning("Error fetching artist art from MusicBrainz: %s", e)
     
     return None
 
@@ -0,0 +1,100 @@
+"""Ambient LED palette computed from cover art."""
+import random
+import hashlib
+from io import BytesIO
+from config import LED_REGIONS, PALETTE_CACHE_SIZE_LIMIT
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Each cover's palette is computed once, keyed by a hash of the JPEG bytes
+palette_cache = {}
+
+# Pixels darker than this are ignored for the dominant colour, so letterbox
+# borders don't win
+DARK_THRESHOLD = 24
+
+def _region_bounds(width, height):
+    for x0, y0, x1, y1 in LED_REGIONS:
+        left, top = int(x0 * width), int(y0 * height)
+        right, bottom = max(left + 1, int(x1 * width)), max(top + 1, int(y1 * height))
+        yield left, top, right, bottom
+
+def _palette_numpy(img, np):
+    pixels = np.asarray(img, dtype=np.uint32)
+    height, width, _ = pixels.shape
+
+    # Summed-area table: every region mean is then four lookups
+    table = np.zeros((height + 1, width + 1, 3), dtype=np.uint64)
+    table[1:, 1:] = pixels.cumsum(axis=0).cumsum(axis=1)
+
+    bounds = np.array(list(_region_bounds(width, height)))
+    left, top, right, bottom = bounds.T
+    sums = table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+    areas = ((right - left) * (bottom - top)).reshape(-1, 1)
+    leds = (sums // areas.astype(np.uint64)).astype(int).tolist()
+
+    # Dominant colour: most populated 4-bit-per-channel bucket, averaged
+    flat = pixels.reshape(-1, 3)
+    flat = flat[flat.max(axis=1) > DARK_THRESHOLD]
+    if len(flat) == 0:
+        return leds, [0, 0, 0]
+    buckets = ((flat >> 4) * np.array([256, 16, 1], dtype=np.uint32)).sum(axis=1)
+    top_bucket = np.bincount(buckets).argmax()
+    dominant = flat[buckets == top_bucket].mean(axis=0).astype(int).tolist()
+    return leds, dominant
+
+def _palette_pillow(img):
+    from PIL import Image
+    leds = [list(img.crop(box).resize((1, 1), Image.BOX).getpixel((0, 0))) for box in _region_bounds(*img.size)]
+    small = img.resize((64, 64), Image.BOX).quantize(colors=8)
+    colors = small.getpalette()
+    counts = sorted(small.getcolors(), reverse=True)
+    dominant = [0, 0, 0]
+    for _, index in counts:
+        rgb = colors[index * 3:index * 3 + 3]
+        if max(rgb) > DARK_THRESHOLD:
+            dominant = rgb
+            break
+    return leds, dominant
+
+def compute_palette(image_data):
+    """Compute LED edge colours and the dominant colour of a JPEG.
+
+    Args:
+        image_data: Resized artwork bytes
+
+    Returns:
+        Dict with 'leds' (one [r, g, b] per entry in LED_REGIONS) and
+        'dominant' ([r, g, b]), or None on failure
+    """
+    from PIL import Image
+    try:
+        img = Image.open(BytesIO(image_data)).convert('RGB')
+        try:
+            import numpy as np
+        except ImportError:
+            leds, dominant = _palette_pillow(img)
+        else:
+            leds, dominant = _palette_numpy(img, np)
+        return {'leds': leds, 'dominant': dominant}
+    except Exception as e:
+        log.warning("Error computing palette: %s", e)
+        return None
+
+def get_palette(image_data):
+    """Get the palette for artwork bytes, computing it only the first time they are seen."""
+    if not image_data:
+        return None
+
+    key = hashlib.md5(image_data).digest()
+    if key in palette_cache:
+        return palette_cache[key]
+
+    palette = compute_palette(image_data)
+    if palette:
+        if len(palette_cache) >= PALETTE_CACHE_SIZE_LIMIT:
+            random_key = random.choice(list(palette_cache.keys()))
+            del palette_cache[random_key]
+        palette_cache[key] = palette
+    return palette
@@ -0,0 +1,59 @@
+"""Tiny artwork preview sent inline with metadata.
+
+The cover is reduced to a PREVIEW_GRID_SIZE square grid of RGB565 pixels
+(big-endian, row-major, 512 bytes at 16x16). The Presto paints it as
+coloured blocks as soon as the metadata arrives, so a track change shows
+on screen before the full JPEG is downloaded and decoded.
+"""
+import struct
+import random
+import hashlib
+from io import BytesIO
+from config import PREVIEW_GRID_SIZE, PREVIEW_CACHE_SIZE_LIMIT
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Each cover's preview is computed once, keyed by a hash of the JPEG bytes
+preview_cache = {}
+
+def compute_preview(image_data, size=PREVIEW_GRID_SIZE):
+    """Reduce artwork to a size x size grid of RGB565 pixels.
+
+    Args:
+        image_data: Resized artwork bytes
+        size: Side of the grid
+
+    Returns:
+        Packed big-endian RGB565 bytes, or None on failure
+    """
+    from PIL import Image
+    try:
+        img = Image.open(BytesIO(image_data))
+        # Let the JPEG decoder skip most of the work for such a small target
+        img.draft('RGB', (size * 2, size * 2))
+        pixels = img.convert('RGB').resize((size, size), Image.BOX).getdata()
+        return struct.pack(
+            f'>{size * size}H',
+            *(((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3) for r, g, b in pixels)
+        )
+    except Exception as e:
+        log.warning("Error computing preview: %s", e)
+        return None
+
+def get_preview(image_data):
+    """Get the preview for artwork bytes, computing it only the first time they are seen."""
+    if not image_data:
+        return None
+
+    key = hashlib.md5(image_data).digest()
+    if key in preview_cache:
+        return preview_cache[key]
+
+    preview = compute_preview(image_data)
+    if preview:
+        if len(preview_cache) >= PREVIEW_CACHE_SIZE_LIMIT:
+            random_key = random.choice(list(preview_cache.keys()))
+            del preview_cache[random_key]
+        preview_cache[key] = preview
+    return preview
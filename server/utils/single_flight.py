@@ -0,0 +1,50 @@
+"""Single-flight execution: concurrent callers for the same key share one call."""
+import threading
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one in-flight execution."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        """Run fn for key, or wait for the call already in flight for it.
+
+        Args:
+            key: Hashable identity of the work
+            fn: Zero-argument callable doing the work
+
+        Returns:
+            Tuple of (result, shared) where shared is True if this caller
+            waited on another caller's execution
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
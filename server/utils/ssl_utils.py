@@ -46,6 +46,17 @@ def create_ssl_context():
         print("Using Flask's adhoc SSL context as fallback.")
         return 'adhoc'
 
+def cert_fingerprint():
+    """SHA-256 fingerprint of the server certificate, for pinning it on a peer, or None."""
+    import ssl
+    import hashlib
+    try:
+        with open(CERT_FILE) as f:
+            der = ssl.PEM_cert_to_DER_cert(f.read())
+    except (OSError, ValueError):
+        return None
+    return ':'.join(f"{b:02X}" for b in hashlib.sha256(der).digest())
+
 def get_server_ip():
     """Get the server's IP address."""
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
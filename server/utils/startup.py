@@ -0,0 +1,75 @@
+"""Startup phase timing and background warm-up for the MPRIS server."""
+import time
+import threading
+import importlib
+
+class StartupTimer:
+    """Records how long each startup phase takes and when the first requests are served."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases = []
+        self.first_requests = {}
+        self.lock = threading.Lock()
+
+    def elapsed_ms(self):
+        """Milliseconds since the server process started importing."""
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def phase(self, name):
+        """Context manager timing a named startup phase."""
+        return _Phase(self, name)
+
+    def mark_first_request(self, endpoint):
+        """Record the time the first successful response for an endpoint was produced."""
+        if endpoint in self.first_requests:
+            return
+        with self.lock:
+            if endpoint not in self.first_requests:
+                self.first_requests[endpoint] = round(self.elapsed_ms(), 1)
+                print(f"First /{endpoint} served {self.first_requests[endpoint]:.0f} ms after start")
+
+    def report(self):
+        """Get the recorded timings as a dict."""
+        with self.lock:
+            return {
+                'phases': [{'name': name, 'ms': round(ms, 1)} for name, ms in self.phases],
+                'first_requests': dict(self.first_requests),
+                'uptime_ms': round(self.elapsed_ms(), 1),
+            }
+
+    def print_report(self):
+        """Print phase timings to the console."""
+        for name, ms in self.phases:
+            print(f"  {name:<20} {ms:8.1f} ms")
+        print(f"  {'total':<20} {self.elapsed_ms():8.1f} ms")
+
+class _Phase:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        with self.timer.lock:
+            self.timer.phases.append((self.name, (time.perf_counter() - self.start) * 1000))
+        return False
+
+def warm_up_in_background(module_names):
+    """Import heavy modules in a background thread so the first request doesn't pay for them."""
+    def warm_up():
+        for name in module_names:
+            with startup_timer.phase(f"warm-up {name}"):
+                try:
+                    importlib.import_module(name)
+                except ImportError as e:
+                    print(f"Could not pre-import {name}: {e}")
+
+    thread = threading.Thread(target=warm_up, daemon=True)
+    thread.start()
+    return thread
+
+startup_timer = StartupTimer()
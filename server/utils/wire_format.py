@@ -0,0 +1,94 @@
+"""Compact binary encoding of player state for the Presto.
+
+Layout (big-endian):
+    u8   format version
+    u8   playback status (see STATUS_CODES)
+    u32  state version
+    u32  position in milliseconds
+    16s  artwork id (raw bytes of the art store digest, a truncated SHA-256; zeroes if unknown)
+    u8   field count
+    then per field: u16 byte length + UTF-8 bytes, in FIELD_ORDER, followed
+    by COMMAND_FIELDS when the state carries a last_command outcome
+    then optionally the LED palette:
+    u8   LED count, then count RGB triplets, then the dominant RGB triplet
+    then optionally the artwork preview, only after a palette:
+    u8   grid side, then side * side big-endian RGB565 pixels
+"""
+import math
+import base64
+import struct
+
+CONTENT_TYPE = 'application/vnd.prestodeck.state'
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('>BBII16sB')
+FIELD_LENGTH = struct.Struct('>H')
+
+FIELD_ORDER = ('id', 'title', 'artist', 'album', 'player')
+# Keys of the last_command outcome, sent as extra fields that older decoders skip
+COMMAND_FIELDS = ('id', 'command', 'status', 'error')
+
+STATUS_CODES = {
+    'Stopped': 0,
+    'Playing': 1,
+    'Paused': 2,
+}
+STATUS_UNKNOWN = 255
+
+MAX_FIELD_BYTES = 0xFFFF
+
+def wants_binary(request):
+    """Check whether a Flask request asked for the compact binary format."""
+    if request.args.get('format') == 'bin':
+        return True
+    return CONTENT_TYPE in request.headers.get('Accept', '')
+
+def encode_state(state, version=0, position=0, art_hash=None):
+    """Encode a state dict as a compact binary document.
+
+    Args:
+        state: Media info or playback state dict, optionally with last_command
+        version: State version from the state store
+        position: Playback position in milliseconds
+        art_hash: Hex art store digest of the artwork, as used for the artwork ETag
+
+    Returns:
+        Encoded bytes
+    """
+    digest = bytes.fromhex(art_hash) if art_hash else b'\x00' * 16
+    status = STATUS_CODES.get(state.get('playback_status'), STATUS_UNKNOWN)
+
+    values = [state.get(field) for field in FIELD_ORDER]
+    if state.get('last_command'):
+        values += [state['last_command'].get(key) for key in COMMAND_FIELDS]
+
+    parts = [HEADER.pack(
+        FORMAT_VERSION,
+        status,
+        version & 0xFFFFFFFF,
+        max(0, min(int(position), 0xFFFFFFFF)),
+        digest,
+        len(values)
+    )]
+    for value in values:
+        value = (value or '').encode('utf-8')
+        if len(value) > MAX_FIELD_BYTES:
+            # Cut on a character boundary so the device can still decode the field
+            value = value[:MAX_FIELD_BYTES].decode('utf-8', 'ignore').encode('utf-8')
+        parts.append(FIELD_LENGTH.pack(len(value)))
+        parts.append(value)
+
+    palette = state.get('palette')
+    preview = base64.b64decode(state['preview']) if state.get('preview') else None
+    if palette or preview:
+        # The preview needs a palette section in front of it, even an empty one
+        palette = palette or {'leds': [], 'dominant': [0, 0, 0]}
+        leds = palette['leds'][:255]
+        parts.append(bytes([len(leds)]))
+        parts.append(bytes(channel for rgb in leds + [palette['dominant']] for channel in rgb))
+
+    if preview:
+        parts.append(bytes([math.isqrt(len(preview) // 2)]))
+        parts.append(preview)
+
+    return b''.join(parts)
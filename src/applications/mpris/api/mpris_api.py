@@ -1,42 +1,72 @@
 """MPRIS API client for communicating with an MPRIS server."""
+import gc
 import time
+import machine
 import ubinascii
 from applications.mpris.network.client import CachingClient
+from applications.mpris.utils.wire_format import CONTENT_TYPE as BINARY_CONTENT_TYPE
+from applications.mpris.utils.log import get_logger
+
+log = get_logger("mpris_api")
 
 class MPRISApiClient:
     """API client for MPRIS-specific endpoints."""
     
-    def __init__(self, server_url, api_token=None, strict_privacy=True):
+    def __init__(self, server_url, api_token=None, strict_privacy=True, wire_format="binary", telemetry=True):
         """Initialize MPRIS API client.
         
         Args:
             server_url: MPRIS server URL
             api_token: Optional API token for authentication
             strict_privacy: Whether to enforce HTTPS
+            wire_format: "binary" for the compact binary state format, "delta"
+                for JSON deltas against the last known state version, or "json"
+            telemetry: Whether to report change-to-screen latency to the server
         """
         self.client = CachingClient(server_url, api_token, strict_privacy)
+        self.wire_format = wire_format
+        self.accept = BINARY_CONTENT_TYPE if wire_format == "binary" else None
+        self.state_cache = None
+        # Raw JPEG straight from the server's art store, no base64 to decode
+        self.art_endpoint = "artwork/raw"
         self.first_boot_completed = False
         self.last_track_id = None
+        self.last_command_state = None
+        # Only the atlas of the page on screen is kept: (atlas id, JPEG bytes)
+        self.atlas = None
+        self.telemetry = telemetry
+        # Sent with artwork requests so the server can pick an encoding this unit's link and decoder keep up with
+        self.client_id = ubinascii.hexlify(machine.unique_id()).decode()
+        self.art_report = {}
+        self.latency_samples = []
+        self.last_telemetry = time.time()
     
-    def get_current_media(self, force=False):
+    def get_current_media(self, force=False, on_preview=None):
         """Get current media info with separate art handling for memory efficiency.
         
         Args:
             force: Whether to force a fresh request
+            on_preview: Optional callable given the inline RGB565 preview of
+                new artwork before the full artwork is fetched
             
         Returns:
             Dict with current media information
         """
 
         if not self.first_boot_completed:
-            print("First boot detected - forcing fresh data")
+            log.info("First boot detected - forcing fresh data")
             self.first_boot_completed = True
             force = True
             self.client.etag_cache.clear()
         
         try:
             meta_endpoint = "current?include_art=false" 
-            result = self.client.make_request(meta_endpoint, force=force)
+            extra_headers = None
+            if self.wire_format == "delta" and self.state_cache:
+                extra_headers = {'X-Since-Version': str(self.state_cache['version'])}
+            result = self.client.make_request(meta_endpoint, force=force, accept=self.accept, extra_headers=extra_headers)
+            if self.wire_format == "delta":
+                result = self.apply_delta(meta_endpoint, result)
             
             if result and isinstance(result, dict) and 'error' not in result:
                 try:
@@ -47,59 +77,210 @@ class MPRISApiClient:
                         
                     if self.last_track_id and self.last_track_id != current_track_id:
                         if current_track_id and self.last_track_id:
-                            print(f"Track changed from {self.last_track_id} to {current_track_id}")
+                            log.debug("Track changed from %s to %s", self.last_track_id, current_track_id)
                             track_changed = True
-                            print("Clearing all ETags due to track change")
+                            log.debug("Clearing all ETags due to track change")
                             self.client.etag_cache.clear()
                             force = True
                     
                     if current_track_id:
                         self.last_track_id = current_track_id
                     
-                    art_endpoint = "artwork"
-                    print(f"Fetching artwork - force={force or track_changed}")
-                    art_result = self.client.make_request(art_endpoint, force=force or track_changed)
+                    art_endpoint = self.art_endpoint
+                    if self.artwork_is_current(result.get('art_hash') or result.get('art_id')):
+                        # Metadata already tells us the artwork is the one we hold
+                        _, result['art_data'] = self.client.binary_cache[art_endpoint]
+                        return result
+                    
+                    preview = result.get('preview')
+                    if preview and on_preview:
+                        if isinstance(preview, str):
+                            preview = ubinascii.a2b_base64(preview)
+                        on_preview(preview)
+                    
+                    log.debug("Fetching artwork - force=%s", force or track_changed)
+                    art_result = self.client.make_request(art_endpoint, force=force or track_changed,
+                                                          extra_headers=self.art_headers())
                     if art_result and isinstance(art_result, dict) and 'art_data' in art_result:
                         art_data = art_result.get('art_data')
                         
                         if art_data and isinstance(art_data, str) and not ('from_304_cache' in art_result):
                             try:
-                                print(f"Converting base64 string to binary data, length: {len(art_data)}")
+                                log.debug("Converting base64 string to binary data, length: %s", len(art_data))
                                 art_data = ubinascii.a2b_base64(art_data)
-                                print(f"Successfully decoded base64 data to {len(art_data)} bytes")
+                                log.debug("Successfully decoded base64 data to %s bytes", len(art_data))
                                 art_result['art_data'] = art_data
-                                self.client.binary_cache["artwork"] = (time.time(), art_data)
+                                self.client.binary_cache[art_endpoint] = (time.time(), art_data)
                             except Exception as e:
-                                print(f"Error decoding base64 data: {e}")
+                                log.warning("Error decoding base64 data: %s", e)
                                 import sys
                                 sys.print_exception(e)
                         
                         if art_data:
                             result['art_data'] = art_data
+                            timing = self.client.timings.get(art_endpoint)
+                            if timing and not art_result.get('from_304_cache'):
+                                self.art_report['X-Download-Ms'] = str(timing['fetch_ms'])
+                                self.art_report['X-Download-Bytes'] = str(len(art_data))
                             
                 except Exception as e:
-                    print(f"Error handling track change: {e}")
+                    log.warning("Error handling track change: %s", e)
                     import sys
                     sys.print_exception(e)
             
             return result
         except Exception as e:
-            print(f"Error fetching media info: {e}")
+            log.warning("Error fetching media info: %s", e)
             import sys
             sys.print_exception(e)
             return {"error": f"Failed to get media info: {e}"}
     
+    def art_headers(self):
+        """Headers reporting the last artwork's download and decode and the free heap."""
+        headers = {'X-Client-Id': self.client_id, 'X-Free-Heap': str(gc.mem_free())}
+        headers.update(self.art_report)
+        # Each measurement is reported once
+        self.art_report = {}
+        return headers
+    
+    def note_decode(self, decode_ms):
+        """Keep how long the last artwork took to decode, for the next artwork request."""
+        self.art_report['X-Decode-Ms'] = str(decode_ms)
+    
+    def take_timing(self):
+        """Get the timing of the last media fetch, if it brought a state version from the server.
+        
+        Returns:
+            Dict with version, source, age_ms and the fetch and server times
+            of the metadata and artwork requests combined, or None
+        """
+        meta = self.client.timings.pop("current?include_art=false", None)
+        art = self.client.timings.pop(self.art_endpoint, None)
+        if not meta or 'version' not in meta:
+            return None
+        
+        timing = dict(meta)
+        if art:
+            timing['fetch_ms'] += art['fetch_ms']
+            timing['server_ms'] += art['server_ms']
+        return timing
+    
+    def record_latency(self, timing, decode_ms, render_ms):
+        """Queue a latency sample for a version that is now on screen."""
+        if not self.telemetry:
+            return
+        sample = dict(timing)
+        sample['decode_ms'] = decode_ms
+        sample['render_ms'] = render_ms
+        self.latency_samples.append(sample)
+    
+    def flush_telemetry(self, interval=30, batch_size=8):
+        """Send queued latency samples once enough have piled up or enough time has passed."""
+        if not self.latency_samples:
+            return
+        if len(self.latency_samples) < batch_size and time.time() - self.last_telemetry < interval:
+            return
+        
+        samples, self.latency_samples = self.latency_samples, []
+        self.last_telemetry = time.time()
+        result = self.client.make_request("telemetry", "POST", data={"samples": samples}, force=True)
+        if isinstance(result, dict) and 'error' in result:
+            log.debug("Telemetry not sent: %s", result['error'])
+    
+    def apply_delta(self, endpoint, result):
+        """Merge a delta response into the cached state, refetching in full if the base doesn't match.
+        
+        Args:
+            endpoint: Endpoint the result came from
+            result: Response dict from the client
+            
+        Returns:
+            The full current state dict
+        """
+        if not isinstance(result, dict) or 'error' in result:
+            return result
+        
+        if result.get('from_304_cache') and self.state_cache:
+            merged = dict(self.state_cache)
+            merged['from_304_cache'] = True
+            return merged
+        
+        if result.get('delta'):
+            if not self.state_cache or self.state_cache.get('version') != result['base']:
+                log.debug("Delta base doesn't match cached state, fetching full state")
+                self.state_cache = None
+                # Drop the ETag too, a 304 would only hand back the unusable delta
+                self.client.etag_cache.delete(endpoint)
+                return self.apply_delta(endpoint, self.client.make_request(endpoint, force=True))
+            
+            merged = dict(self.state_cache)
+            merged.update(result['changed'])
+            for key in result['removed']:
+                merged.pop(key, None)
+            merged['version'] = result['version']
+            self.state_cache = merged
+            return dict(merged)
+        
+        if 'version' in result:
+            self.state_cache = dict(result)
+        return result
+    
+    def get_state(self, force=False):
+        """Get lightweight playback state (no artwork) including version and position."""
+        return self.client.make_request("state", force=force, accept=self.accept)
+    
+    def register_beacon(self, port):
+        """Ask the server to send UDP change notifications to this device.
+        
+        Returns:
+            Registration lifetime in seconds, or 0 if the server doesn't support beacons
+        """
+        result = self.client.make_request("beacon/register", "POST", data={"port": port}, force=True)
+        if isinstance(result, dict) and result.get('success'):
+            return result.get('ttl', 0)
+        return 0
+    
     def get_players(self, force=False):
         """Get available players with optional force refresh."""
         return self.client.make_request("players", force=force)
     
+    def get_tracklist(self, offset=0, limit=6, force=False):
+        """Get a page of the current player's tracklist, or its playlists.
+        
+        Returns:
+            Dict with the page's items, each with a tile rect in the page's atlas
+        """
+        return self.client.make_request(f"tracklist?offset={offset}&limit={limit}", force=force)
+    
+    def get_atlas(self, atlas_id):
+        """Get a tracklist sprite atlas as JPEG bytes, or None.
+        
+        Atlases are content-addressed, so one already held is never fetched again.
+        """
+        if self.atlas and self.atlas[0] == atlas_id:
+            return self.atlas[1]
+        
+        # Drop the old atlas before downloading the next one
+        self.atlas = None
+        result = self.client.make_request(f"tracklist/atlas/{atlas_id}", force=True)
+        if not isinstance(result, dict) or not result.get('art_data'):
+            return None
+        self.atlas = (atlas_id, result['art_data'])
+        return self.atlas[1]
+    
+    def goto_track(self, entry_id, source="tracklist"):
+        """Play a tracklist entry or activate a playlist."""
+        result = self.client.make_request("tracklist/goto", "POST", data={"id": entry_id, "source": source}, force=True)
+        self.client.last_check["current"] = 0
+        return isinstance(result, dict) and result.get('success', False)
+    
     def play(self):
         """Sends play command to server."""
         try:
             response = self.client.make_request('/play', 'POST')
             return response.status_code == 200
         except Exception as e:
-            print(f"Play command failed: {e}")
+            log.warning("Play command failed: %s", e)
             return False
 
     def pause(self):
@@ -108,35 +289,84 @@ class MPRISApiClient:
             response = self.client.make_request('/pause', 'POST')
             return response.status_code == 200
         except Exception as e:
-            print(f"Pause command failed: {e}")
+            log.warning("Pause command failed: %s", e)
+            return False
+
+    def _command_with_state(self, endpoint):
+        """Send a command and keep the post-command state the server returns.
+        
+        Returns:
+            True if the command succeeded
+        """
+        self.last_command_state = None
+        result = self.client.make_request(f"{endpoint}?wait=1", 'POST', force=True)
+        if not isinstance(result, dict):
             return False
+        self.last_command_state = result.get('state')
+        # A slow player gets the command later; its new state arrives like any other change
+        return result.get('success', False) or result.get('accepted', False)
 
     def play_pause(self):
         """Toggles play/pause state."""
         try:
-            result = self.client.make_request('/playpause', 'POST')
-            return result.get('success', False) if isinstance(result, dict) else False
+            return self._command_with_state('playpause')
         except Exception as e:
-            print(f"PlayPause toggle failed: {e}")
+            log.warning("PlayPause toggle failed: %s", e)
             return False
 
     def next(self):
         """Sends next track command to server."""
         try:
-            result = self.client.make_request('/next', 'POST')
-            return result.get('success', False) if isinstance(result, dict) else False
+            return self._command_with_state('next')
         except Exception as e:
-            print(f"Next track command failed: {e}")
+            log.warning("Next track command failed: %s", e)
             return False
 
     def previous(self):
         """Sends previous track command to server."""
         try:
-            result = self.client.make_request('/previous', 'POST')
-            return result.get('success', False) if isinstance(result, dict) else False
+            return self._command_with_state('previous')
         except Exception as e:
-            print(f"Previous track command failed: {e}")
+            log.warning("Previous track command failed: %s", e)
             return False
+
+    def artwork_is_current(self, art_hash):
+        """Check whether the artwork we hold matches the given art hash."""
+        etag = self.client.etag_cache.get(self.art_endpoint)
+        if not art_hash or not etag or self.art_endpoint not in self.client.binary_cache:
+            return False
+        return art_hash == etag.strip('"')
+    
+    def seek(self, offset_ms):
+        """Seek relative to the current position."""
+        return self.client.make_request("seek", "POST", data={"offset_ms": int(offset_ms)}, force=True)
+
+    def set_position(self, position_ms):
+        """Seek to an absolute position."""
+        return self.client.make_request("position", "POST", data={"position_ms": int(position_ms)}, force=True)
+
+    def change_volume(self, delta):
+        """Change the volume by a relative amount (-1.0 to 1.0)."""
+        return self.client.make_request("volume", "POST", data={"delta": delta}, force=True)
+
+    def batch(self, commands):
+        """Send several commands in one request.
+        
+        Args:
+            commands: List of command names or dicts, e.g.
+                [{"command": "select_player", "player_id": "..."}, "play"]
+        
+        Returns:
+            Server response with per-command results and the resulting state
+        """
+        commands = [{"command": c} if isinstance(c, str) else c for c in commands]
+        try:
+            result = self.client.make_request("batch", "POST", data={"commands": commands}, force=True)
+            self.client.last_check["current"] = 0
+            return result
+        except Exception as e:
+            log.warning("Batch command failed: %s", e)
+            return {"error": f"Batch command failed: {e}"}
     
     def select_player(self, player_id):
         """Send command to change the player."""
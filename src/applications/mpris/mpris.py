@@ -7,10 +7,16 @@ import secrets
 
 from base import BaseApp
 from applications.mpris.api.mpris_api import MPRISApiClient
+from applications.mpris.network.beacon import BeaconListener
 from applications.mpris.utils.state import State
 from applications.mpris.ui.controls import ControlsManager
 from applications.mpris.ui.track_info import TrackInfoDisplay
 from applications.mpris.ui.artwork import ArtworkDisplay
+from applications.mpris.ui.gestures import GestureTracker
+from applications.mpris.ui.tracklist import TracklistDisplay
+from applications.mpris.utils.log import get_logger
+
+log = get_logger("mpris")
 
 class MPRIS(BaseApp):
     """Main MPRIS app managing playback controls, track display, and UI interactions."""
@@ -40,6 +46,7 @@ class MPRIS(BaseApp):
             time.sleep(2)
 
         self.state = State()
+        self.palette = None
         
         self.clear(1)
         self.display_text("Connecting to MPRIS server", (35, self.height - 80), thickness=2)
@@ -50,6 +57,14 @@ class MPRIS(BaseApp):
         self.controls = ControlsManager(self)
         self.track_info = TrackInfoDisplay(self.display, self.colors)
         self.artwork = ArtworkDisplay(self.display, self.colors, app=self)
+        self.gestures = GestureTracker(self.mpris_client)
+        self.tracklist = TracklistDisplay(self.display, self.colors, self.mpris_client, self.height)
+        
+        self.beacon = BeaconListener(getattr(secrets, 'MPRIS_API_TOKEN', None), getattr(secrets, 'MPRIS_BEACON_PORT', 5005))
+        self.beacon_expires = 0
+        self.beacon_active = False
+        if not self.beacon.open():
+            self.beacon = None
     
     def display_text(self, text, position, color=65535, scale=1, thickness=None):
         """Helper to display text on the screen."""
@@ -82,7 +97,9 @@ class MPRIS(BaseApp):
             self.presto.update()
             time.sleep(2)
 
-        return MPRISApiClient(secrets.MPRIS_SERVER_URL, api_token, self.state.strict_privacy)
+        return MPRISApiClient(secrets.MPRIS_SERVER_URL, api_token, self.state.strict_privacy,
+                              wire_format=getattr(secrets, 'MPRIS_WIRE_FORMAT', "binary"),
+                              telemetry=getattr(secrets, 'MPRIS_TELEMETRY', True))
 
     def update(self):
         """Process touch events and update UI."""
@@ -96,76 +113,180 @@ class MPRIS(BaseApp):
         loop = asyncio.get_event_loop()
         loop.create_task(self.touch_handler_loop())
         loop.create_task(self.display_loop())
+        if self.beacon:
+            loop.create_task(self.beacon.run(self.on_beacon))
         loop.run_forever()
 
+    def on_beacon(self, beacon):
+        """Fetch as soon as the server reports a state change."""
+        log.debug("State change beacon: version %s", beacon['version'])
+        self.state.force_refresh = True
+
+    def renew_beacon(self):
+        """Register for change beacons, renewing before the registration expires.
+        
+        Returns:
+            True if beacons are active and polling can fall back to the long interval
+        """
+        if not self.beacon:
+            return False
+        
+        now = time.time()
+        if now >= self.beacon_expires:
+            ttl = self.mpris_client.register_beacon(self.beacon.port)
+            # Retry registration at the normal poll pace if the server doesn't support it
+            self.beacon_expires = now + (ttl // 2 if ttl else 60)
+            self.beacon_active = bool(ttl)
+        return self.beacon_active
+
     async def touch_handler_loop(self):
         """Handles touch input events and button presses."""
         while not self.state.exit:
             self.touch.poll()
 
-            button_pressed = self.controls.handle_touch(self.state)
-            
-            if not button_pressed and self.touch.state:
-                self.state.show_controls = not self.state.show_controls
-                print(f"Controls toggled to {self.state.show_controls}")
-                self.state.force_refresh = True
-            
-            while self.touch.state:
-                self.touch.poll()
+            if self.touch.state:
+                # Follow the touch to release so swipes can seek or change volume;
+                # anything that didn't move is dispatched as a tap
+                dragged = await self.gestures.track(self.touch)
+                
+                if self.state.show_tracklist:
+                    # The tracklist covers the screen and takes every tap
+                    if not dragged:
+                        self.tracklist.handle_tap(self.state, self.gestures.start_x, self.gestures.start_y)
+                elif dragged:
+                    self.state.force_refresh = True
+                else:
+                    button_pressed = self.controls.handle_tap(self.state, self.gestures.start_x, self.gestures.start_y)
+                    
+                    if not button_pressed:
+                        self.state.show_controls = not self.state.show_controls
+                        log.debug("Controls toggled to %s", self.state.show_controls)
+                        self.state.force_refresh = True
 
             await asyncio.sleep_ms(1)
 
+    def apply_palette(self, palette):
+        """Drive the LEDs from the server-computed palette instead of auto-ambient sampling."""
+        if palette == self.palette:
+            return
+        self.palette = palette
+        if self.state.toggle_leds:
+            self.toggle_leds(True)
+
+    def toggle_leds(self, value):
+        """Turn the ambient LEDs on or off, using the cover palette when we have one."""
+        if value and self.palette:
+            self.presto.auto_ambient_leds(False)
+            for i, (r, g, b) in enumerate(self.palette['leds']):
+                self.presto.set_led_rgb(i, r, g, b)
+        else:
+            super().toggle_leds(value)
+
+    def show_preview(self, preview):
+        """Put the artwork preview on screen while the full artwork downloads."""
+        self.artwork.show_preview(preview)
+        self.presto.update()
+
+    def apply_command_state(self):
+        """Update from the state returned with a command, fetching only if the artwork changed."""
+        command_state = self.mpris_client.last_command_state
+        
+        if not command_state:
+            self.state.force_refresh = True
+            self.state.latest_fetch = 0
+            return
+        
+        self.state.track = command_state
+        self.state.is_playing = command_state.get('playing', False)
+        
+        if self.mpris_client.artwork_is_current(command_state.get('art_hash')):
+            # Nothing else to fetch, restart the poll interval from now
+            self.state.latest_fetch = time.time()
+        else:
+            self.state.force_refresh = True
+            self.state.latest_fetch = 0
+
     def update_ui(self):
         """Update the UI based on current state."""
         self.display.set_layer(1)
         self.clear(1)
         
-        if self.state.show_controls:
-            print("Drawing controls")
+        if self.state.show_tracklist:
+            self.tracklist.draw(self.state)
+        elif self.state.show_controls:
+            log.debug("Drawing controls")
             self.controls.draw_controls(self.state)
             self.track_info.write_track(self.state.track, self.state.show_controls)
         
-        print("Updating display")
+        log.debug("Updating display")
         self.presto.update()
 
     async def display_loop(self):
         """Periodically updates the display with the latest track info and controls."""
         INTERVAL = 5
+        # With change beacons we only poll as a safety net
+        BEACON_INTERVAL = 60
         
         prev_state = None
         first_run = True
+        reported_version = None
         
         while not self.state.exit:
             force_refresh = first_run or self.state.force_refresh
             
             if force_refresh:
-                print(f"Forcing refresh - reason: {'first run' if first_run else 'manual request'}")
+                log.debug("Forcing refresh - reason: %s", 'first run' if first_run else 'manual request')
             
             current_time = time.time()
-            if force_refresh or not self.state.latest_fetch or current_time - self.state.latest_fetch > INTERVAL:
+            interval = BEACON_INTERVAL if self.renew_beacon() else INTERVAL
+            if force_refresh or not self.state.latest_fetch or current_time - self.state.latest_fetch > interval:
                 self.state.latest_fetch = current_time
                 self.state.force_refresh = False
                 
                 try:
-                    media_info = self.mpris_client.get_current_media(force=force_refresh)
+                    media_info = self.mpris_client.get_current_media(force=force_refresh, on_preview=self.show_preview)
+                    timing = self.mpris_client.take_timing()
+                    if timing and timing['version'] == reported_version:
+                        timing = None
                     
                     if media_info and isinstance(media_info, dict):
                         if 'track' in media_info:
                             self.state.track = media_info['track']
+                        elif 'title' in media_info:
+                            self.state.track = media_info
                             
-                        if 'playback_status' in media_info:
+                        if 'playing' in media_info:
+                            self.state.is_playing = media_info['playing']
+                        elif 'playback_status' in media_info:
                             self.state.is_playing = media_info['playback_status'] == 'playing'
                         
+                        if media_info.get('palette'):
+                            self.apply_palette(media_info['palette'])
+                        
+                        decode_started = time.ticks_ms()
+                        artwork_updated = False
                         if 'art_data' in media_info and media_info['art_data']:
                             artwork_updated = self.artwork.show_artwork(
                                 media_info['art_data'], 
                                 force=first_run
                             )
-                            if artwork_updated:
-                                self.presto.update()
+                        render_started = time.ticks_ms()
+                        if artwork_updated:
+                            self.mpris_client.note_decode(time.ticks_diff(render_started, decode_started))
+                        if artwork_updated or timing:
+                            self.presto.update()
+                        
+                        if timing:
+                            # This version is now on screen
+                            self.mpris_client.record_latency(
+                                timing,
+                                time.ticks_diff(render_started, decode_started),
+                                time.ticks_diff(time.ticks_ms(), render_started)
+                            )
+                            reported_version = timing['version']
                     
                 except Exception as e:
-                    print(f"Error fetching media info: {e}")
+                    log.warning("Error fetching media info: %s", e)
                     import sys
                     sys.print_exception(e)
                     self.clear(1)
@@ -176,7 +297,13 @@ class MPRIS(BaseApp):
                     
                 if first_run:
                     self.state.show_controls = False
-                    print("First run - controls hidden by default")
+                    log.debug("First run - controls hidden by default")
+                
+                self.mpris_client.flush_telemetry()
+                
+                # Fetches are where almost all of the garbage comes from, so
+                # only collect after one instead of on every 200 ms tick
+                gc.collect()
                     
             if first_run or prev_state is None or prev_state != self.state:
                 self.update_ui()
@@ -185,9 +312,8 @@ class MPRIS(BaseApp):
                 
             if first_run:
                 first_run = False
-                print("First run completed")
+                log.info("First run completed")
                 
-            gc.collect()
             await asyncio.sleep_ms(200)
 
 def launch():
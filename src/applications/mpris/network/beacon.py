@@ -0,0 +1,102 @@
+"""UDP change-notification listener for the MPRIS application."""
+import usocket as socket
+import uhashlib as hashlib
+import ubinascii
+import uasyncio as asyncio
+from applications.mpris.utils.log import get_logger
+
+log = get_logger("beacon")
+
+MAGIC = b"PDB1"
+MAC_SIZE = 16
+HEADER_SIZE = 25
+
+def hmac_sha256(key, msg):
+    """HMAC-SHA256, since MicroPython has no hmac module."""
+    if len(key) > 64:
+        key = hashlib.sha256(key).digest()
+    key = key + b"\x00" * (64 - len(key))
+    inner = hashlib.sha256(bytes(b ^ 0x36 for b in key) + msg).digest()
+    return hashlib.sha256(bytes(b ^ 0x5C for b in key) + inner).digest()
+
+class BeaconListener:
+    """Listens for signed state-change beacons from the MPRIS server."""
+
+    POLL_MS = 100
+
+    def __init__(self, api_token, port=5005):
+        """Initialize the beacon listener.
+
+        Args:
+            api_token: API token the server signs beacons with
+            port: Local UDP port to listen on
+        """
+        self.key = (api_token or "").encode()
+        self.port = port
+        self.sock = None
+        self.last_version = 0
+        self.last_player = None
+        self.received = 0
+
+    def open(self):
+        """Bind the UDP socket. Returns True on success."""
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.bind(("0.0.0.0", self.port))
+            self.sock.setblocking(False)
+            return True
+        except OSError as e:
+            log.warning("Could not open beacon socket on port %s: %s", self.port, e)
+            self.sock = None
+            return False
+
+    def parse(self, datagram):
+        """Verify and decode a beacon.
+
+        Returns:
+            Dict with version, art_hash and player, or None if invalid
+        """
+        if len(datagram) < HEADER_SIZE + MAC_SIZE or datagram[:4] != MAGIC:
+            return None
+
+        body, mac = datagram[:-MAC_SIZE], datagram[-MAC_SIZE:]
+        if hmac_sha256(self.key, body)[:MAC_SIZE] != mac:
+            log.debug("Ignoring beacon with bad signature")
+            return None
+
+        version = (body[4] << 24) | (body[5] << 16) | (body[6] << 8) | body[7]
+        digest = body[8:24]
+        player_length = body[24]
+        return {
+            "version": version,
+            "art_hash": ubinascii.hexlify(digest).decode() if digest != b"\x00" * 16 else None,
+            "player": body[HEADER_SIZE:HEADER_SIZE + player_length].decode(),
+        }
+
+    async def run(self, on_change):
+        """Receive beacons until the socket is closed, calling on_change for newer versions.
+
+        Args:
+            on_change: Callback taking the decoded beacon dict
+        """
+        while self.sock:
+            try:
+                datagram, _ = self.sock.recvfrom(128)
+            except OSError:
+                await asyncio.sleep_ms(self.POLL_MS)
+                continue
+
+            beacon = self.parse(datagram)
+            # Versions only grow, so older or repeated beacons for the same player are replays
+            if beacon and (beacon["version"] > self.last_version or beacon["player"] != self.last_player):
+                self.last_version = beacon["version"]
+                self.last_player = beacon["player"]
+                self.received += 1
+                on_change(beacon)
+            await asyncio.sleep_ms(0)
+
+    def close(self):
+        """Close the UDP socket."""
+        if self.sock:
+            self.sock.close()
+            self.sock = None
@@ -4,6 +4,10 @@ import ujson as json
 import time
 from applications.mpris.network.etag_cache import ETagCache
 from applications.mpris.network.ssl_handler import SSLHandler
+from applications.mpris.utils.wire_format import CONTENT_TYPE as BINARY_CONTENT_TYPE, decode_state
+from applications.mpris.utils.log import get_logger
+
+log = get_logger("client")
 
 class CachingClient:
     """HTTP client with ETag caching and error recovery."""
@@ -26,11 +30,14 @@ class CachingClient:
         self.check_intervals = {
             "default": 5,
             "current": 5,
-            "artwork": 5
+            "artwork": 5,
+            "artwork/raw": 5
         }
         self.last_check = {}
+        # endpoint -> timing of its latest network response, see note_timing
+        self.timings = {}
     
-    def make_request(self, endpoint, method="GET", data=None, force=False):
+    def make_request(self, endpoint, method="GET", data=None, force=False, accept=None, extra_headers=None):
         """Make request to the server with caching and error handling.
         
         Args:
@@ -38,6 +45,8 @@ class CachingClient:
             method: HTTP method (GET, POST)
             data: Optional data for POST requests
             force: Whether to force a fresh request
+            accept: Optional Accept header, e.g. the binary state content type
+            extra_headers: Optional dict of additional request headers
             
         Returns:
             API response data or cached response
@@ -50,7 +59,7 @@ class CachingClient:
             if current_time - self.last_check[endpoint] < interval:
                 cached = self.response_cache.get(endpoint)
                 if cached:
-                    print(f"Using cached response for {endpoint} (within interval)")
+                    log.debug("Using cached response for %s (within interval)", endpoint)
                     return cached
         
         self.last_check[endpoint] = current_time
@@ -58,14 +67,19 @@ class CachingClient:
         headers = {}
         if self.api_token:
             headers['Authorization'] = f'Bearer {self.api_token}'
+        if accept:
+            headers['Accept'] = accept
+        if extra_headers:
+            headers.update(extra_headers)
             
         etag = self.etag_cache.get(endpoint)
         if etag:
             headers['If-None-Match'] = etag
-            print(f"Sending If-None-Match: {etag}")
+            log.debug("Sending If-None-Match: %s", etag)
         else:
-            print(f"No ETag available for {endpoint}")
+            log.debug("No ETag available for %s", endpoint)
         
+        started = time.ticks_ms()
         try:
             if method == "GET":
                 response = requests.get(url, headers=headers)
@@ -75,12 +89,13 @@ class CachingClient:
             self.ssl_handler.reset_failure_count(endpoint)
             
             if response.status_code == 401:
-                print("Authentication failed - check your API token")
+                log.error("Authentication failed - check your API token")
                 response.close()
                 return {"error": "Authentication failed"}
             
             if response.status_code == 304:
-                print(f"304 Not Modified for {endpoint} - using cached response")
+                log.debug("304 Not Modified for %s - using cached response", endpoint)
+                self.note_timing(endpoint, response, started)
                 if endpoint in self.response_cache:
                     result = {}
                     for key, value in self.response_cache[endpoint].items():
@@ -88,7 +103,7 @@ class CachingClient:
                         
                     result['from_304_cache'] = True
                     
-                    if endpoint == "artwork" and 'art_data' in result:
+                    if endpoint.startswith("artwork") and 'art_data' in result:
                         result['art_from_304_cache'] = True
                         if endpoint in self.binary_cache:
                             _, cached_binary = self.binary_cache[endpoint]
@@ -103,9 +118,23 @@ class CachingClient:
             
             content_type = response.headers.get('Content-Type', '')
             
-            if 'application/json' in content_type:
+            if content_type.startswith(BINARY_CONTENT_TYPE):
+                try:
+                    result = decode_state(response.content)
+                    self.note_timing(endpoint, response, started)
+                    self.response_cache[endpoint] = result.copy()
+                    
+                    if 'ETag' in response.headers:
+                        self.etag_cache.set(endpoint, response.headers['ETag'])
+                    
+                    return result
+                except Exception as decode_error:
+                    log.warning("Error decoding binary state: %s", decode_error)
+                    return {"error": f"Failed to decode state: {decode_error}"}
+            elif 'application/json' in content_type:
                 try:
                     result = response.json()
+                    self.note_timing(endpoint, response, started)
                     self.response_cache[endpoint] = result.copy()
                     
                     if 'ETag' in response.headers:
@@ -113,29 +142,31 @@ class CachingClient:
                     
                     return result
                 except Exception as json_error:
-                    print(f"Error parsing JSON: {json_error}")
+                    log.warning("Error parsing JSON: %s", json_error)
                     return {"error": f"Failed to parse response: {json_error}"}
-            elif endpoint == "artwork":
+            elif endpoint.startswith("artwork") or content_type.startswith("image/"):
                 try:
                     raw_data = response.content
-                    
-                    if 'ETag' in response.headers:
-                        self.etag_cache.set(endpoint, response.headers['ETag'])
+                    self.note_timing(endpoint, response, started)
                     
                     result = {
                         "art_data": raw_data,
                         "content_type": content_type
                     }
                     
-                    self.binary_cache[endpoint] = (time.time(), raw_data)
-                    self.response_cache[endpoint] = result.copy()
+                    # Other images, like tracklist atlases, are immutable and kept by their caller
+                    if endpoint.startswith("artwork"):
+                        if 'ETag' in response.headers:
+                            self.etag_cache.set(endpoint, response.headers['ETag'])
+                        self.binary_cache[endpoint] = (time.time(), raw_data)
+                        self.response_cache[endpoint] = result.copy()
                     
                     return result
                 except Exception as bin_error:
-                    print(f"Error handling binary data: {bin_error}")
+                    log.warning("Error handling binary data: %s", bin_error)
                     return {"error": f"Failed to process binary data: {bin_error}"}
             else:
-                print(f"Received non-JSON response with Content-Type: {content_type}")
+                log.warning("Received non-JSON response with Content-Type: %s", content_type)
                 return {"error": "Unexpected Content-Type"}
                 
         except OSError as e:
@@ -144,18 +175,39 @@ class CachingClient:
             return {"error": error_info["error"]}
         
         except Exception as e:
-            print(f"Request error: {e}")
+            log.warning("Request error: %s", e)
             
             self.ssl_handler.consecutive_failures[endpoint] = self.ssl_handler.consecutive_failures.get(endpoint, 0) + 1
             failure_count = self.ssl_handler.consecutive_failures[endpoint]
             backoff = min(5 * (2 ** failure_count), 120)
             self.check_intervals[endpoint] = backoff
             
-            print(f"Retrying in {backoff}s")
+            log.info("Retrying in %ss", backoff)
             return {"error": f"Request failed: {e}"}
         finally:
             if 'response' in locals():
                 try:
                     response.close()
                 except:
-                    pass
\ No newline at end of file
+                    pass
+
+    def note_timing(self, endpoint, response, started):
+        """Keep how long a request took and what the server reported about it.
+        
+        Args:
+            endpoint: API endpoint that was requested
+            response: Response with its body already read
+            started: time.ticks_ms() before the request was sent
+        """
+        timing = {"fetch_ms": time.ticks_diff(time.ticks_ms(), started), "server_ms": 0}
+        server_timing = response.headers.get('Server-Timing', '')
+        if 'dur=' in server_timing:
+            try:
+                timing["server_ms"] = float(server_timing.split('dur=')[1].split(',')[0])
+            except ValueError:
+                pass
+        if 'X-State-Version' in response.headers:
+            timing["version"] = int(response.headers['X-State-Version'])
+            timing["age_ms"] = int(response.headers.get('X-State-Age', 0))
+            timing["source"] = response.headers.get('X-State-Source', 'unknown')
+        self.timings[endpoint] = timing
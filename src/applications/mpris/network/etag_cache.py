@@ -1,5 +1,8 @@
 """ETag caching for efficient network requests."""
 import os
+from applications.mpris.utils.log import get_logger
+
+log = get_logger("etag_cache")
 
 class ETagCache:
     """Handles loading, saving, and managing HTTP ETags."""
@@ -19,7 +22,7 @@ class ETagCache:
         if etag:
             self.etags[endpoint] = etag
             self.save()
-            print(f"Received new ETag: {etag} for {endpoint}")
+            log.debug("Received new ETag: %s for %s", etag, endpoint)
     
     def delete(self, endpoint):
         """Remove ETag for an endpoint."""
@@ -36,7 +39,7 @@ class ETagCache:
         """Save ETags to persistent storage with error handling - can remove now?"""
         try:
             if not self.etags or not isinstance(self.etags, dict):
-                print("No valid ETags to save")
+                log.debug("No valid ETags to save")
                 return
                 
             potential_paths = [
@@ -54,16 +57,16 @@ class ETagCache:
                             f.write(f"{endpoint}:{etag}\n")
                     saved = True
                     self.etag_path = path
-                    print(f"Saved {len(self.etags)} ETags to {path}")
+                    log.debug("Saved %s ETags to %s", len(self.etags), path)
                     break
                 except OSError as e:
-                    print(f"Could not save to {path}: {e}")
+                    log.warning("Could not save to %s: %s", path, e)
                     continue
             
             if not saved:
-                print("Failed to save ETags to any location")
+                log.warning("Failed to save ETags to any location")
         except Exception as e:
-            print(f"Failed to save ETags: {e}")
+            log.warning("Failed to save ETags: %s", e)
     
     def load(self):
         """Load ETags from storage."""
@@ -77,10 +80,10 @@ class ETagCache:
                         if ':' in line:
                             endpoint, etag = line.split(':', 1)
                             self.etags[endpoint] = etag
-                print(f"Loaded {len(self.etags)} ETags from {self.etag_path}")
+                log.info("Loaded %s ETags from %s", len(self.etags), self.etag_path)
                 return
             except Exception as e:
-                print(f"Could not load from previous path {self.etag_path}: {e}")
+                log.warning("Could not load from previous path %s: %s", self.etag_path, e)
         
         potential_paths = [
             "etags.txt",
@@ -98,11 +101,11 @@ class ETagCache:
                             endpoint, etag = line.split(':', 1)
                             self.etags[endpoint] = etag
                 self.etag_path = path
-                print(f"Loaded {len(self.etags)} ETags from {path}")
+                log.info("Loaded %s ETags from %s", len(self.etags), path)
                 return
             except OSError:
                 continue
             except Exception as e:
-                print(f"Error loading from {path}: {e}")
+                log.warning("Error loading from %s: %s", path, e)
         
-        print("No saved ETags found in any location")
\ No newline at end of file
+        log.info("No saved ETags found in any location")
@@ -1,5 +1,8 @@
 """Artwork display handling for the MPRIS application."""
 from applications.mpris.utils.image_decoder import ImageHandler
+from applications.mpris.utils.log import get_logger
+
+log = get_logger("artwork")
 
 class ArtworkDisplay:
     """Manages display of album artwork."""
@@ -36,7 +39,7 @@ class ArtworkDisplay:
             return False
             
         if not force and self.current_art_data is art_data:
-            print("Skipping artwork update - no change detected")
+            log.debug("Skipping artwork update - no change detected")
             return False
             
         self.display.set_layer(0)
@@ -50,6 +53,30 @@ class ArtworkDisplay:
             self._show_placeholder()
             return False
     
+    def show_preview(self, preview):
+        """Paint the server's tiny RGB565 preview as coloured blocks until the artwork decodes.
+        
+        Args:
+            preview: Big-endian RGB565 pixels of a square grid, row-major
+        """
+        side = int((len(preview) // 2) ** 0.5)
+        if not side:
+            return
+        block = 480 // side
+        
+        self.display.set_layer(0)
+        for row in range(side):
+            for col in range(side):
+                i = (row * side + col) * 2
+                value = (preview[i] << 8) | preview[i + 1]
+                self.display.set_pen(self.display.create_pen(
+                    (value >> 8) & 0xF8, (value >> 3) & 0xFC, (value << 3) & 0xF8
+                ))
+                self.display.rectangle(col * block, row * block, block, block)
+        
+        # Whatever artwork arrives next must be drawn over the blocks
+        self.current_art_data = None
+    
     def clear_layer(self):
         """Clear the artwork layer."""
         self.display.set_pen(0)
@@ -68,4 +95,4 @@ class ArtworkDisplay:
             self.display.set_pen(self.colors.WHITE)
             self.display.text("♫ " + title, 20, 120, scale=1.2)
         
-        print("Displayed basic placeholder image")
\ No newline at end of file
+        log.debug("Displayed basic placeholder image")
@@ -1,10 +1,13 @@
 """UI controls and buttons for the MPRIS application."""
 import pngdec
 from touch import Button
+from applications.mpris.utils.log import get_logger
+
+log = get_logger("controls")
 
 class ControlButton:
     """Represents a control button with an icon and touch area."""
-    def __init__(self, display, name, icons, bounds, on_press=None, update=None):
+    def __init__(self, display, name, icons, bounds, on_press=None, update=None, label=None):
         """Initialize a control button.
         
         Args:
@@ -14,8 +17,11 @@ class ControlButton:
             bounds: (x, y, width, height) for button position
             on_press: Callback function when button is pressed
             update: Function to update button state
+            label: Optional text drawn instead of an icon
         """
+        self.display = display
         self.name = name
+        self.label = label
         self.enabled = False
         self.icon = icons[0] if icons else None
         self.pngs = {}
@@ -34,10 +40,20 @@ class ControlButton:
         """Checks if the button is enabled and currently pressed."""
         return self.enabled and self.button.is_pressed()
     
+    def contains(self, x, y):
+        """Checks if the button is enabled and the point lies inside its bounds."""
+        bx, by, width, height = self.button.bounds
+        return self.enabled and bx <= x < bx + width and by <= y < by + height
+    
     def draw(self, state):
         """Draws the button icon if enabled."""
         if self.enabled and self.icon:
             self.draw_icon()
+        elif self.enabled and self.label:
+            x, y, width, height = self.button.bounds
+            self.display.set_thickness(2)
+            self.display.set_pen(65535)
+            self.display.text(self.label, x + 20, y + height // 2, scale=0.8)
 
     def draw_icon(self):
         """Renders the button's icon centered inside its bounds."""
@@ -85,27 +101,25 @@ class ControlsManager:
 
         def toggle_controls(app_instance):
             app_instance.state.show_controls = not app_instance.state.show_controls
-            print(f"Controls toggled: {app_instance.state.show_controls}")
+            log.debug("Controls toggled: %s", app_instance.state.show_controls)
 
         def play_pause(app_instance):
             """Toggle play/pause state."""
             success = app_instance.mpris_client.play_pause()
             
             if success:
-                app_instance.state.force_refresh = True
-                app_instance.state.latest_fetch = 0
+                app_instance.apply_command_state()
             else:
-                print("Failed to toggle play/pause state")
+                log.warning("Failed to toggle play/pause state")
 
         def next_track(app_instance):
             """Skip to the next track."""
             success = app_instance.mpris_client.next()
             
             if success:
-                app_instance.state.force_refresh = True
-                app_instance.state.latest_fetch = 0
+                app_instance.apply_command_state()
             else:
-                print("Next track unavailable or failed")
+                log.warning("Next track unavailable or failed")
                 app_instance.display.set_pen(65535)
                 app_instance.display.text("Next unavailable", 260, app_instance.height - 20, scale=0.7)
                 app_instance.presto.update()
@@ -115,14 +129,18 @@ class ControlsManager:
             success = app_instance.mpris_client.previous()
             
             if success:
-                app_instance.state.force_refresh = True
-                app_instance.state.latest_fetch = 0
+                app_instance.apply_command_state()
             else:
-                print("Previous track unavailable")
+                log.warning("Previous track unavailable")
                 app_instance.display.set_pen(65535)
                 app_instance.display.text("Previous unavailable", 40, app_instance.height - 20, scale=0.7)
                 app_instance.presto.update()
 
+        def show_tracklist(app_instance):
+            app_instance.state.show_tracklist = True
+            app_instance.state.tracklist_offset = 0
+            app_instance.state.show_controls = False
+
         def toggle_lights(app_instance):
             app_instance.toggle_leds(not app_instance.state.toggle_leds)
             app_instance.state.toggle_leds = not app_instance.state.toggle_leds
@@ -137,13 +155,15 @@ class ControlsManager:
             ("Previous", ["previous.png"], (center_x - 140, display_height - 100, 80, 100), previous_track, update_show_controls),
             ("Play", ["play.png", "pause.png"], (center_x - 50, display_height - 100, 80, 100), play_pause, update_play_pause),
             ("Toggle Light", ["light_on.png", "light_off.png"], (display_width - 100, 0, 100, 80), toggle_lights, update_light),
+            ("Queue", None, (center_x - 60, 0, 120, 80), show_tracklist, update_show_controls),
             ("Toggle Controls", None, (0, 0, display_width, display_height), toggle_controls, update_always_enabled),
         ]
+        labels = {"Queue": "Queue"}
 
         self.buttons = [
             ControlButton(self.display, name, icons, bounds, 
                           lambda self=self.app, handler=on_press: handler(self), 
-                          update)
+                          update, labels.get(name))
             for name, icons, bounds, on_press, update in buttons_config
         ]
     
@@ -161,11 +181,36 @@ class ControlsManager:
             
         for button in self.buttons:
             if button.is_pressed(state):
-                print(f"{button.name} pressed")
+                log.debug("%s pressed", button.name)
+                try:
+                    button.on_press()
+                except Exception as e:
+                    log.error("Failed to execute on_press: %s", e)
+                return True
+        
+        return False
+    
+    def handle_tap(self, state, x, y):
+        """Handle a completed tap at a position, for touches that were tracked until release.
+        
+        Args:
+            state: Current application state
+            x: Tap x coordinate
+            y: Tap y coordinate
+            
+        Returns:
+            True if a button was pressed, False otherwise
+        """
+        for button in self.buttons:
+            button.update(state, button)
+            
+        for button in self.buttons:
+            if button.contains(x, y):
+                log.debug("%s pressed", button.name)
                 try:
                     button.on_press()
                 except Exception as e:
-                    print(f"Failed to execute on_press: {e}")
+                    log.error("Failed to execute on_press: %s", e)
                 return True
         
         return False
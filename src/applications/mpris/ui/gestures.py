@@ -0,0 +1,84 @@
+"""Swipe gestures for seeking and volume in the MPRIS application."""
+import time
+import uasyncio as asyncio
+from applications.mpris.utils.log import get_logger
+
+log = get_logger("gestures")
+
+class GestureTracker:
+    """Turns drags into seek and volume commands sent at a bounded rate.
+
+    Horizontal drags seek, vertical drags change the volume. Movement is
+    accumulated between sends so a fast swipe becomes a handful of requests
+    instead of one per touch event.
+    """
+
+    DRAG_THRESHOLD = 30
+    SEND_INTERVAL_MS = 300
+    SEEK_MS_PER_PIXEL = 125
+    VOLUME_PER_PIXEL = 1 / 300
+
+    def __init__(self, mpris_client):
+        """Initialize gesture tracker.
+
+        Args:
+            mpris_client: MPRISApiClient used to send commands
+        """
+        self.mpris_client = mpris_client
+        self.start_x = 0
+        self.start_y = 0
+
+    async def track(self, touch):
+        """Follow a touch until it is released.
+
+        Args:
+            touch: The Presto touch object, already polled and pressed
+
+        Returns:
+            True if the touch was a drag gesture, False if it was a tap
+        """
+        self.start_x, self.start_y = touch.x, touch.y
+        last_x, last_y = touch.x, touch.y
+        axis = None
+        pending = 0
+        last_send = time.ticks_ms()
+
+        while touch.state:
+            x, y = touch.x, touch.y
+
+            if axis is None:
+                if abs(x - self.start_x) > self.DRAG_THRESHOLD:
+                    axis = "x"
+                elif abs(y - self.start_y) > self.DRAG_THRESHOLD:
+                    axis = "y"
+                last_x, last_y = self.start_x, self.start_y
+
+            if axis == "x":
+                pending += x - last_x
+            elif axis == "y":
+                # Screen y grows downwards, swiping up should raise the volume
+                pending += last_y - y
+            last_x, last_y = x, y
+
+            if pending and time.ticks_diff(time.ticks_ms(), last_send) >= self.SEND_INTERVAL_MS:
+                self._send(axis, pending)
+                pending = 0
+                last_send = time.ticks_ms()
+
+            await asyncio.sleep_ms(10)
+            touch.poll()
+
+        if pending:
+            self._send(axis, pending)
+
+        return axis is not None
+
+    def _send(self, axis, pixels):
+        """Send accumulated movement as a seek or volume change."""
+        try:
+            if axis == "x":
+                self.mpris_client.seek(pixels * self.SEEK_MS_PER_PIXEL)
+            else:
+                self.mpris_client.change_volume(pixels * self.VOLUME_PER_PIXEL)
+        except Exception as e:
+            log.warning("Failed to send gesture: %s", e)
@@ -0,0 +1,138 @@
+"""Tracklist display for the MPRIS application."""
+from applications.mpris.utils.image_decoder import ImageHandler
+from applications.mpris.utils.log import get_logger
+
+log = get_logger("tracklist")
+
+HEADER_HEIGHT = 80
+TEXT_X = 84
+
+class TracklistDisplay:
+    """Shows a page of the player's tracklist with thumbnails from the page's sprite atlas.
+
+    The server stacks a page's thumbnails in one column at the tile size, and
+    rows here are drawn at the same pitch, so the atlas is decoded once and
+    every tile lands beside its row.
+    """
+
+    def __init__(self, display, colors, mpris_client, height):
+        """Initialize tracklist display.
+
+        Args:
+            display: The PrestoDeck display object
+            colors: Display color palette
+            mpris_client: MPRIS API client
+            height: Display height, used to size the page
+        """
+        self.display = display
+        self.colors = colors
+        self.mpris_client = mpris_client
+        self.image_handler = ImageHandler(display)
+        self.height = height
+        self.page = None
+        self.page_offset = None
+        self.row_height = 64
+
+    @property
+    def page_size(self):
+        """Number of rows that fit below the header."""
+        return (self.height - HEADER_HEIGHT) // self.row_height
+
+    def load(self, offset, force=False):
+        """Fetch the page at an offset, reusing the held page and atlas when unchanged."""
+        result = self.mpris_client.get_tracklist(offset, self.page_size, force=force)
+        if not isinstance(result, dict) or 'error' in result:
+            log.warning("Failed to load tracklist: %s", result.get('error') if isinstance(result, dict) else result)
+            self.page = None
+            return False
+
+        self.page = result
+        self.page_offset = offset
+        self.row_height = result.get('tile_size', self.row_height)
+        return True
+
+    def draw(self, state):
+        """Draw the header and the current page over the artwork.
+
+        Args:
+            state: Current application state
+        """
+        if self.page is None or self.page_offset != state.tracklist_offset:
+            self.load(state.tracklist_offset, force=True)
+
+        self.display.set_pen(self.colors._BLACK)
+        self.display.rectangle(0, 0, self.display.width(), self.height)
+
+        self.display.set_thickness(2)
+        self.display.set_pen(self.colors.WHITE)
+        self.display.text("< Back", 16, HEADER_HEIGHT // 2, scale=0.8)
+
+        if not self.page:
+            self.display.text("Tracklist unavailable", 16, HEADER_HEIGHT + 40, scale=0.8)
+            return
+
+        offset, total = self.page['offset'], self.page['total']
+        if total:
+            self.display.text("%d-%d of %d" % (offset + 1, offset + len(self.page['items']), total), 160, HEADER_HEIGHT // 2, scale=0.7)
+        if offset > 0:
+            self.display.text("Up", self.display.width() - 140, HEADER_HEIGHT // 2, scale=0.8)
+        if offset + len(self.page['items']) < total:
+            self.display.text("Down", self.display.width() - 80, HEADER_HEIGHT // 2, scale=0.8)
+
+        atlas_id = self.page.get('atlas')
+        if atlas_id:
+            atlas = self.mpris_client.get_atlas(atlas_id)
+            if atlas:
+                self.image_handler.show_image(atlas, 0, HEADER_HEIGHT)
+
+        for i, item in enumerate(self.page['items']):
+            self._draw_row(i, item)
+
+    def _draw_row(self, index, item):
+        tile = item.get('tile')
+        y = HEADER_HEIGHT + (tile[1] if tile else index * self.row_height)
+
+        title = ''.join(c if ord(c) < 128 else ' ' for c in item.get('title', 'Unknown'))
+        if len(title) > 24:
+            title = title[:24] + " ..."
+        artist = ''.join(c if ord(c) < 128 else ' ' for c in item.get('artist', ''))
+        if len(artist) > 34:
+            artist = artist[:34] + " ..."
+
+        self.display.set_thickness(2)
+        self.display.set_pen(self.colors.WHITE if item.get('current') else self.colors.GRAY)
+        self.display.text(title, TEXT_X, y + 22, scale=0.8)
+        if artist:
+            self.display.set_thickness(1)
+            self.display.text(artist, TEXT_X, y + 48, scale=0.6)
+
+    def handle_tap(self, state, x, y):
+        """Handle a tap on the tracklist: back, paging, or playing the tapped row.
+
+        Args:
+            state: Current application state
+            x: Tap x coordinate
+            y: Tap y coordinate
+        """
+        if y < HEADER_HEIGHT:
+            if x < 140:
+                state.show_tracklist = False
+                self.page = None
+            elif self.page and x >= self.display.width() - 80:
+                if self.page['offset'] + len(self.page['items']) < self.page['total']:
+                    state.tracklist_offset += self.page_size
+            elif self.page and x >= self.display.width() - 140:
+                state.tracklist_offset = max(0, state.tracklist_offset - self.page_size)
+            return
+
+        if not self.page:
+            return
+
+        index = (y - HEADER_HEIGHT) // self.row_height
+        if index < len(self.page['items']):
+            item = self.page['items'][index]
+            log.debug("Going to %s", item['id'])
+            if self.mpris_client.goto_track(item['id'], self.page.get('source', 'tracklist')):
+                # Reload so the current row moves
+                self.page = None
+                state.force_refresh = True
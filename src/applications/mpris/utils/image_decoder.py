@@ -1,4 +1,7 @@
 """Image decoding utilities for MPRIS artwork."""
+from applications.mpris.utils.log import get_logger
+
+log = get_logger("image_decoder")
 
 class ImageHandler:
     """Handles image loading and display for album artwork."""
@@ -31,27 +34,27 @@ class ImageHandler:
         """
         try:
             if img_data is None:
-                print("ERROR: img_data is None")
+                log.error("img_data is None")
                 return False
             
             if not isinstance(img_data, (bytes, memoryview)):
-                print(f"ERROR: img_data is not binary data, type={type(img_data)}")
+                log.error("img_data is not binary data, type=%s", type(img_data))
                 return False
                     
             if len(img_data) > 4:
                 header = [img_data[0], img_data[1]]
-                print(f"Image header bytes: {hex(header[0])}, {hex(header[1])}")
+                log.debug("Image header bytes: 0x%02x, 0x%02x", header[0], header[1])
                 if not (header[0] == 0xFF and header[1] == 0xD8):
-                    print("WARNING: Image data doesn't have JPEG header")
+                    log.warning("Image data doesn't have JPEG header")
             
             if not isinstance(img_data, memoryview):
                 img_data = memoryview(img_data)
                 
-            print(f"Opening image data of type {type(img_data)} and length {len(img_data)}")
+            log.debug("Opening image data of type %s and length %s", type(img_data), len(img_data))
             self.jpeg.open_RAM(img_data)
             
             img_width, img_height = self.jpeg.get_width(), self.jpeg.get_height()
-            print(f"Image dimensions: {img_width}x{img_height}")
+            log.debug("Image dimensions: %sx%s", img_width, img_height)
             
             if x is None or y is None:
                 if hasattr(self.app, 'width') and hasattr(self.app, 'height'):
@@ -67,11 +70,11 @@ class ImageHandler:
                 img_x, img_y = x, y
             
             self.jpeg.decode(img_x, img_y, self.JPEG_SCALE_FULL, dither=True)
-            print(f"JPEG image displayed successfully: {img_width}x{img_height}")
+            log.debug("JPEG image displayed successfully: %sx%s", img_width, img_height)
             return True
                 
         except Exception as e:
-            print(f"Failed to load image: {e}")
+            log.warning("Failed to load image: %s", e)
             import sys
             sys.print_exception(e)
             return False
\ No newline at end of file
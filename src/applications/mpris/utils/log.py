@@ -0,0 +1,128 @@
+"""Small leveled logger for the device, matching the server's utils/log.py.
+
+Printing over USB serial blocks when the host isn't reading, so hot paths
+log at debug level with %-style arguments: below the configured level a
+call is only a comparison. Records at or above the buffer level are kept
+unformatted in a small ring buffer that can be read back with
+get_records() or printed with dump().
+
+Levels come from MPRIS_LOG_LEVEL in .env, with per-module overrides in
+MPRIS_LOG_FILTERS, e.g. "client=DEBUG,mpris=INFO".
+"""
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
+
+BUFFER_SIZE = 64
+BUFFER_LEVEL = INFO
+# Milliseconds in which a repeated message is printed only once
+RATE_LIMIT_MS = 10000
+
+_records = [None] * BUFFER_SIZE
+_next = 0
+_loggers = {}
+
+def _load_levels():
+    try:
+        import secrets
+        default = getattr(secrets, "MPRIS_LOG_LEVEL", "WARNING")
+        filters = getattr(secrets, "MPRIS_LOG_FILTERS", "")
+    except ImportError:
+        default, filters = "WARNING", ""
+
+    module_levels = {}
+    for item in filters.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            module_levels[name.strip()] = LEVELS.get(level.strip().upper(), WARNING)
+    return LEVELS.get(default.upper(), WARNING), module_levels
+
+DEFAULT_LEVEL, MODULE_LEVELS = _load_levels()
+
+def format_message(message, args):
+    """Apply %-style arguments, without failing on a bad format string."""
+    if not args:
+        return message
+    try:
+        return message % args
+    except (TypeError, ValueError):
+        return "%s %s" % (message, args)
+
+class Logger:
+    """Named logger with its own level and repeat suppression."""
+
+    def __init__(self, name):
+        self.name = name
+        self.level = MODULE_LEVELS.get(name, DEFAULT_LEVEL)
+        self.threshold = min(self.level, BUFFER_LEVEL)
+        # message template -> [last printed ticks, suppressed count]
+        self.repeats = {}
+
+    def enabled(self, level):
+        """Check whether a level would be printed, for guarding costly arguments."""
+        return level >= self.level
+
+    def log(self, level, message, *args):
+        global _next
+        if level < self.threshold:
+            return
+        if level >= BUFFER_LEVEL:
+            _records[_next] = (time.time(), level, self.name, message, args)
+            _next = (_next + 1) % BUFFER_SIZE
+        if level >= self.level:
+            self._write(level, message, args)
+
+    def _write(self, level, message, args):
+        now = time.ticks_ms()
+        repeat = self.repeats.get(message)
+        if repeat and time.ticks_diff(now, repeat[0]) < RATE_LIMIT_MS:
+            repeat[1] += 1
+            return
+        suppressed = repeat[1] if repeat else 0
+        self.repeats[message] = [now, 0]
+
+        text = format_message(message, args)
+        if suppressed:
+            text = "%s (%d similar suppressed)" % (text, suppressed)
+        print("%s %s: %s" % (LEVEL_NAMES[level], self.name, text))
+
+    def debug(self, message, *args):
+        self.log(DEBUG, message, *args)
+
+    def info(self, message, *args):
+        self.log(INFO, message, *args)
+
+    def warning(self, message, *args):
+        self.log(WARNING, message, *args)
+
+    def error(self, message, *args):
+        self.log(ERROR, message, *args)
+
+def get_logger(name):
+    """Get the shared logger for a short module name, e.g. "client"."""
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = Logger(name)
+        _loggers[name] = logger
+    return logger
+
+def get_records(level=DEBUG):
+    """Buffered records at or above a level, oldest first, as formatted strings."""
+    result = []
+    for i in range(BUFFER_SIZE):
+        record = _records[(_next + i) % BUFFER_SIZE]
+        if record and record[1] >= level:
+            timestamp, record_level, name, message, args = record
+            result.append("%d %s %s: %s" % (timestamp, LEVEL_NAMES[record_level], name, format_message(message, args)))
+    return result
+
+def dump(level=DEBUG):
+    """Print the buffered records, e.g. from the REPL after a problem."""
+    for line in get_records(level):
+        print(line)
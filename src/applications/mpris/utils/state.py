@@ -7,6 +7,8 @@ class State:
         self.is_playing = False
         self.track = None
         self.show_controls = False
+        self.show_tracklist = False
+        self.tracklist_offset = 0
         self.exit = False
         self.available_players = []
         self.current_player = None
@@ -21,6 +23,8 @@ class State:
         state.toggle_leds = self.toggle_leds
         state.is_playing = self.is_playing
         state.show_controls = self.show_controls
+        state.show_tracklist = self.show_tracklist
+        state.tracklist_offset = self.tracklist_offset
         state.exit = self.exit
         state.available_players = self.available_players.copy() if self.available_players else []
         state.current_player = self.current_player
@@ -47,6 +51,8 @@ class State:
             self.toggle_leds == other.toggle_leds and
             self.is_playing == other.is_playing and
             self.show_controls == other.show_controls and
+            self.show_tracklist == other.show_tracklist and
+            self.tracklist_offset == other.tracklist_offset and
             self.exit == other.exit and
             self.current_player == other.current_player and
             track_id_match
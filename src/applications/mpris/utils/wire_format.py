@@ -0,0 +1,89 @@
+"""Decoder for the server's compact binary state format."""
+import ustruct as struct
+import ubinascii
+
+CONTENT_TYPE = "application/vnd.prestodeck.state"
+FORMAT_VERSION = 1
+
+HEADER_FORMAT = ">BBII"
+HEADER_SIZE = 27
+ART_HASH_OFFSET = 10
+FIELD_COUNT_OFFSET = 26
+
+FIELD_ORDER = ("id", "title", "artist", "album", "player")
+# Extra fields after FIELD_ORDER holding the last_command outcome
+COMMAND_FIELDS = ("id", "command", "status", "error")
+
+STATUS_NAMES = {
+    0: "Stopped",
+    1: "Playing",
+    2: "Paused",
+}
+
+EMPTY_HASH = b"\x00" * 16
+
+def decode_state(data):
+    """Decode a binary state document into a media info dict.
+
+    Args:
+        data: Raw response bytes
+
+    Returns:
+        Dict with the same track keys as the JSON response plus
+        version, position and art_hash, and last_command when the
+        server sent one
+    """
+    if len(data) < HEADER_SIZE:
+        raise ValueError("State payload too short")
+
+    fmt_version, status, version, position = struct.unpack_from(HEADER_FORMAT, data, 0)
+    if fmt_version != FORMAT_VERSION:
+        raise ValueError("Unsupported state format version: %d" % fmt_version)
+
+    digest = data[ART_HASH_OFFSET:FIELD_COUNT_OFFSET]
+    art_hash = None
+    if digest != EMPTY_HASH:
+        art_hash = ubinascii.hexlify(digest).decode()
+
+    playback_status = STATUS_NAMES.get(status, "Unknown")
+    result = {
+        "playing": status == 1,
+        "playback_status": playback_status,
+        "version": version,
+        "position": position,
+        "art_hash": art_hash,
+    }
+
+    count = data[FIELD_COUNT_OFFSET]
+    offset = HEADER_SIZE
+    command = {}
+    for i in range(count):
+        length = (data[offset] << 8) | data[offset + 1]
+        offset += 2
+        value = data[offset:offset + length].decode()
+        if i < len(FIELD_ORDER):
+            result[FIELD_ORDER[i]] = value
+        elif i - len(FIELD_ORDER) < len(COMMAND_FIELDS):
+            command[COMMAND_FIELDS[i - len(FIELD_ORDER)]] = value or None
+        offset += length
+    if command:
+        result["last_command"] = command
+
+    if offset < len(data):
+        led_count = data[offset]
+        offset += 1
+        colors = [
+            (data[offset + i * 3], data[offset + i * 3 + 1], data[offset + i * 3 + 2])
+            for i in range(led_count + 1)
+        ]
+        # A preview without a palette comes behind an empty palette section
+        if led_count:
+            result["palette"] = {"leds": colors[:led_count], "dominant": colors[led_count]}
+        offset += (led_count + 1) * 3
+
+    if offset < len(data):
+        side = data[offset]
+        offset += 1
+        result["preview"] = data[offset:offset + side * side * 2]
+
+    return result
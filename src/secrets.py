@@ -10,6 +10,11 @@ WIFI_PASSWORD = env.get('WIFI_PASSWORD', "")
 
 MPRIS_API_TOKEN = env.get('MPRIS_API_TOKEN', "")
 MPRIS_SERVER_URL = env.get('MPRIS_SERVER_URL', "")
+MPRIS_BEACON_PORT = int(env.get('MPRIS_BEACON_PORT', "5005"))
+MPRIS_LOG_LEVEL = env.get('MPRIS_LOG_LEVEL', "WARNING")
+MPRIS_LOG_FILTERS = env.get('MPRIS_LOG_FILTERS', "")
+MPRIS_TELEMETRY = env.get('MPRIS_TELEMETRY', "true").lower() != "false"
+MPRIS_WIRE_FORMAT = env.get('MPRIS_WIRE_FORMAT', "binary")
 
 SPOTIFY_CLIENT_ID = env.get('SPOTIFY_CLIENT_ID', "")
 SPOTIFY_CLIENT_SECRET = env.get('SPOTIFY_CLIENT_SECRET', "")